@@ -1,11 +1,214 @@
 #!/usr/bin/env python3
-import secrets
+# -*- coding: utf-8 -*-
+"""
+API 密钥生成脚本
+不带参数时输出一个 Base64 密钥；批量模式一次读取全部随机数，为多个项目生成密钥，
+并写出环境变量文件、ApiKeys 配置节和 SHA-256 摘要索引
+
+摘要索引格式（小端）：
+- 文件头: MAGIC(8 字节) + 条目数(uint32)
+- 条目: SHA-256(密钥)(32 字节) + 项目名偏移(uint32) + 项目名长度(uint16)，按摘要排序
+- 项目名区: UTF-8 编码的项目名依次拼接
+条目定长，mmap 后可直接二分查找，索引中不保存原始密钥
+"""
+
+import argparse
 import base64
+import getpass
+import hashlib
+import hmac
+import json
+import mmap
+import os
+import re
+import secrets
+import struct
+import sys
+from collections import Counter
+
+# 32 字节安全随机数
+KEY_BYTES = 32
+ENV_PREFIX = "NOTIFYHUB_APIKEY_"
+PROJECT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+
+INDEX_MAGIC = b"NHKIDX1\0"
+INDEX_HEADER = struct.Struct("<8sI")
+INDEX_RECORD = struct.Struct("<32sIH")
+
+def generate_key():
+    """生成单个 Base64 密钥（常用于配置）"""
+    return base64.b64encode(secrets.token_bytes(KEY_BYTES)).decode("utf-8")
+
+def generate_keys(projects):
+    """为每个项目生成密钥，只读取一次随机数，返回 [(项目名, 密钥)]"""
+    entropy = secrets.token_bytes(KEY_BYTES * len(projects))
+    view = memoryview(entropy)
+    keys = []
+    for i, project in enumerate(projects):
+        key_bytes = view[i * KEY_BYTES:(i + 1) * KEY_BYTES]
+        keys.append((project, base64.b64encode(key_bytes).decode("utf-8")))
+    if len({key for _, key in keys}) != len(keys):
+        # 32 字节随机数几乎不可能重复，真的出现时说明随机源有问题
+        raise RuntimeError("生成了重复的密钥，请检查系统随机源")
+    return keys
+
+def key_digest(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+def open_secret_file(path):
+    """以仅所有者可读写的权限打开输出文件，已存在的文件也改为 0600"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, "fchmod"):  # Windows 上没有 fchmod
+        os.fchmod(fd, 0o600)
+    return open(fd, "w", encoding="utf-8", newline="\n")
+
+def read_check_key():
+    """读取要核对的密钥：终端下用 getpass 输入（不回显），否则从标准输入读一行。
+    不从命令行参数读取，避免密钥出现在 ps 和 shell 历史中"""
+    if sys.stdin.isatty():
+        return getpass.getpass("API 密钥: ").strip()
+    return sys.stdin.readline().strip()
+
+def write_env_file(path, keys):
+    """写出 NOTIFYHUB_APIKEY_<项目>=<密钥> 格式的环境变量文件"""
+    with open_secret_file(path) as f:
+        for project, key in keys:
+            f.write(f"{ENV_PREFIX}{project}={key}\n")
+
+def write_json_section(path, keys):
+    """写出可合并到 appsettings 的 ApiKeys 配置节"""
+    with open_secret_file(path) as f:
+        json.dump({"ApiKeys": dict(keys)}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+def write_digest_index(path, keys):
+    """写出按摘要排序的定长索引，只包含密钥摘要和项目名"""
+    records = sorted((key_digest(key), project.encode("utf-8")) for project, key in keys)
+    names = bytearray()
+    parts = [INDEX_HEADER.pack(INDEX_MAGIC, len(records))]
+    for digest, name in records:
+        parts.append(INDEX_RECORD.pack(digest, len(names), len(name)))
+        names += name
+    parts.append(bytes(names))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp_path, path)
+
+class DigestIndex:
+    """mmap 打开的摘要索引，按密钥查找项目名"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = INDEX_HEADER.unpack_from(self.data, 0)
+        if magic != INDEX_MAGIC:
+            self.data.close()
+            raise ValueError(f"不是有效的密钥摘要索引: {path}")
+        self.names_offset = INDEX_HEADER.size + self.count * INDEX_RECORD.size
+
+    def _record(self, i):
+        return INDEX_RECORD.unpack_from(self.data, INDEX_HEADER.size + i * INDEX_RECORD.size)
+
+    def lookup(self, api_key):
+        """返回密钥对应的项目名，不存在时返回 None"""
+        digest = key_digest(api_key)
+        # 二分查找的比较次数只取决于摘要，不泄露原始密钥
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._record(mid)[0] < digest:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.count:
+            return None
+        found, offset, length = self._record(low)
+        if not hmac.compare_digest(found, digest):
+            return None
+        start = self.names_offset + offset
+        return self.data[start:start + length].decode("utf-8")
+
+    def close(self):
+        self.data.close()
+
+def read_projects(args, parser):
+    """从 --projects 文件或 --count/--name-format 得到项目名列表"""
+    if args.projects:
+        with open(args.projects, "r", encoding="utf-8") as f:
+            projects = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    else:
+        try:
+            projects = [args.name_format.format(i) for i in range(1, args.count + 1)]
+        except (IndexError, KeyError, ValueError) as e:
+            parser.error(f"--name-format 无效: {e}")
+    invalid = [name for name in projects if not PROJECT_NAME_PATTERN.match(name)]
+    if invalid:
+        parser.error(f"项目名只能包含字母、数字和下划线: {', '.join(invalid[:5])}")
+    # 环境变量名不区分大小写（Windows），项目名也按不区分大小写判断重复
+    counts = Counter(name.upper() for name in projects)
+    duplicates = sorted(name for name, count in counts.items() if count > 1)
+    if duplicates:
+        parser.error(f"项目名重复（不区分大小写）: {', '.join(duplicates[:5])}")
+    return projects
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="API 密钥生成脚本，不带参数时输出一个密钥")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--projects", metavar="FILE", help="项目名列表文件，每行一个")
+    source.add_argument("--count", type=int, metavar="N", help="批量生成 N 个密钥，项目名由 --name-format 生成")
+    parser.add_argument("--name-format", default="TENANT_{:04d}",
+                        help="配合 --count 使用的项目名格式（默认 TENANT_{:04d}）")
+    parser.add_argument("--env", metavar="FILE", help="写出 NOTIFYHUB_APIKEY_* 环境变量文件")
+    parser.add_argument("--json", metavar="FILE", help="写出 ApiKeys 配置节（JSON）")
+    parser.add_argument("--index", metavar="FILE", help="写出 SHA-256 摘要索引（不含原始密钥）")
+    parser.add_argument("--check", action="store_true",
+                        help="在 --index 指定的摘要索引中查找密钥对应的项目，密钥从终端输入或标准输入读取")
+    args = parser.parse_args()
+    if args.check:
+        if not args.index or args.projects or args.count or args.env or args.json:
+            parser.error("--check 只能与 --index 一起使用")
+        return args, None
+    if args.count is not None and args.count <= 0:
+        parser.error("--count 必须大于 0")
+    batch = args.projects or args.count
+    if not batch and (args.env or args.json or args.index):
+        parser.error("--env/--json/--index 需要配合 --projects 或 --count 使用")
+    if batch and not (args.env or args.json or args.index):
+        parser.error("批量模式至少需要一个输出：--env、--json 或 --index")
+    return args, read_projects(args, parser) if batch else None
 
-# 生成 32 字节安全随机数
-key_bytes = secrets.token_bytes(32)
+def main():
+    """主函数"""
+    args, projects = parse_args()
+    if args.check:
+        api_key = read_check_key()
+        index = DigestIndex(args.index)
+        try:
+            project = index.lookup(api_key)
+        finally:
+            index.close()
+        if project is None:
+            print("密钥无效")
+            sys.exit(1)
+        print(f"密钥有效，项目: {project}")
+        return
+    if projects is None:
+        print(generate_key())
+        return
 
-# Base64 输出（常用于配置）
-key_b64 = base64.b64encode(key_bytes).decode("utf-8")
+    keys = generate_keys(projects)
+    if args.env:
+        write_env_file(args.env, keys)
+        print(f"环境变量文件: {args.env}")
+    if args.json:
+        write_json_section(args.json, keys)
+        print(f"ApiKeys 配置节: {args.json}")
+    if args.index:
+        write_digest_index(args.index, keys)
+        print(f"摘要索引: {args.index}")
+    print(f"已生成 {len(keys)} 个密钥")
 
-print(key_b64)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+打包和扫描脚本的性能基准测试
+在临时目录生成合成项目树（.cs/.json 混合、深层嵌套、含大量/不含敏感信息），
+测量遍历吞吐、掩码 MB/s、峰值内存和两个脚本的端到端耗时，结果以 JSON 输出，可与基线对比
+计时前先做正确性检查（--check-only 只检查），输出不对的实现不参与计时
+"""
+
+import os
+import argparse
+import datetime
+import importlib.util
+import json
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import masking
+import treewalk
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGER_SCRIPT = os.path.join(SCRIPT_DIR, "#packager.py")
+SCANNER_SCRIPT = os.path.join(SCRIPT_DIR, "#scan_project.py")
+
+# 与打包脚本的目标文件夹一致，另加会被剪枝的编译输出目录
+TARGET_FOLDERS = ["Models", "Services", "Controllers", "Middleware", "Extensions", "Helpers"]
+NOISE_FOLDERS = ["bin", "obj", "publish"]
+
+def load_script(name, path):
+    """按路径加载脚本模块（文件名以 # 开头，无法直接 import）"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# ---------------------------------------------------------------------------
+# 合成数据
+# ---------------------------------------------------------------------------
+
+def make_csharp_file(rng, lines, secret_heavy):
+    """生成一个 C# 文件；secret_heavy 时约 15% 的行包含敏感赋值"""
+    out = ["using System;", "", "namespace Bench.Generated", "{", "    public class Generated%d" % rng.randrange(10 ** 6), "    {"]
+    for i in range(lines):
+        r = rng.random()
+        if secret_heavy and r < 0.05:
+            out.append(f'        private const string ApiKey{i} = "sk-{rng.randrange(10 ** 12)}-abcdefghijklmnop";')
+        elif secret_heavy and r < 0.10:
+            out.append(f'        var password = "P@ss{rng.randrange(10 ** 6)}word";')
+        elif secret_heavy and r < 0.15:
+            out.append(f'        Configuration["Smtp:Password{i}"] = "{rng.randrange(10 ** 9)}";')
+        elif r < 0.25:
+            out.append(f"        // 注释 {i}：计算第 {i} 个值")
+        elif r < 0.30:
+            out.append("")
+        else:
+            out.append(f"        public int Value{i} {{ get; set; }} = {rng.randrange(1000)};")
+    out.extend(["    }", "}", ""])
+    return "\n".join(out)
+
+def make_json_file(rng, entries, secret_heavy):
+    """生成一个 JSON 配置/数据文件"""
+    data = {}
+    for i in range(entries):
+        item = {"Name": f"item{i}", "Count": rng.randrange(1000), "Enabled": rng.random() < 0.5}
+        if secret_heavy:
+            item["Password"] = f"secret-{rng.randrange(10 ** 9)}-value"
+            item["ConnectionString"] = f"Server=db{i}.local;Password=pw{i};User Id=user{i}"
+        data[f"Section{i}"] = item
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+def make_email_log_line(rng, index):
+    """生成一行 email-sent 日志，格式与 EmailService.LogEmailSent 一致"""
+    to = ", ".join(f"user{rng.randrange(10000)}@example.com" for _ in range(rng.randint(1, 3)))
+    return (f"[2025-01-01 10:{index // 60 % 60:02d}:{index % 60:02d}] 邮件发送成功 | EmailId: {index:08x} | "
+            f"RequestId: req-{index} | Project: blog | Category: notify | Subject: Hello {index} | To: {to} | "
+            f"Cc:  | Bcc: [0 recipients] | Recipients: {to.count('@')} | Priority: Normal | IsHtml: True | "
+            f"BodyLength: {rng.randrange(5000)} | Attachments: 0 files, 0.00MB | From: noreply@example.com | "
+            f"SentAt: 2025-01-01T10:00:00Z | Error: \n")
+
+def generate_tree(root, files, secret_heavy, seed=0, max_depth=8):
+    """在 root 下生成 files 个文件，返回 (文件数, 总字节数)"""
+    rng = random.Random(seed)
+    total_bytes = 0
+    for n in range(files):
+        if rng.random() < 0.15:
+            top = rng.choice(NOISE_FOLDERS)
+        else:
+            top = rng.choice(TARGET_FOLDERS)
+        depth = rng.randrange(max_depth)
+        parts = [top] + [f"L{d}_{rng.randrange(4)}" for d in range(depth)]
+        folder = os.path.join(root, *parts)
+        os.makedirs(folder, exist_ok=True)
+        if rng.random() < 0.8:
+            name = f"File{n}.cs"
+            content = make_csharp_file(rng, rng.randrange(20, 200), secret_heavy)
+        else:
+            name = f"data{n}.json"
+            content = make_json_file(rng, rng.randrange(2, 40), secret_heavy)
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            total_bytes += f.write(content)
+    return files, total_bytes
+
+# ---------------------------------------------------------------------------
+# 测量
+# ---------------------------------------------------------------------------
+
+def peak_rss_self():
+    """当前进程的峰值常驻内存（字节），不支持时返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def timed(func, *args, repeat=3):
+    """返回多次运行中的最短耗时和最后一次的返回值"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_script(argv, cwd):
+    """运行脚本子进程，返回 (耗时, 峰值内存字节数或 None)"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable] + argv, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    else:
+        proc.wait()
+        rss = None
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"脚本运行失败 ({proc.returncode}): {' '.join(argv)}")
+    return elapsed, rss
+
+def bench_walk(packager, scanner, tree):
+    """遍历吞吐：打包脚本配置（剪枝 + 目标文件夹）与扫描脚本配置（排序 + 跳过规则）"""
+    trie = treewalk.PathPrefixTrie(TARGET_FOLDERS)
+
+    def walk_packager():
+        return sum(1 for _ in treewalk.walk_tree(tree, skip_names=packager.SKIP_DIRS, prefixes=trie))
+
+    def walk_scanner():
+        return len(scanner.scan_directory(tree, max_depth=64))
+
+    results = {}
+    for name, func in (("walk.packager", walk_packager), ("scan_directory", walk_scanner)):
+        seconds, entries = timed(func)
+        results[name] = {"seconds": seconds, "entries": entries, "entries_per_s": entries / seconds if seconds else None}
+    return results
+
+def bench_masking(packager, scanner, rng, secret_heavy):
+    """掩码吞吐（MB/s）及 format_size 调用速率"""
+    cs_text = "\n".join(make_csharp_file(rng, 200, secret_heavy) for _ in range(200))
+    json_text = make_json_file(rng, 20000, secret_heavy)
+    json_obj = json.loads(json_text)
+    cs_mb = len(cs_text.encode("utf-8")) / 1e6
+    json_mb = len(json_text.encode("utf-8")) / 1e6
+
+    results = {}
+    seconds, _ = timed(packager.process_csharp_content, cs_text)
+    results["process_csharp_content"] = {"seconds": seconds, "mb_per_s": cs_mb / seconds}
+    seconds, _ = timed(packager.process_json_content, json_text)
+    results["process_json_content"] = {"seconds": seconds, "mb_per_s": json_mb / seconds}
+    seconds, _ = timed(packager.mask_json_recursive, json_obj)
+    results["mask_json_recursive"] = {"seconds": seconds, "mb_per_s": json_mb / seconds}
+
+    log_lines = [make_email_log_line(rng, i) for i in range(100000)]
+    log_mb = sum(len(line.encode("utf-8")) for line in log_lines) / 1e6
+    log_masker = masking.load_rules().for_file("email-sent-20250101.log")
+    seconds, _ = timed(lambda: "".join(log_masker.mask_stream(log_lines)))
+    results["mask_stream_email_log"] = {"seconds": seconds, "mb_per_s": log_mb / seconds}
+
+    sizes = [rng.randrange(1 << 40) for _ in range(200000)]
+    seconds, _ = timed(lambda: [scanner.format_size(size) for size in sizes])
+    results["format_size"] = {"seconds": seconds, "calls_per_s": len(sizes) / seconds}
+    return results
+
+# ---------------------------------------------------------------------------
+# 正确性检查：计时前先确认被测实现的输出正确，失败时不输出基准结果
+# ---------------------------------------------------------------------------
+
+def check_json_masking(packager, rng, rounds=20):
+    """被计时的两种 JSON 掩码结果一致：流式 process_json_content 与 mask_json_recursive"""
+    failures = []
+    for _ in range(rounds):
+        text = make_json_file(rng, rng.randint(1, 20), secret_heavy=True)
+        expected = packager.mask_json_recursive(json.loads(text))
+        masked = packager.process_json_content(text)
+        try:
+            equivalent = json.loads(masked) == expected
+        except ValueError:
+            equivalent = False
+        if not equivalent:
+            failures.append(f"process_json_content 与 mask_json_recursive 不一致: {text[:200]!r}")
+    return failures
+
+def run_checks(packager, seed=0):
+    failures = check_json_masking(packager, random.Random(seed))
+    for failure in failures:
+        print(f"❌ {failure}")
+    return not failures
+
+def bench_end_to_end(tree, workdir):
+    """两个脚本的端到端耗时和峰值内存"""
+    output = os.path.join(workdir, "bundle.txt")
+    cache = os.path.join(workdir, "bundle.cache.json")
+    runs = {
+        "e2e.packager": [PACKAGER_SCRIPT, "--root", tree, "--output", output],
+        "e2e.packager_jobs": [PACKAGER_SCRIPT, "--root", tree, "--output", output, "--jobs", "0"],
+        "e2e.packager_cache_cold": [PACKAGER_SCRIPT, "--root", tree, "--output", output, "--cache", cache],
+        "e2e.packager_cache_warm": [PACKAGER_SCRIPT, "--root", tree, "--output", output, "--cache", cache],
+        "e2e.scan_project": [SCANNER_SCRIPT],
+    }
+    results = {}
+    for name, argv in runs.items():
+        seconds, rss = run_script(argv, cwd=tree)
+        results[name] = {"seconds": seconds, "peak_rss_bytes": rss}
+    return results
+
+def compare_with_baseline(results, baseline, tolerance):
+    """与基线对比 seconds，返回变慢超过 tolerance 的条目"""
+    regressions = []
+    print(f"\n{'基准项':<48} {'基线(s)':>10} {'本次(s)':>10} {'变化':>8}")
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or not previous.get("seconds"):
+            continue
+        change = current["seconds"] / previous["seconds"] - 1
+        flag = " ⚠️" if change > tolerance else ""
+        print(f"{name:<48} {previous['seconds']:>10.4f} {current['seconds']:>10.4f} {change:>+7.1%}{flag}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="打包和扫描脚本的性能基准测试")
+    parser.add_argument("--files", type=int, nargs="+", default=[10000],
+                        help="合成项目树的文件数，可指定多个（例如 10000 200000）")
+    parser.add_argument("--content", choices=["secret-heavy", "secret-free", "both"], default="both",
+                        help="合成内容是否包含大量敏感信息")
+    parser.add_argument("--output", default="benchmark-results.json", help="结果 JSON 文件")
+    parser.add_argument("--baseline", help="基线 JSON 文件，用于对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="判定为性能回退的变慢比例")
+    parser.add_argument("--skip-e2e", action="store_true", help="跳过端到端脚本运行")
+    parser.add_argument("--keep", action="store_true", help="保留生成的临时目录")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check-only", action="store_true", help="只运行正确性检查，不计时")
+    args = parser.parse_args()
+
+    packager = load_script("packager", PACKAGER_SCRIPT)
+    scanner = load_script("scan_project", SCANNER_SCRIPT)
+    if not run_checks(packager, args.seed):
+        sys.exit(1)
+    print("✅ 正确性检查通过")
+    if args.check_only:
+        return
+    profiles = ["secret-heavy", "secret-free"] if args.content == "both" else [args.content]
+
+    results = {}
+    for profile in profiles:
+        secret_heavy = profile == "secret-heavy"
+        rng = random.Random(args.seed)
+        for name, value in bench_masking(packager, scanner, rng, secret_heavy).items():
+            results[f"{profile}/{name}"] = value
+
+        for files in args.files:
+            workdir = tempfile.mkdtemp(prefix="notifyhub-bench-")
+            tree = os.path.join(workdir, "tree")
+            try:
+                print(f"生成合成项目树: {profile}, {files} 个文件 -> {tree}")
+                start = time.perf_counter()
+                _, total_bytes = generate_tree(tree, files, secret_heavy, seed=args.seed)
+                print(f"  生成完成 {total_bytes / 1e6:.1f} MB，用时 {time.perf_counter() - start:.1f}s")
+
+                prefix = f"{profile}/{files}"
+                for name, value in bench_walk(packager, scanner, tree).items():
+                    results[f"{prefix}/{name}"] = value
+                if not args.skip_e2e:
+                    for name, value in bench_end_to_end(tree, workdir).items():
+                        results[f"{prefix}/{name}"] = value
+            finally:
+                if args.keep:
+                    print(f"  保留临时目录: {workdir}")
+                else:
+                    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_bytes": peak_rss_self(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    for name, value in sorted(results.items()):
+        print(f"{name:<48} {value['seconds']:.4f}s")
+    print(f"\n结果已写入: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} 项性能回退超过 {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\n✅ 未发现性能回退")
+
+if __name__ == "__main__":
+    main()
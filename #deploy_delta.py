@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NotifyHub 增量部署打包脚本
+对 dotnet publish 输出目录生成内容哈希清单，与上次部署的清单比较，
+只把变化的文件打成一个 tar.xz 更新包，代替每次 scp -r 整个 publish 目录
+- 大文件（默认 256KB 以上）在清单里保存分块签名（滚动弱校验 + BLAKE2b），
+  变化时按 rsync 的方式生成块差异，只传输旧版本里找不到的字节
+- 大小和修改时间都没变的文件直接沿用基线清单里的哈希，不重新读取
+- 更新包里附带 linux/apply_update.py，在服务器上校验基线、重建文件并原子替换，最后重启一次服务
+- 新清单写回 --base，同时随更新包部署到服务器的 .deploy-manifest.json；
+  本地基线与服务器不一致时（例如上次更新没有应用），从服务器取回该文件作为 --base 即可
+"""
+
+import os
+import argparse
+import base64
+import hashlib
+import io
+import itertools
+import json
+import struct
+import sys
+import tarfile
+import time
+
+from treewalk import walk_tree
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = ".deploy-manifest.json"
+APPLY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linux", "apply_update.py")
+
+# 差异格式，与 linux/apply_update.py 一致
+DELTA_MAGIC = b"NHDELTA1"
+DELTA_HEADER = struct.Struct(">8sI")
+COPY_OP = struct.Struct(">II")   # 起始块号, 块数
+LITERAL_OP = struct.Struct(">I")  # 字面量长度
+# 块签名：弱校验 uint32 + BLAKE2b 前 8 字节
+SIGNATURE = struct.Struct(">I8s")
+STRONG_SIZE = 8
+
+DEFAULT_BLOCK_SIZE = 2048
+DEFAULT_DELTA_MIN = 256 * 1024
+# 差异超过新文件大小的这个比例时直接传完整文件
+DELTA_MAX_RATIO = 0.6
+
+def weak_checksum(block):
+    """rsync 弱校验的两个 16 位分量"""
+    return sum(block) & 0xFFFF, sum(itertools.accumulate(block)) & 0xFFFF
+
+def strong_checksum(block):
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+def block_signature(data, block_size):
+    """完整块的签名（末尾不足一块的部分不参与匹配）"""
+    records = []
+    for start in range(0, len(data) - block_size + 1, block_size):
+        block = data[start:start + block_size]
+        a, b = weak_checksum(block)
+        records.append(SIGNATURE.pack(a | b << 16, strong_checksum(block)))
+    return b"".join(records)
+
+def compute_delta(data, signature, block_size):
+    """用滚动弱校验在新文件的每个偏移上查找旧文件的块，返回差异数据"""
+    table = {}
+    for index, (weak, strong) in enumerate(SIGNATURE.iter_unpack(signature)):
+        table.setdefault(weak, {}).setdefault(strong, index)
+
+    out = [DELTA_HEADER.pack(DELTA_MAGIC, block_size)]
+    copy_start = copy_count = 0
+
+    def flush_copy():
+        if copy_count:
+            out.append(b"C" + COPY_OP.pack(copy_start, copy_count))
+
+    def literal(start, end):
+        nonlocal copy_count
+        if start < end:
+            flush_copy()
+            copy_count = 0
+            out.append(b"L" + LITERAL_OP.pack(end - start) + data[start:end])
+
+    n = block_size
+    end = len(data)
+    i = literal_start = 0
+    if end >= n:
+        a, b = weak_checksum(data[0:n])
+    while i + n <= end:
+        candidates = table.get(a | b << 16)
+        if candidates:
+            index = candidates.get(strong_checksum(data[i:i + n]))
+            if index is not None:
+                literal(literal_start, i)
+                if copy_count and copy_start + copy_count == index:
+                    copy_count += 1
+                else:
+                    flush_copy()
+                    copy_start, copy_count = index, 1
+                i += n
+                literal_start = i
+                if i + n <= end:
+                    a, b = weak_checksum(data[i:i + n])
+                continue
+        if i + n < end:
+            removed = data[i]
+            a = (a - removed + data[i + n]) & 0xFFFF
+            b = (b - n * removed + a) & 0xFFFF
+        i += 1
+    literal(literal_start, end)
+    flush_copy()
+    return b"".join(out)
+
+def manifest_id(files):
+    """清单标识：只由各文件的路径和内容哈希决定"""
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        digest.update(f"{rel_path}\0{files[rel_path]['sha256']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def build_manifest(publish_dir, base=None, block_size=DEFAULT_BLOCK_SIZE, delta_min=DEFAULT_DELTA_MIN,
+                   rehash=False):
+    """生成 publish 目录的清单，返回 (清单, 重新读取的文件数)"""
+    base_files = base['files'] if base and base.get('block_size') == block_size else {}
+    files = {}
+    hashed = 0
+    for entry in walk_tree(publish_dir, sort=True):
+        if entry.is_dir or entry.name == MANIFEST_NAME:
+            continue
+        rel_path = entry.rel_path.replace(os.sep, "/")
+        st = entry.stat()
+        previous = base_files.get(rel_path)
+        if (not rehash and previous and previous['size'] == st.st_size and previous['mtime_ns'] == st.st_mtime_ns
+                and ('blocks' in previous) == (st.st_size >= delta_min)):
+            files[rel_path] = previous
+            continue
+        with open(entry.path, "rb") as f:
+            data = f.read()
+        info = {'size': len(data), 'mtime_ns': st.st_mtime_ns, 'sha256': hashlib.sha256(data).hexdigest()}
+        if len(data) >= delta_min:
+            info['blocks'] = base64.b64encode(block_signature(data, block_size)).decode("ascii")
+        files[rel_path] = info
+        hashed += 1
+    manifest = {'version': MANIFEST_VERSION, 'block_size': block_size, 'files': files}
+    manifest['id'] = manifest_id(files)
+    return manifest, hashed
+
+def load_manifest(path):
+    """读取基线清单，不存在、损坏或版本不符时返回 None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def plan_update(manifest, base, publish_dir, use_deltas=True):
+    """比较新旧清单，返回 (完整文件列表, {路径: 差异数据}, 删除列表)"""
+    base_files = base['files'] if base else {}
+    full, deltas = [], {}
+    for rel_path, info in manifest['files'].items():
+        previous = base_files.get(rel_path)
+        if previous and previous['sha256'] == info['sha256']:
+            continue
+        if use_deltas and previous and 'blocks' in previous and base['block_size'] == manifest['block_size']:
+            with open(os.path.join(publish_dir, *rel_path.split("/")), "rb") as f:
+                data = f.read()
+            delta = compute_delta(data, base64.b64decode(previous['blocks']), manifest['block_size'])
+            if len(delta) <= len(data) * DELTA_MAX_RATIO:
+                deltas[rel_path] = (previous['sha256'], delta)
+                continue
+        full.append(rel_path)
+    deleted = sorted(set(base_files) - set(manifest['files']))
+    return full, deltas, deleted
+
+def add_bytes(tar, name, data, mode=0o644):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = mode
+    tar.addfile(info, io.BytesIO(data))
+
+def write_package(output, publish_dir, manifest, base, full, deltas, deleted):
+    """写出 tar.xz 更新包：deploy.json、manifest.json、apply_update.py、files/、delta/"""
+    plan = {
+        'base_id': base['id'] if base else None,
+        'target_id': manifest['id'],
+        'files': full,
+        'deltas': {rel_path: {'base_sha256': base_sha256, 'sha256': manifest['files'][rel_path]['sha256']}
+                   for rel_path, (base_sha256, _) in deltas.items()},
+        'deleted': deleted,
+    }
+    with tarfile.open(output, "w:xz") as tar:
+        add_bytes(tar, "deploy.json", json.dumps(plan, ensure_ascii=False, indent=2).encode("utf-8"))
+        add_bytes(tar, "manifest.json", json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+        with open(APPLY_SCRIPT, "rb") as f:
+            add_bytes(tar, "apply_update.py", f.read(), mode=0o755)
+        for rel_path in full:
+            tar.add(os.path.join(publish_dir, *rel_path.split("/")), arcname="files/" + rel_path)
+        for rel_path, (_, delta) in sorted(deltas.items()):
+            add_bytes(tar, "delta/" + rel_path + ".delta", delta)
+
+def get_file_size_from_bytes(size_bytes):
+    """将字节数转换为可读的文件大小"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotifyHub 增量部署打包脚本")
+    parser.add_argument("--publish", default=os.path.join("NotifyHubAPI", "bin", "Release", "net8.0", "publish"),
+                        help="dotnet publish 输出目录（默认 NotifyHubAPI/bin/Release/net8.0/publish）")
+    parser.add_argument("--base", default=os.path.join("NotifyHubAPI", "bin", "Release", "deploy-manifest.json"),
+                        help="上次部署的清单，打包后更新为本次的清单（默认 NotifyHubAPI/bin/Release/deploy-manifest.json）")
+    parser.add_argument("--output", default="notifyhub-update.tar.xz", help="更新包路径（默认 notifyhub-update.tar.xz）")
+    parser.add_argument("--full", action="store_true", help="忽略基线，打包全部文件（首次部署）")
+    parser.add_argument("--no-delta", action="store_true", help="变化的文件总是完整传输，不生成块差异")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f"块差异的块大小（默认 {DEFAULT_BLOCK_SIZE}）")
+    parser.add_argument("--delta-min", type=int, default=DEFAULT_DELTA_MIN, metavar="BYTES",
+                        help=f"达到该大小的文件保存分块签名并使用块差异（默认 {DEFAULT_DELTA_MIN}）")
+    parser.add_argument("--rehash", action="store_true", help="重新读取所有文件，不沿用基线中的哈希")
+    parser.add_argument("--dry-run", action="store_true", help="只列出变化，不写更新包也不更新基线")
+    args = parser.parse_args()
+    if args.block_size < 64:
+        parser.error("--block-size 不能小于 64")
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if not os.path.isdir(args.publish):
+        print(f"❌ publish 目录不存在: {args.publish}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    base = None if args.full else load_manifest(args.base)
+    manifest, hashed = build_manifest(args.publish, base, args.block_size, args.delta_min, args.rehash)
+    print(f"清单: {len(manifest['files'])} 个文件, 重新计算哈希 {hashed} 个")
+    if base is None:
+        print("没有基线清单，打包全部文件")
+    elif base['id'] == manifest['id']:
+        print("✅ 与上次部署相同，无需更新")
+        return
+
+    full, deltas, deleted = plan_update(manifest, base, args.publish, not args.no_delta)
+    for rel_path in full:
+        print(f"  完整  {rel_path} ({get_file_size_from_bytes(manifest['files'][rel_path]['size'])})")
+    for rel_path, (_, delta) in sorted(deltas.items()):
+        print(f"  差异  {rel_path} ({get_file_size_from_bytes(len(delta))} / "
+              f"{get_file_size_from_bytes(manifest['files'][rel_path]['size'])})")
+    for rel_path in deleted:
+        print(f"  删除  {rel_path}")
+    if args.dry_run:
+        return
+
+    write_package(args.output, args.publish, manifest, base, full, deltas, deleted)
+    save_manifest(args.base, manifest)
+    print(f"\n✅ 更新包: {args.output} ({get_file_size_from_bytes(os.path.getsize(args.output))}), "
+          f"耗时 {time.perf_counter() - start:.2f}s")
+    print("服务器上执行:")
+    print("  mkdir -p /tmp/notifyhub-update && tar -xJf notifyhub-update.tar.xz -C /tmp/notifyhub-update")
+    print("  python3 /tmp/notifyhub-update/apply_update.py /var/www/notifyhub --restart notifyhub")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮件发送日志统计脚本
+分析 LogEmailSent 写入的 logs/email-sent-YYYYMMDD.log：按项目和分类统计成功率、收件人数、
+附件大小，错误信息排行和每小时发送量
+- 日志文件 mmap 后用一个预编译正则在整段字节上匹配，不逐行切分和解码
+- 汇总按文件保存（小时 × 项目 × 分类 × 状态），--checkpoint 记录每个文件已解析到的字节偏移，
+  再次运行时只解析新追加的部分；文件被截断或替换时该文件重新解析
+"""
+
+import os
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import sys
+from collections import Counter
+
+from emaillog import LINE_RE, LOG_PATTERN, SUCCESS
+
+CHECKPOINT_VERSION = 1
+# 文件开头用于识别文件是否被替换的字节数
+HEAD_BYTES = 256
+# 错误信息只保留前面这些字符用于归类
+ERROR_KEY_LENGTH = 160
+
+# 每个分组的计数列
+SENT, FAILED, RECIPIENTS, ATTACHMENTS, ATTACHMENT_MB = range(5)
+
+def new_file_state():
+    return {'offset': 0, 'head': None, 'groups': {}, 'errors': Counter(), 'unparsed': 0}
+
+def parse_region(data, start, end, state):
+    """解析 data[start:end]（以完整行结束）并累加到 state"""
+    groups = state['groups']
+    errors = state['errors']
+    for m in LINE_RE.finditer(data, start, end):
+        hour = m.group('hour')
+        if hour is None:
+            if m.group('other'):
+                state['unparsed'] += 1
+            continue
+        key = (hour.decode("ascii"), m.group('project').decode("utf-8", "replace"),
+               m.group('category').decode("utf-8", "replace"))
+        row = groups.get(key)
+        if row is None:
+            row = groups[key] = [0, 0, 0, 0, 0.0]
+        if m.group('status') == SUCCESS:
+            row[SENT] += 1
+        else:
+            row[FAILED] += 1
+            error = m.group('error')
+            message = error.decode("utf-8", "replace")[:ERROR_KEY_LENGTH] if error else "(无错误信息)"
+            errors[(key[0][:10], key[1], message)] += 1
+        row[RECIPIENTS] += int(m.group('recipients'))
+        if m.group('files') is not None:
+            row[ATTACHMENTS] += int(m.group('files'))
+            row[ATTACHMENT_MB] += float(m.group('mb'))
+
+def file_head(data):
+    return hashlib.blake2b(data[:HEAD_BYTES], digest_size=16).hexdigest()
+
+def update_file(path, state):
+    """从检查点偏移继续解析文件，返回新解析的字节数"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        head = file_head(data)
+        if state['head'] is not None and (state['head'] != head or size < state['offset']):
+            # 文件被截断或替换，丢弃这个文件之前的汇总
+            state.clear()
+            state.update(new_file_state())
+        state['head'] = head
+        start = state['offset']
+        # 只解析到最后一个换行符，写了一半的行留到下次
+        end = data.rfind(b"\n", start) + 1
+        if end <= start:
+            return 0
+        parse_region(data, start, end, state)
+        state['offset'] = end
+        return end - start
+
+def load_checkpoint(path):
+    """读取检查点，损坏或版本不符时当作空检查点"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != CHECKPOINT_VERSION:
+        return {}
+    files = {}
+    for name, saved in data.get('files', {}).items():
+        files[name] = {
+            'offset': saved['offset'],
+            'head': saved['head'],
+            'groups': {tuple(row[:3]): row[3:] for row in saved['groups']},
+            'errors': Counter({(day, project, error): count for day, project, error, count in saved['errors']}),
+            'unparsed': saved.get('unparsed', 0),
+        }
+    return files
+
+def save_checkpoint(path, files):
+    data = {
+        'version': CHECKPOINT_VERSION,
+        'files': {
+            name: {
+                'offset': state['offset'],
+                'head': state['head'],
+                'groups': [list(key) + row for key, row in state['groups'].items()],
+                'errors': [list(key) + [count] for key, count in state['errors'].items()],
+                'unparsed': state['unparsed'],
+            }
+            for name, state in files.items()
+        },
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def merge(files, project=None, since=None):
+    """合并各文件的汇总，可按项目和起始日期（YYYY-MM-DD）过滤"""
+    groups = {}
+    errors = Counter()
+    unparsed = 0
+    for state in files.values():
+        unparsed += state['unparsed']
+        for key, row in state['groups'].items():
+            if (project and key[1] != project) or (since and key[0] < since):
+                continue
+            total = groups.setdefault(key, [0, 0, 0, 0, 0.0])
+            for i, value in enumerate(row):
+                total[i] += value
+        for (day, error_project, message), count in state['errors'].items():
+            if (project and error_project != project) or (since and day < since):
+                continue
+            errors[(error_project, message)] += count
+    return groups, errors, unparsed
+
+def rollup(groups, key_func):
+    """把分组按 key_func 再汇总"""
+    result = {}
+    for key, row in groups.items():
+        total = result.setdefault(key_func(key), [0, 0, 0, 0, 0.0])
+        for i, value in enumerate(row):
+            total[i] += value
+    return result
+
+def success_rate(row):
+    total = row[SENT] + row[FAILED]
+    return row[SENT] / total * 100 if total else 0.0
+
+def table_lines(title, rows, label):
+    lines = ["\n" + "=" * 80, title, "=" * 80,
+             f"{label:<32} {'发送':>8} {'失败':>6} {'成功率':>8} {'收件人':>8} {'附件':>6} {'附件MB':>9}"]
+    for name, row in rows:
+        lines.append(f"{name:<32} {row[SENT] + row[FAILED]:>8} {row[FAILED]:>6} {success_rate(row):>7.1f}% "
+                     f"{row[RECIPIENTS]:>8} {row[ATTACHMENTS]:>6} {row[ATTACHMENT_MB]:>9.2f}")
+    return lines
+
+def report_lines(groups, errors, unparsed, hours=24, top_errors=10):
+    by_project = rollup(groups, lambda key: key[1])
+    by_category = rollup(groups, lambda key: (key[1], key[2]))
+    by_hour = rollup(groups, lambda key: key[0])
+    total = rollup(groups, lambda key: "")
+
+    lines = table_lines("按项目统计", sorted(by_project.items()), "项目")
+    lines += table_lines("按项目和分类统计",
+                         [(f"{project} / {category}", row) for (project, category), row in sorted(by_category.items())],
+                         "项目 / 分类")
+    if "" in total:
+        lines += table_lines("合计", [("全部", total[""])], "")
+    if hours > 0:
+        lines += ["\n" + "=" * 80, f"最近 {hours} 个小时（有发送记录的）", "=" * 80]
+        for hour, row in sorted(by_hour.items())[-hours:]:
+            lines.append(f"{hour}:00  发送 {row[SENT] + row[FAILED]:>6}  失败 {row[FAILED]:>5}  "
+                         f"收件人 {row[RECIPIENTS]:>7}")
+    if errors:
+        lines += ["\n" + "=" * 80, f"最常见的 {min(top_errors, len(errors))} 种错误", "=" * 80]
+        for (project, message), count in errors.most_common(top_errors):
+            lines.append(f"{count:>6}  [{project}] {message}")
+    if unparsed:
+        lines.append(f"\n无法解析的行: {unparsed}")
+    return lines
+
+def summary_json(groups, errors, unparsed):
+    return {
+        'groups': [{'hour': hour, 'project': project, 'category': category, 'sent': row[SENT],
+                    'failed': row[FAILED], 'recipients': row[RECIPIENTS], 'attachments': row[ATTACHMENTS],
+                    'attachment_mb': round(row[ATTACHMENT_MB], 2)}
+                   for (hour, project, category), row in sorted(groups.items())],
+        'errors': [{'project': project, 'error': message, 'count': count}
+                   for (project, message), count in errors.most_common()],
+        'unparsed_lines': unparsed,
+    }
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="邮件发送日志统计脚本")
+    parser.add_argument("--log-dir", default="logs", help="日志目录（默认 logs）")
+    parser.add_argument("--checkpoint", metavar="FILE",
+                        help="检查点文件，记录已解析的偏移和汇总，再次运行时只解析新增内容")
+    parser.add_argument("--project", help="只统计指定项目")
+    parser.add_argument("--since", metavar="YYYY-MM-DD", help="只统计该日期及之后的记录")
+    parser.add_argument("--hours", type=int, default=24, metavar="N",
+                        help="列出最近 N 个有记录的小时（默认 24，0 表示不列出）")
+    parser.add_argument("--top-errors", type=int, default=10, metavar="N", help="列出最常见的 N 种错误（默认 10）")
+    parser.add_argument("--json", metavar="FILE", help="把汇总以 JSON 写入文件（- 表示标准输出）")
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_args()
+    paths = sorted(glob.glob(os.path.join(args.log_dir, LOG_PATTERN)))
+    if not paths:
+        print(f"未找到日志文件: {os.path.join(args.log_dir, LOG_PATTERN)}")
+        sys.exit(1)
+
+    saved = load_checkpoint(args.checkpoint)
+    files = {}
+    parsed_bytes = 0
+    for path in paths:
+        name = os.path.basename(path)
+        state = saved.get(name) or new_file_state()
+        try:
+            parsed_bytes += update_file(path, state)
+        except OSError as e:
+            print(f"无法读取 {path}: {e}", file=sys.stderr)
+        files[name] = state
+    if args.checkpoint:
+        # 已删除的日志文件不再保留
+        save_checkpoint(args.checkpoint, files)
+
+    groups, errors, unparsed = merge(files, args.project, args.since)
+    out = sys.stderr if args.json == "-" else sys.stdout
+    print(f"日志文件: {len(paths)} 个, 本次解析 {parsed_bytes / 1024 / 1024:.2f} MB", file=out)
+    if args.json == "-":
+        json.dump(summary_json(groups, errors, unparsed), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    for line in report_lines(groups, errors, unparsed, args.hours, args.top_errors):
+        print(line)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary_json(groups, errors, unparsed), f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+notifyhub.db 邮件记录维护脚本
+针对 EF Core 按 Models/EmailRecord.cs 生成的 EmailRecords 表（SQLite，WAL 模式）：
+- index：创建统计报表需要的覆盖索引，按状态/分类/时间段的统计只读索引，不读取含 Body 的数据页
+- report：按分类、状态、天、API Key 汇总，可用 --explain 查看查询计划是否走覆盖索引
+- archive：按 (CreatedAt, Id) 键集分页，把旧记录分块导出为 gzip 压缩的 NDJSON 或列式 JSON，
+  每块写完并落盘后再按小事务删除，事务之间让出写锁，服务的写入不会被长时间阻塞；
+  删除时再次核对状态和创建时间，导出后被改动的记录不删除；
+  中断后重新运行会先补删已导出但未删除的块，不会重复导出
+时间列按 EF Core 的 SQLite 格式保存为 'YYYY-MM-DD HH:MM:SS.fffffff' 文本（UTC），可以直接按字符串比较
+"""
+
+import os
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+
+from masking import mask_value
+
+TABLE = "EmailRecords"
+COLUMNS = ("Id", "ToAddresses", "CcAddresses", "BccAddresses", "Subject", "Body", "Priority", "Category",
+           "IsHtml", "Status", "ErrorMessage", "RetryCount", "CreatedAt", "SentAt", "LastRetryAt", "ApiKey",
+           "RequestId")
+# 与 Models/EmailRecord.cs 中的枚举一致
+STATUS_NAMES = {0: "Pending", 1: "Sent", 2: "Failed", 3: "Retrying", 4: "Cancelled"}
+# 默认只归档不会再被重试的记录
+FINAL_STATUSES = (1, 2, 4)
+
+# 覆盖索引：报表查询只用到索引中的列
+INDEXES = {
+    "IX_EmailRecords_CreatedAt_Status_Category": ("CreatedAt", "Status", "Category", "RetryCount"),
+    "IX_EmailRecords_Category_Status_CreatedAt": ("Category", "Status", "CreatedAt", "RetryCount"),
+    "IX_EmailRecords_ApiKey_CreatedAt_Status": ("ApiKey", "CreatedAt", "Status"),
+    "IX_EmailRecords_Status_RetryCount_LastRetryAt": ("Status", "RetryCount", "LastRetryAt"),
+}
+
+ARCHIVE_MANIFEST = "archive-manifest.json"
+# 各归档格式的文件后缀
+CHUNK_SUFFIXES = {"ndjson": ".ndjson.gz", "columnar": ".columns.json.gz"}
+CREATED_AT = COLUMNS.index("CreatedAt")
+
+def connect(path, readonly=False, busy_timeout=5000):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"数据库不存在: {path}")
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    else:
+        # 自动提交模式，事务由调用方显式 BEGIN
+        conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+    return conn
+
+def parse_date(value):
+    """把 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS 转成与 CreatedAt 可比较的文本"""
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"无法识别的时间: {value}")
+
+def time_filter(since=None, until=None, column="CreatedAt"):
+    clauses, params = [], []
+    if since:
+        clauses.append(f"{column} >= ?")
+        params.append(since)
+    if until:
+        clauses.append(f"{column} < ?")
+        params.append(until)
+    return clauses, params
+
+# ============ 索引 ============
+
+def index_statements():
+    return [f'CREATE INDEX IF NOT EXISTS "{name}" ON "{TABLE}" ({", ".join(columns)})'
+            for name, columns in INDEXES.items()]
+
+def create_indexes(conn):
+    """创建缺少的覆盖索引并更新统计信息，返回新建的索引名"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (TABLE,))}
+    created = []
+    for name, statement in zip(INDEXES, index_statements()):
+        if name in existing:
+            continue
+        start = time.perf_counter()
+        conn.execute(statement)
+        created.append(name)
+        print(f"  创建 {name} ({time.perf_counter() - start:.1f}s)")
+    if created:
+        # 限制每个索引的采样行数，大表上 ANALYZE 也能很快完成
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute(f'ANALYZE "{TABLE}"')
+    return created
+
+# ============ 报表 ============
+
+REPORT_QUERIES = {
+    'category': ("按分类和状态", "SELECT Category, Status, COUNT(*), SUM(RetryCount) FROM EmailRecords{where} "
+                 "GROUP BY Category, Status ORDER BY Category, Status"),
+    'day': ("按天和状态", "SELECT substr(CreatedAt, 1, 10), Status, COUNT(*), SUM(RetryCount) FROM EmailRecords{where} "
+            "GROUP BY 1, Status ORDER BY 1, Status"),
+    # 覆盖索引里没有 RetryCount，这个报表不统计重试次数
+    'apikey': ("按 API Key 和状态", "SELECT ApiKey, Status, COUNT(*) FROM EmailRecords{where} "
+               "GROUP BY ApiKey, Status ORDER BY ApiKey, Status"),
+}
+
+def report_query(kind, since=None, until=None, category=None):
+    title, sql = REPORT_QUERIES[kind]
+    clauses, params = time_filter(since, until)
+    if category:
+        clauses.append("Category = ?")
+        params.append(category)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return title, sql.format(where=where), params
+
+def run_report(conn, kind, since=None, until=None, category=None):
+    """返回 {分组: {状态名: 数量, 'retries': 重试次数}}，查询不含重试次数时没有 'retries'"""
+    _, sql, params = report_query(kind, since, until, category)
+    groups = {}
+    for group, status, count, *retries in conn.execute(sql, params):
+        if kind == 'apikey':
+            group = mask_value(group, 12)
+        row = groups.setdefault(group, {'retries': 0} if retries else {})
+        name = STATUS_NAMES.get(status, str(status))
+        row[name] = row.get(name, 0) + count
+        if retries:
+            row['retries'] += retries[0] or 0
+    return groups
+
+def explain_lines(conn, kind, since=None, until=None, category=None):
+    _, sql, params = report_query(kind, since, until, category)
+    return [f"  {row[-1]}" for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def report_lines(title, groups):
+    statuses = [name for name in STATUS_NAMES.values() if any(name in row for row in groups.values())]
+    with_retries = any('retries' in row for row in groups.values())
+    lines = ["\n" + "=" * 80, title, "=" * 80,
+             f"{'':<28} {'合计':>8} " + " ".join(f"{name:>9}" for name in statuses)
+             + (f" {'重试':>7}" if with_retries else "")]
+    for group, row in sorted(groups.items()):
+        total = sum(row.get(name, 0) for name in STATUS_NAMES.values())
+        lines.append(f"{str(group):<28} {total:>8} " + " ".join(f"{row.get(name, 0):>9}" for name in statuses)
+                     + (f" {row['retries']:>7}" if with_retries else ""))
+    return lines
+
+# ============ 归档 ============
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, ARCHIVE_MANIFEST)
+    if not os.path.exists(path):
+        return {'chunks': []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, ARCHIVE_MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+def record_dict(row):
+    record = dict(zip(COLUMNS, row))
+    record['IsHtml'] = bool(record['IsHtml'])
+    return record
+
+def write_chunk(path, rows, fmt):
+    """写出一个压缩块并落盘，返回文件的 SHA-256"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            if fmt == "ndjson":
+                for row in rows:
+                    f.write(json.dumps(record_dict(row), ensure_ascii=False).encode("utf-8") + b"\n")
+            else:
+                # 列式：同一列的值放在一起，重复的分类、状态和地址压缩率更高
+                columns = {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+                columns['IsHtml'] = [bool(value) for value in columns['IsHtml']]
+                f.write(json.dumps({'rows': len(rows), 'columns': columns}, ensure_ascii=False).encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_chunk_ids(path, fmt):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            return [json.loads(line)['Id'] for line in f if line.strip()]
+        return json.load(f)['columns']['Id']
+
+def delete_ids(conn, ids, before, statuses, batch_size, pause):
+    """按小事务删除，每个事务之间暂停，让服务的写入拿到锁
+
+    只删除仍满足归档条件的行：导出后状态被改掉（例如 Failed 改为 Retrying）的记录保留在库中，
+    归档里的是旧副本。返回 (删除行数, 保留行数)
+    """
+    deleted = 0
+    status_sql = ",".join("?" * len(statuses))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"DELETE FROM EmailRecords WHERE Id IN ({','.join('?' * len(batch))}) "
+                f"AND Status IN ({status_sql}) AND CreatedAt < ?", (*batch, *statuses, before))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        deleted += cursor.rowcount
+        if pause > 0:
+            time.sleep(pause)
+    return deleted, len(ids) - deleted
+
+def delete_chunk(conn, out_dir, manifest, chunk, ids, batch_size, pause):
+    """删除一个已导出块中的行并记入清单，返回删除行数"""
+    deleted, kept = delete_ids(conn, ids, chunk['before'], chunk['statuses'], batch_size, pause)
+    if kept:
+        print(f"  ⚠️ {chunk['file']}: {kept} 行在导出后已变化或已被删除，未从数据库删除", flush=True)
+    chunk['deleted'] = True
+    chunk['kept'] = kept
+    save_manifest(out_dir, manifest)
+    return deleted
+
+def finish_pending(conn, out_dir, manifest, batch_size, pause):
+    """补删上次已导出但未删除完的块"""
+    deleted = 0
+    for chunk in manifest['chunks']:
+        if chunk['deleted']:
+            continue
+        ids = read_chunk_ids(os.path.join(out_dir, chunk['file']), chunk['format'])
+        deleted += delete_chunk(conn, out_dir, manifest, chunk, ids, batch_size, pause)
+    return deleted
+
+def archive(conn, out_dir, before, statuses=FINAL_STATUSES, fmt="ndjson", chunk_rows=5000,
+            delete_batch=500, pause=0.05, delete=True, limit=None):
+    """导出 CreatedAt < before 的记录，返回 (导出行数, 删除行数)"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    deleted = finish_pending(conn, out_dir, manifest, delete_batch, pause) if delete else 0
+    exported = 0
+
+    status_sql = ",".join("?" * len(statuses))
+    sql = (f"SELECT {', '.join(COLUMNS)} FROM EmailRecords "
+           f"WHERE CreatedAt < ? AND Status IN ({status_sql}) AND (CreatedAt, Id) > (?, ?) "
+           f"ORDER BY CreatedAt, Id LIMIT ?")
+    # 只导出不删除时，从上次导出的最后一个键之后继续
+    last_key = ("", "")
+    if not delete and manifest['chunks']:
+        last_key = tuple(manifest['chunks'][-1]['last_key'])
+    while limit is None or exported < limit:
+        size = chunk_rows if limit is None else min(chunk_rows, limit - exported)
+        # 每块单独一次读取，读事务不会跨越删除
+        rows = conn.execute(sql, (before, *statuses, *last_key, size)).fetchall()
+        if not rows:
+            break
+        first, last = rows[0][CREATED_AT], rows[-1][CREATED_AT]
+        name = f"EmailRecords-{first[:10].replace('-', '')}-{len(manifest['chunks']):06d}{CHUNK_SUFFIXES[fmt]}"
+        digest = write_chunk(os.path.join(out_dir, name), rows, fmt)
+        last_key = (last, rows[-1][0])
+        chunk = {'file': name, 'format': fmt, 'rows': len(rows), 'first_created_at': first,
+                 'last_created_at': last, 'last_key': list(last_key), 'sha256': digest,
+                 'before': before, 'statuses': list(statuses), 'deleted': False}
+        manifest['chunks'].append(chunk)
+        save_manifest(out_dir, manifest)
+        exported += len(rows)
+        if delete:
+            deleted += delete_chunk(conn, out_dir, manifest, chunk, [row[0] for row in rows], delete_batch, pause)
+        print(f"  {name}: {len(rows)} 行, {first} ~ {last}", flush=True)
+    if delete and deleted:
+        # 被动检查点不等待读者，删除后释放的页会被之后的写入复用
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    return exported, deleted
+
+# ============ 命令行 ============
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="notifyhub.db 邮件记录维护脚本")
+    parser.add_argument("--db", default=os.path.join("NotifyHubAPI", "notifyhub.db"),
+                        help="数据库路径（默认 NotifyHubAPI/notifyhub.db）")
+    parser.add_argument("--busy-timeout", type=int, default=5000, metavar="MS",
+                        help="等待写锁的最长时间（默认 5000 毫秒）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="创建报表用的覆盖索引")
+    index.add_argument("--dry-run", action="store_true", help="只打印 SQL")
+
+    report = commands.add_parser("report", help="按分类、天或 API Key 汇总")
+    report.add_argument("--by", choices=tuple(REPORT_QUERIES), nargs="+", default=["category"],
+                        help="汇总维度（默认 category）")
+    report.add_argument("--since", type=parse_date, metavar="DATE", help="起始时间（含，UTC）")
+    report.add_argument("--until", type=parse_date, metavar="DATE", help="结束时间（不含，UTC）")
+    report.add_argument("--category", help="只统计指定分类")
+    report.add_argument("--explain", action="store_true", help="打印查询计划")
+    report.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    arch = commands.add_parser("archive", help="分块导出旧记录后删除")
+    when = arch.add_mutually_exclusive_group(required=True)
+    when.add_argument("--before", type=parse_date, metavar="DATE", help="归档该时间之前创建的记录（UTC）")
+    when.add_argument("--older-than", type=int, metavar="DAYS", help="归档 N 天之前创建的记录")
+    arch.add_argument("--output", default="email-archive", help="归档目录（默认 email-archive）")
+    arch.add_argument("--format", choices=tuple(CHUNK_SUFFIXES), default="ndjson",
+                      help="ndjson：每行一条记录；columnar：按列保存，压缩率更高（默认 ndjson）")
+    arch.add_argument("--chunk-rows", type=int, default=5000, metavar="N", help="每个文件的行数（默认 5000）")
+    arch.add_argument("--delete-batch", type=int, default=500, metavar="N", help="每个删除事务的行数（默认 500）")
+    arch.add_argument("--pause", type=float, default=0.05, metavar="SECONDS",
+                      help="删除事务之间的暂停（默认 0.05 秒）")
+    arch.add_argument("--all-statuses", action="store_true",
+                      help="同时归档 Pending 和 Retrying 记录（默认只归档 Sent、Failed、Cancelled）")
+    arch.add_argument("--no-delete", action="store_true", help="只导出，不删除")
+    arch.add_argument("--limit", type=int, metavar="N", help="本次最多导出的行数")
+    args = parser.parse_args()
+    if args.command == "archive":
+        if args.older_than is not None:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.older_than)
+            args.before = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+        if args.chunk_rows <= 0 or args.delete_batch <= 0:
+            parser.error("--chunk-rows 和 --delete-batch 必须大于 0")
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if args.command == "index" and args.dry_run:
+        for statement in index_statements():
+            print(statement + ";")
+        return
+    try:
+        conn = connect(args.db, readonly=args.command == "report", busy_timeout=args.busy_timeout)
+    except (OSError, sqlite3.Error) as e:
+        print(f"❌ 无法打开数据库: {e}")
+        sys.exit(1)
+
+    try:
+        if args.command == "index":
+            created = create_indexes(conn)
+            print(f"✅ 新建 {len(created)} 个索引" if created else "✅ 索引都已存在")
+        elif args.command == "report":
+            results = {}
+            for kind in args.by:
+                if args.explain:
+                    print(f"查询计划 ({kind}):", file=sys.stderr)
+                    for line in explain_lines(conn, kind, args.since, args.until, args.category):
+                        print(line, file=sys.stderr)
+                results[kind] = run_report(conn, kind, args.since, args.until, args.category)
+            if args.json:
+                json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+                print()
+            else:
+                for kind in args.by:
+                    for line in report_lines(REPORT_QUERIES[kind][0], results[kind]):
+                        print(line)
+        else:
+            statuses = tuple(STATUS_NAMES) if args.all_statuses else FINAL_STATUSES
+            print(f"归档 {args.before} 之前的记录到 {args.output}")
+            start = time.perf_counter()
+            exported, deleted = archive(conn, args.output, args.before, statuses, args.format, args.chunk_rows,
+                                        args.delete_batch, args.pause, not args.no_delete, args.limit)
+            print(f"✅ 导出 {exported} 行, 删除 {deleted} 行, 耗时 {time.perf_counter() - start:.1f}s")
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+POST /api/email/send 压测脚本
+基于 asyncio 的 HTTP/1.1 客户端，连接池复用 keep-alive 连接，只依赖标准库
+- 闭环模式（--concurrency）：N 个并发请求，完成一个发下一个
+- 开环模式（--rate）：按泊松到达率发请求，延迟从计划发出时刻算起，排队时间计入延迟
+- 请求按 --mix 比例混合 EmailRequest 的几种形态：纯文本、HTML、To/Cc/Bcc 群发、Base64 附件
+- 输出吞吐量和 p50/p90/p99/p999 延迟直方图，429（IpRateLimiting 限流）单独统计
+
+注意：被测实例会真的发邮件，请把 SMTP 指向测试邮箱或 mock 服务
+"""
+
+import os
+import argparse
+import asyncio
+import base64
+import json
+import random
+import ssl
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+SEND_PATH = "/api/email/send"
+
+# 与 appsettings.json 的 AttachmentSettings 和控制器的收件人上限一致
+MAX_ATTACHMENT_SIZE = 5 * 1024 * 1024
+MAX_ATTACHMENT_COUNT = 5
+MAX_TOTAL_ATTACHMENT_SIZE = 15 * 1024 * 1024
+MAX_RECIPIENTS = 100
+
+DEFAULT_MIX = "plain=5,html=3,fanout=1,attachments=1"
+# 每种形态预先生成的请求体数量，发送时轮流使用
+VARIANTS_PER_SHAPE = 8
+
+# ---------------------------------------------------------------------------
+# 请求体
+# ---------------------------------------------------------------------------
+
+def _recipients(rng, domain, count):
+    return [f"loadtest+{rng.randrange(10 ** 6)}@{domain}" for _ in range(count)]
+
+def make_plain(rng, domain, args):
+    return {
+        "to": _recipients(rng, domain, 1),
+        "subject": f"Load test {rng.randrange(10 ** 6)}",
+        "body": "Load test message. " * rng.randint(5, 50),
+        "category": "loadtest",
+        "isHtml": False,
+    }
+
+def make_html(rng, domain, args):
+    rows = "".join(f"<tr><td>{i}</td><td>{rng.randrange(10 ** 6)}</td></tr>" for i in range(rng.randint(10, 100)))
+    return {
+        "to": _recipients(rng, domain, 1),
+        "subject": f"Load test HTML {rng.randrange(10 ** 6)}",
+        "body": f"<html><body><h1>Load test</h1><table>{rows}</table></body></html>",
+        "category": "loadtest",
+        "isHtml": True,
+        "priority": rng.choice([0, 1, 2]),
+    }
+
+def make_fanout(rng, domain, args):
+    # To/Cc/Bcc 合计不超过控制器的收件人上限
+    total = min(args.recipients, MAX_RECIPIENTS)
+    to_count = max(1, total // 2)
+    cc_count = (total - to_count) // 2
+    bcc_count = total - to_count - cc_count
+    request = make_plain(rng, domain, args)
+    request["to"] = _recipients(rng, domain, to_count)
+    if cc_count:
+        request["cc"] = _recipients(rng, domain, cc_count)
+    if bcc_count:
+        request["bcc"] = _recipients(rng, domain, bcc_count)
+    return request
+
+def make_attachments(rng, domain, args):
+    count = min(args.attachment_count, MAX_ATTACHMENT_COUNT)
+    size = min(args.attachment_size, MAX_ATTACHMENT_SIZE, MAX_TOTAL_ATTACHMENT_SIZE // count)
+    request = make_plain(rng, domain, args)
+    request["attachments"] = {
+        f"loadtest-{i}.txt": base64.b64encode(rng.randbytes(size)).decode("ascii")
+        for i in range(count)
+    }
+    return request
+
+SHAPES = {
+    "plain": make_plain,
+    "html": make_html,
+    "fanout": make_fanout,
+    "attachments": make_attachments,
+}
+
+def parse_mix(text):
+    """解析 "plain=5,html=3" 形式的比例"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SHAPES:
+            raise ValueError(f"未知的请求形态: {name}（可选: {', '.join(SHAPES)}）")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("请求比例之和必须大于 0")
+    return mix
+
+class PayloadMix:
+    """按比例随机选取预先编码好的请求体"""
+
+    def __init__(self, mix, args, seed):
+        self.rng = random.Random(seed)
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.bodies = {
+            name: [json.dumps(SHAPES[name](self.rng, args.domain, args)).encode("utf-8")
+                   for _ in range(VARIANTS_PER_SHAPE)]
+            for name in self.names
+        }
+
+    def pick(self):
+        name = self.rng.choices(self.names, self.weights)[0]
+        return name, self.rng.choice(self.bodies[name])
+
+# ---------------------------------------------------------------------------
+# HTTP 客户端
+# ---------------------------------------------------------------------------
+
+class HttpError(Exception):
+    """连接或协议错误"""
+
+class Connection:
+    """一个 keep-alive 的 HTTP/1.1 连接"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, head, body):
+        self.writer.write(head + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HttpError("服务器关闭了连接")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HttpError(f"无效的状态行: {status_line[:80]!r}")
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            length = int(headers.get("content-length", 0))
+            if length:
+                await self.reader.readexactly(length)
+        keep_alive = headers.get("connection", "").lower() != "close"
+        return status, keep_alive
+
+    def close(self):
+        self.writer.close()
+
+class ConnectionPool:
+    """限制连接总数的连接池，空闲连接按后进先出复用"""
+
+    def __init__(self, url, size, ssl_context, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl_context if parts.scheme == "https" else None
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def acquire(self):
+        await self.slots.acquire()
+        if self.idle:
+            return self.idle.pop()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+        except BaseException:
+            self.slots.release()
+            raise
+        self.opened += 1
+        return Connection(reader, writer)
+
+    def release(self, conn, reuse):
+        if reuse:
+            self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle.clear()
+
+def request_head(pool, api_key, length):
+    return (
+        f"POST {SEND_PATH} HTTP/1.1\r\n"
+        f"Host: {pool.host_header}\r\n"
+        f"Authorization: Bearer {api_key}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {length}\r\n"
+        "Connection: keep-alive\r\n"
+        "\r\n"
+    ).encode("latin-1")
+
+# ---------------------------------------------------------------------------
+# 统计
+# ---------------------------------------------------------------------------
+
+class LatencyHistogram:
+    """延迟直方图（微秒），每个 2 的幂区间细分 2**SUB_BITS 个桶，相对误差小于 1%"""
+
+    SUB_BITS = 7
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+        self.max = 0
+
+    def record(self, micros):
+        micros = max(0, int(micros))
+        shift = max(0, micros.bit_length() - self.SUB_BITS)
+        self.counts[micros >> shift << shift] += 1
+        self.total += 1
+        self.max = max(self.max, micros)
+
+    def percentile(self, p):
+        if not self.total:
+            return 0
+        target = p / 100 * self.total
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= target:
+                return value
+        return self.max
+
+    def octaves(self):
+        """按 2 的幂毫秒区间汇总：[(上限毫秒, 数量)]"""
+        buckets = Counter()
+        for value, count in self.counts.items():
+            upper = 1
+            while upper * 1000 <= value:
+                upper *= 2
+            buckets[upper] += count
+        return sorted(buckets.items())
+
+class Stats:
+    """按结果分类的请求统计"""
+
+    def __init__(self):
+        self.ok = LatencyHistogram()          # 2xx
+        self.limited = LatencyHistogram()     # 429
+        self.statuses = Counter()
+        self.shapes = Counter()
+        self.errors = Counter()
+        self.started = None
+        self.finished = None
+
+    def record(self, shape, status, micros):
+        self.shapes[shape] += 1
+        self.statuses[status] += 1
+        if status == 429:
+            self.limited.record(micros)
+        elif 200 <= status < 300:
+            self.ok.record(micros)
+
+    def record_error(self, shape, error):
+        self.shapes[shape] += 1
+        self.errors[type(error).__name__] += 1
+
+    def summary(self, pool):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        completed = sum(self.statuses.values())
+        percentiles = {f"p{name}": self.ok.percentile(p) / 1000
+                       for name, p in (("50", 50), ("90", 90), ("99", 99), ("999", 99.9))}
+        return {
+            "elapsed_s": elapsed,
+            "requests": completed + sum(self.errors.values()),
+            "throughput_rps": completed / elapsed if elapsed > 0 else 0.0,
+            "ok": self.ok.total,
+            "ok_rps": self.ok.total / elapsed if elapsed > 0 else 0.0,
+            "rate_limited_429": self.limited.total,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "shapes": dict(self.shapes),
+            "latency_ms": {**percentiles, "max": self.ok.max / 1000},
+            "latency_429_ms": {"p50": self.limited.percentile(50) / 1000,
+                               "p99": self.limited.percentile(99) / 1000},
+            "connections_opened": pool.opened,
+        }
+
+def print_report(summary, stats):
+    print("=" * 60)
+    print("压测结果")
+    print("=" * 60)
+    print(f"耗时: {summary['elapsed_s']:.1f} s, 请求数: {summary['requests']}, "
+          f"吞吐量: {summary['throughput_rps']:.1f} req/s（2xx {summary['ok_rps']:.1f} req/s）")
+    print(f"状态码: {summary['statuses']}")
+    print(f"429 限流: {summary['rate_limited_429']} 个"
+          f"（p50 {summary['latency_429_ms']['p50']:.1f} ms, p99 {summary['latency_429_ms']['p99']:.1f} ms）")
+    if summary['errors']:
+        print(f"连接/协议错误: {summary['errors']}")
+    print(f"请求形态: {summary['shapes']}, 新建连接: {summary['connections_opened']}")
+    latency = summary['latency_ms']
+    print(f"2xx 延迟: p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, "
+          f"p99 {latency['p99']:.1f} ms, p999 {latency['p999']:.1f} ms, max {latency['max']:.1f} ms")
+    octaves = stats.ok.octaves()
+    if octaves:
+        peak = max(count for _, count in octaves)
+        print("\n2xx 延迟分布:")
+        for upper, count in octaves:
+            bar = "#" * max(1, round(40 * count / peak))
+            print(f"  < {upper:>6} ms {count:>8}  {bar}")
+
+# ---------------------------------------------------------------------------
+# 发压
+# ---------------------------------------------------------------------------
+
+async def send_one(pool, api_key, payloads, stats, intended_start, timeout):
+    """发一个请求；intended_start 为计划发出时刻，排队等待连接的时间也计入延迟"""
+    shape, body = payloads.pick()
+    head = request_head(pool, api_key, len(body))
+    try:
+        conn = await pool.acquire()
+    except (OSError, asyncio.TimeoutError) as e:
+        stats.record_error(shape, e)
+        return
+    reuse = False
+    try:
+        status, reuse = await asyncio.wait_for(conn.request(head, body), timeout)
+        stats.record(shape, status, (time.perf_counter() - intended_start) * 1e6)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError, ValueError) as e:
+        stats.record_error(shape, e)
+    finally:
+        pool.release(conn, reuse)
+
+async def run_closed_loop(pool, args, payloads, stats, deadline):
+    remaining = [args.requests]
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            if args.requests:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            await send_one(pool, args.api_key, payloads, stats, time.perf_counter(), args.timeout)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+async def run_open_loop(pool, args, payloads, stats, deadline):
+    rng = random.Random(args.seed)
+    tasks = set()
+    sent = 0
+    next_at = time.perf_counter()
+    while next_at < deadline and (not args.requests or sent < args.requests):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(send_one(pool, args.api_key, payloads, stats, next_at, args.timeout))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        sent += 1
+        # 泊松到达：间隔服从指数分布
+        next_at += rng.expovariate(args.rate)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def run(args, payloads):
+    ssl_context = None
+    if args.url.startswith("https"):
+        ssl_context = ssl.create_default_context()
+        if args.insecure:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+    pool = ConnectionPool(args.url, args.connections or args.concurrency, ssl_context, args.timeout)
+    stats = Stats()
+    stats.started = time.perf_counter()
+    deadline = stats.started + args.duration if args.duration else float("inf")
+    try:
+        if args.rate:
+            await run_open_loop(pool, args, payloads, stats, deadline)
+        else:
+            await run_closed_loop(pool, args, payloads, stats, deadline)
+    finally:
+        stats.finished = time.perf_counter()
+        pool.close()
+    return stats, pool
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="POST /api/email/send 压测脚本")
+    parser.add_argument("--url", default="http://localhost:5002", help="服务地址（默认 http://localhost:5002）")
+    parser.add_argument("--api-key", default=os.environ.get("NOTIFYHUB_APIKEY_DEFAULT"),
+                        help="API 密钥，默认读取环境变量 NOTIFYHUB_APIKEY_DEFAULT")
+    parser.add_argument("--concurrency", type=int, default=8, metavar="N",
+                        help="闭环模式的并发请求数（默认 8）")
+    parser.add_argument("--rate", type=float, metavar="RPS", help="开环模式：每秒到达的请求数（泊松分布）")
+    parser.add_argument("--connections", type=int, metavar="N",
+                        help="连接池大小，默认等于 --concurrency")
+    parser.add_argument("--duration", type=float, default=30.0, metavar="SECONDS",
+                        help="压测时长（默认 30 秒，0 表示只受 --requests 限制）")
+    parser.add_argument("--requests", type=int, default=0, metavar="N", help="最多发送的请求数（默认不限）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"请求形态比例（默认 {DEFAULT_MIX}）")
+    parser.add_argument("--domain", default="example.com", help="收件人邮箱域名（默认 example.com）")
+    parser.add_argument("--recipients", type=int, default=30, metavar="N",
+                        help=f"fanout 形态的 To/Cc/Bcc 收件人总数（最多 {MAX_RECIPIENTS}，默认 30）")
+    parser.add_argument("--attachment-count", type=int, default=2, metavar="N",
+                        help=f"attachments 形态的附件数（最多 {MAX_ATTACHMENT_COUNT}，默认 2）")
+    parser.add_argument("--attachment-size", type=int, default=256 * 1024, metavar="BYTES",
+                        help="每个附件解码后的字节数，会限制在 AttachmentSettings 的上限内（默认 256 KB）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="单个请求的超时秒数（默认 30）")
+    parser.add_argument("--insecure", action="store_true", help="HTTPS 时不校验证书")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（默认 42）")
+    parser.add_argument("--json", metavar="FILE", help="把结果以 JSON 写入文件")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("需要 --api-key 或环境变量 NOTIFYHUB_APIKEY_DEFAULT")
+    if not args.duration and not args.requests:
+        parser.error("--duration 为 0 时需要指定 --requests")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate 必须大于 0")
+    if args.concurrency <= 0 or (args.connections is not None and args.connections <= 0):
+        parser.error("--concurrency 和 --connections 必须大于 0")
+    if args.attachment_count <= 0 or args.attachment_size <= 0 or args.recipients <= 0:
+        parser.error("--recipients、--attachment-count 和 --attachment-size 必须大于 0")
+    try:
+        args.mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    args.url = args.url.rstrip("/")
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    payloads = PayloadMix(args.mix, args, args.seed)
+    mode = f"开环 {args.rate} req/s" if args.rate else f"闭环 {args.concurrency} 并发"
+    print(f"压测 {args.url}{SEND_PATH}（{mode}）...", flush=True)
+
+    try:
+        stats, pool = asyncio.run(run(args, payloads))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    summary = stats.summary(pool)
+    print_report(summary, stats)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
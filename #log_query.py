@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serilog 滚动日志查询脚本
+为 logs/notifyhub*.log、logs/security-scan*.log（含 .gz 归档）建立稀疏索引，按时间范围和 RequestId 查询
+- 索引按文件保存：每隔约 BLOCK_SIZE 字节记录一个事件起点的 (时间戳, 偏移)，
+  另为每个块保存 RequestId 的布隆过滤器；活动日志继续增长时只补建新增部分
+- 查询只读取时间范围内、且布隆过滤器可能包含该 RequestId 的块，多个文件用进程池并行扫描
+- .gz 归档无法随机定位，读到块起点前的内容仍需解压，但不需要匹配；时间范围外的归档整个跳过
+
+日志事件以 "[yyyy-MM-dd HH:mm:ss" 开头，异常堆栈等没有时间戳的行属于前一个事件
+"""
+
+import os
+import argparse
+import base64
+import glob
+import gzip
+import hashlib
+import json
+import multiprocessing
+import re
+import sys
+
+# RequestId 的字符集变化时递增，使旧索引中的布隆过滤器失效
+INDEX_VERSION = 2
+DEFAULT_INDEX = ".log_index.json"
+DEFAULT_PATTERNS = ["notifyhub*.log*", "security-scan*.log*"]
+# 索引点间隔（未压缩字节数）
+BLOCK_SIZE = 1024 * 1024
+# 建索引时每次读取的字节数
+READ_SIZE = 4 * 1024 * 1024
+# 用于识别文件是否被替换的开头字节数
+HEAD_BYTES = 4096
+
+EVENT_START_RE = re.compile(rb"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)", re.MULTILINE)
+# Kestrel 的 TraceIdentifier 形如 0HN1GLJ2L7K0500:00000001，id 内部允许 ":" 和 "."，
+# 末尾的标点（例如句号）不算在内
+REQUEST_ID_RE = re.compile(rb"RequestId[\"']?\s*[:=]\s*[\"']?([A-Za-z0-9_-]+(?:[:.][A-Za-z0-9_-]+)*)")
+TIMESTAMP_LENGTH = 19
+
+# 布隆过滤器：每个 RequestId 10 位、7 个哈希，误判率约 1%
+BLOOM_BITS_PER_ITEM = 10
+BLOOM_HASHES = 7
+
+def is_gzip(path):
+    return path.endswith(".gz")
+
+def open_log(path):
+    return gzip.open(path, "rb") if is_gzip(path) else open(path, "rb")
+
+# ---------------------------------------------------------------------------
+# 布隆过滤器
+# ---------------------------------------------------------------------------
+
+def _bloom_positions(token, bits):
+    digest = hashlib.blake2b(token, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(BLOOM_HASHES)]
+
+def bloom_build(tokens):
+    """由 RequestId 集合生成布隆过滤器，返回 Base64 字符串（空集合返回空串）"""
+    if not tokens:
+        return ""
+    bits = max(64, len(tokens) * BLOOM_BITS_PER_ITEM)
+    array = bytearray((bits + 7) // 8)
+    for token in tokens:
+        for pos in _bloom_positions(token, len(array) * 8):
+            array[pos >> 3] |= 1 << (pos & 7)
+    return base64.b64encode(bytes(array)).decode("ascii")
+
+def bloom_contains(encoded, token):
+    if not encoded:
+        return False
+    array = base64.b64decode(encoded)
+    return all(array[pos >> 3] & (1 << (pos & 7)) for pos in _bloom_positions(token, len(array) * 8))
+
+# ---------------------------------------------------------------------------
+# 建索引
+# ---------------------------------------------------------------------------
+
+def file_signature(path):
+    """(大小, 修改时间, 开头内容哈希)，用于判断文件是否变化或被替换"""
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        head = hashlib.blake2b(f.read(HEAD_BYTES), digest_size=16).hexdigest()
+    return st.st_size, st.st_mtime_ns, head
+
+def last_event_ts(region):
+    """一段内容中最后一个事件的时间戳，没有事件起点时返回 None"""
+    pos = len(region)
+    while pos > 0:
+        pos = region.rfind(b"\n[", 0, pos)
+        if pos < 0:
+            break
+        m = EVENT_START_RE.match(region, pos + 1)
+        if m is not None:
+            return m.group(1).decode("ascii")
+    m = EVENT_START_RE.match(region)
+    return m.group(1).decode("ascii") if m is not None else None
+
+class IndexBuilder:
+    """从字节流（只包含完整行的片段）逐段建立索引点和每个块的 RequestId 集合"""
+
+    def __init__(self, points, blooms, start_offset, block_size=BLOCK_SIZE):
+        self.points = points
+        self.blooms = blooms
+        self.block_size = block_size
+        self.offset = start_offset
+        self.next_point = start_offset
+        self.tokens = None      # 当前块的 RequestId，None 表示还没有块
+        self.last_ts = points[-1][0] if points else None
+
+    def _close_block(self):
+        if self.tokens is not None:
+            self.blooms.append(bloom_build(self.tokens))
+
+    def _collect(self, region, start, end):
+        if self.tokens is not None and start < end:
+            self.tokens.update(REQUEST_ID_RE.findall(region, start, end))
+
+    def feed(self, region):
+        """region 以换行结束，起始于当前偏移"""
+        pos = 0
+        while True:
+            m = EVENT_START_RE.search(region, max(pos, self.next_point - self.offset))
+            if m is None:
+                break
+            self._collect(region, pos, m.start())
+            self._close_block()
+            self.points.append([m.group(1).decode("ascii"), self.offset + m.start()])
+            self.tokens = set()
+            pos = m.start()
+            self.next_point = self.offset + m.start() + self.block_size
+        self._collect(region, pos, len(region))
+        last_ts = last_event_ts(region)
+        if last_ts is not None:
+            self.last_ts = last_ts
+        self.offset += len(region)
+
+    def finish(self):
+        self._close_block()
+        self.tokens = None
+
+def build_entry(task):
+    """建立或补建单个文件的索引（供进程池调用），返回 (路径, 索引条目, 是否重建, 错误)"""
+    path, old = task
+    try:
+        size, mtime_ns, head = file_signature(path)
+        if old is not None and old['size'] == size and old['mtime_ns'] == mtime_ns and old['head'] == head:
+            return path, old, False, None
+        points, blooms, start = [], [], 0
+        if old is not None and not is_gzip(path) and old['head'] == head and size >= old['end'] and old['points']:
+            # 活动日志只是追加了内容：从最后一个块重新开始
+            points = old['points'][:-1]
+            blooms = old['blooms'][:-1]
+            start = old['points'][-1][1]
+        builder = IndexBuilder(points, blooms, start)
+        with open_log(path) as f:
+            f.seek(start)
+            carry = b""
+            for chunk in iter(lambda: f.read(READ_SIZE), b""):
+                chunk = carry + chunk
+                cut = chunk.rfind(b"\n") + 1
+                carry = chunk[cut:]
+                if cut:
+                    builder.feed(chunk[:cut])
+        builder.finish()
+        entry = {
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'head': head,
+            'end': builder.offset,
+            'points': points,
+            'blooms': blooms,
+            'first_ts': points[0][0] if points else None,
+            'last_ts': builder.last_ts,
+        }
+        return path, entry, True, None
+    except (OSError, EOFError, gzip.BadGzipFile) as e:
+        return path, None, False, e
+
+def load_index(path):
+    """读取索引，损坏或版本不符时当作空索引"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != INDEX_VERSION:
+        return {}
+    return data.get('files', {})
+
+def save_index(path, files):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({'version': INDEX_VERSION, 'files': files}, f)
+    os.replace(tmp_path, path)
+
+def update_index(paths, index, pool):
+    """建立或补建所有文件的索引，返回 {文件名: 条目}，已删除的文件不再保留"""
+    tasks = [(path, index.get(os.path.basename(path))) for path in paths]
+    results = pool.imap(build_entry, tasks) if pool is not None else map(build_entry, tasks)
+    files = {}
+    rebuilt = 0
+    for path, entry, changed, error in results:
+        name = os.path.basename(path)
+        if error is not None:
+            print(f"无法建立索引 {path}: {error}", file=sys.stderr)
+            continue
+        rebuilt += changed
+        files[name] = entry
+    return files, rebuilt
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+def after_end(ts, end):
+    """ts 是否晚于 end；end 可以只写到日期或分钟"""
+    return end is not None and ts[:len(end)] > end
+
+def select_ranges(entry, start, end, request_id):
+    """选出需要扫描的块，合并相邻块，返回 [(起始偏移, 结束偏移)]"""
+    points = entry['points']
+    ranges = []
+    token = request_id.encode("utf-8") if request_id else None
+    for i, (ts, offset) in enumerate(points):
+        block_end = points[i + 1][1] if i + 1 < len(points) else entry['end']
+        block_last = points[i + 1][0] if i + 1 < len(points) else entry['last_ts']
+        if start is not None and block_last is not None and block_last < start:
+            continue
+        if after_end(ts, end):
+            break
+        if token is not None and not bloom_contains(entry['blooms'][i], token):
+            continue
+        if ranges and ranges[-1][1] == offset:
+            ranges[-1][1] = block_end
+        else:
+            ranges.append([offset, block_end])
+    return ranges
+
+def iter_events(region):
+    """把一段以事件起点开头的内容切分成 (时间戳, 事件文本)"""
+    starts = [m.start() for m in EVENT_START_RE.finditer(region)]
+    for i, pos in enumerate(starts):
+        stop = starts[i + 1] if i + 1 < len(starts) else len(region)
+        yield region[pos + 1:pos + 1 + TIMESTAMP_LENGTH].decode("ascii"), region[pos:stop]
+
+def scan_file(task):
+    """扫描单个文件中选中的块（供进程池调用），返回 (路径, 匹配的事件, 扫描字节数, 错误)"""
+    path, ranges, start, end, request_id, pattern = task
+    token = request_id.encode("utf-8") if request_id else None
+    regex = re.compile(pattern.encode("utf-8")) if pattern else None
+    matches = []
+    scanned = 0
+    try:
+        with open_log(path) as f:
+            for begin, stop in ranges:
+                f.seek(begin)
+                region = f.read(stop - begin)
+                scanned += len(region)
+                if token is not None and token not in region:
+                    continue
+                for ts, event in iter_events(region):
+                    if start is not None and ts < start:
+                        continue
+                    if after_end(ts, end):
+                        break
+                    if token is not None and token not in event:
+                        continue
+                    if regex is not None and regex.search(event) is None:
+                        continue
+                    matches.append(event.decode("utf-8", "replace").rstrip("\r\n"))
+    except (OSError, EOFError, gzip.BadGzipFile) as e:
+        return path, matches, scanned, e
+    return path, matches, scanned, None
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Serilog 滚动日志查询脚本")
+    parser.add_argument("--log-dir", default="logs", help="日志目录（默认 logs）")
+    parser.add_argument("--files", action="append", metavar="GLOB",
+                        help=f"日志文件名模式，可重复指定（默认 {' '.join(DEFAULT_PATTERNS)}）")
+    parser.add_argument("--index", metavar="FILE", help=f"索引文件（默认 <日志目录>/{DEFAULT_INDEX}）")
+    parser.add_argument("--from", dest="start", metavar="TIME", help="起始时间，如 \"2025-01-02 10:00\"")
+    parser.add_argument("--to", dest="end", metavar="TIME", help="结束时间（含），可以只写到日期或分钟")
+    parser.add_argument("--request-id", help="只输出包含该 RequestId 的事件")
+    parser.add_argument("--grep", metavar="REGEX", help="只输出匹配该正则的事件")
+    parser.add_argument("--limit", type=int, default=0, metavar="N", help="最多输出 N 个事件（默认不限）")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="并行进程数（默认 0 表示使用全部 CPU 核心，1 表示单进程）")
+    parser.add_argument("--index-only", action="store_true", help="只建立或更新索引")
+    args = parser.parse_args()
+    if not args.index_only and not (args.start or args.end or args.request_id or args.grep):
+        parser.error("至少需要 --from/--to、--request-id、--grep 之一（或使用 --index-only）")
+    if args.grep:
+        try:
+            re.compile(args.grep)
+        except re.error as e:
+            parser.error(f"--grep 正则无效: {e}")
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    index_file = args.index or os.path.join(args.log_dir, DEFAULT_INDEX)
+    paths = sorted({path for pattern in (args.files or DEFAULT_PATTERNS)
+                    for path in glob.glob(os.path.join(args.log_dir, pattern))
+                    if os.path.isfile(path) and not path.endswith(".tmp")})
+    if not paths:
+        print(f"未找到日志文件: {args.log_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    pool = multiprocessing.Pool(min(jobs, len(paths))) if jobs > 1 and len(paths) > 1 else None
+    try:
+        files, rebuilt = update_index(paths, load_index(index_file), pool)
+        save_index(index_file, files)
+        print(f"索引: {len(files)} 个文件, 本次更新 {rebuilt} 个", file=sys.stderr)
+        if args.index_only:
+            return
+
+        tasks = []
+        for path in paths:
+            entry = files.get(os.path.basename(path))
+            if entry is None:
+                continue
+            ranges = select_ranges(entry, args.start, args.end, args.request_id)
+            if ranges:
+                tasks.append((entry['first_ts'] or "", path, ranges))
+        # 按时间顺序输出
+        tasks.sort()
+        scan_tasks = [(path, ranges, args.start, args.end, args.request_id, args.grep)
+                      for _, path, ranges in tasks]
+        results = pool.imap(scan_file, scan_tasks) if pool is not None else map(scan_file, scan_tasks)
+
+        printed = 0
+        scanned = 0
+        for path, matches, scanned_bytes, error in results:
+            scanned += scanned_bytes
+            if error is not None:
+                print(f"无法读取 {path}: {error}", file=sys.stderr)
+            for event in matches:
+                print(f"{os.path.basename(path)}: {event}")
+                printed += 1
+                if args.limit and printed >= args.limit:
+                    break
+            if args.limit and printed >= args.limit:
+                break
+        total = sum(entry['end'] for entry in files.values())
+        print(f"匹配 {printed} 个事件, 扫描 {scanned / 1024 / 1024:.1f} MB / 共 {total / 1024 / 1024:.1f} MB",
+              file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+if __name__ == "__main__":
+    main()
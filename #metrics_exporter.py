@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NotifyHub 指标导出脚本
+增量读取日志尾部并定时探测 /api/email/health，以 Prometheus 文本格式在 /metrics 提供指标，
+不需要在 .NET 进程里加探针
+- email-sent-*.log：按项目、分类、结果统计发送数，以及收件人数、附件数和附件字节数
+- security-scan*.log：安全扫描和可疑请求告警数
+- notifyhub*.log：IpRateLimiting 限流（429）次数和 IP 封禁次数
+- 每次抓取时只读取上次偏移之后新增的字节，写了一半的行留到下次；
+  --state 保存偏移和计数，重启后继续累计而不重新解析旧日志
+"""
+
+import os
+import argparse
+import glob
+import hashlib
+import http.client
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from emaillog import LINE_RE as EMAIL_LINE_RE, LOG_PATTERN as EMAIL_LOG_PATTERN, SUCCESS
+
+STATE_VERSION = 1
+# 文件开头用于识别文件是否被替换的字节数
+HEAD_BYTES = 256
+# 单次最多读取的新增字节，积压很多时分几次抓取读完
+MAX_READ = 64 * 1024 * 1024
+
+HEALTH_PATH = "/api/email/health"
+HEALTH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# security-scan.log 的过滤条件是消息包含“安全扫描”或“可疑请求”
+SECURITY_KINDS = (("scan", "安全扫描".encode("utf-8")), ("suspicious", "可疑请求".encode("utf-8")))
+SECURITY_EVENT_RE = re.compile(rb"^\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\][^\n]*", re.MULTILINE)
+# AspNetCoreRateLimit 拒绝请求时的日志，以及 EnhancedSecurityMiddleware 封禁 IP 的日志
+RATE_LIMIT_RE = re.compile(rb"has been blocked, quota")
+IP_BAN_RE = re.compile("IP已被封禁".encode("utf-8"))
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Metrics:
+    """所有计数，键为标签值元组"""
+
+    def __init__(self):
+        self.emails = {}            # (项目, 分类, 结果) -> 数量
+        self.recipients = {}        # (项目, 分类) -> 收件人数
+        self.attachments = {}       # (项目, 分类) -> 附件数
+        self.attachment_bytes = {}  # (项目, 分类) -> 字节数（日志中的 MB 保留两位小数）
+        self.security = {}          # (类型,) -> 数量
+        self.rate_limited = 0
+        self.ip_bans = 0
+        self.unparsed = 0
+        self.bytes_parsed = 0
+
+    def to_json(self):
+        return {
+            name: [list(key) + [value] for key, value in getattr(self, name).items()]
+            for name in ("emails", "recipients", "attachments", "attachment_bytes", "security")
+        } | {name: getattr(self, name) for name in ("rate_limited", "ip_bans", "unparsed", "bytes_parsed")}
+
+    @classmethod
+    def from_json(cls, data):
+        metrics = cls()
+        for name in ("emails", "recipients", "attachments", "attachment_bytes", "security"):
+            setattr(metrics, name, {tuple(row[:-1]): row[-1] for row in data.get(name, [])})
+        for name in ("rate_limited", "ip_bans", "unparsed", "bytes_parsed"):
+            setattr(metrics, name, data.get(name, 0))
+        return metrics
+
+def add(counts, key, value=1):
+    counts[key] = counts.get(key, 0) + value
+
+def parse_email_sent(data, metrics):
+    for m in EMAIL_LINE_RE.finditer(data):
+        if m.group('hour') is None:
+            if m.group('other'):
+                metrics.unparsed += 1
+            continue
+        group = (m.group('project').decode("utf-8", "replace"), m.group('category').decode("utf-8", "replace"))
+        add(metrics.emails, group + ("success" if m.group('status') == SUCCESS else "failure",))
+        add(metrics.recipients, group, int(m.group('recipients')))
+        if m.group('files') is not None:
+            add(metrics.attachments, group, int(m.group('files')))
+            add(metrics.attachment_bytes, group, round(float(m.group('mb')) * 1024 * 1024))
+
+def parse_security(data, metrics):
+    for m in SECURITY_EVENT_RE.finditer(data):
+        line = m.group(0)
+        kind = next((name for name, marker in SECURITY_KINDS if marker in line), "other")
+        add(metrics.security, (kind,))
+
+def parse_service(data, metrics):
+    metrics.rate_limited += len(RATE_LIMIT_RE.findall(data))
+    metrics.ip_bans += len(IP_BAN_RE.findall(data))
+
+# (文件名模式, 解析函数)
+LOG_SOURCES = (
+    (EMAIL_LOG_PATTERN, parse_email_sent),
+    ("security-scan*.log", parse_security),
+    ("notifyhub*.log", parse_service),
+)
+
+class LogTailer:
+    """按保存的偏移增量读取日志目录下的各类日志"""
+
+    def __init__(self, log_dir, metrics, offsets=None, from_start=False):
+        self.log_dir = log_dir
+        self.metrics = metrics
+        self.offsets = offsets or {}   # 文件名 -> [偏移, 开头哈希]
+        # 没有保存的偏移时，默认从当前末尾开始，只统计之后的新日志
+        self.from_start = from_start or bool(offsets)
+        self.first_poll = True
+
+    def poll(self):
+        """读取所有日志的新增部分，返回本次解析的字节数"""
+        parsed = 0
+        seen = set()
+        for pattern, parser in LOG_SOURCES:
+            for path in sorted(glob.glob(os.path.join(self.log_dir, pattern))):
+                name = os.path.basename(path)
+                if name in seen:
+                    continue
+                seen.add(name)
+                try:
+                    parsed += self._poll_file(path, name, parser)
+                except OSError as e:
+                    print(f"无法读取 {path}: {e}", file=sys.stderr)
+        # 已删除的日志不再跟踪
+        for name in list(self.offsets):
+            if name not in seen:
+                del self.offsets[name]
+        self.first_poll = False
+        self.metrics.bytes_parsed += parsed
+        return parsed
+
+    def _poll_file(self, path, name, parser):
+        size = os.path.getsize(path)
+        offset, head = self.offsets.get(name, (None, None))
+        if offset is not None and offset == size:
+            return 0
+        with open(path, "rb") as f:
+            current_head = hashlib.blake2b(f.read(HEAD_BYTES), digest_size=16).hexdigest()
+            if offset is None:
+                # 首次启动时已有的文件从末尾开始；之后新出现的文件从头读取
+                offset = size if self.first_poll and not self.from_start else 0
+            elif size < offset or (offset >= HEAD_BYTES and head != current_head):
+                # 文件被截断或替换
+                offset = 0
+            f.seek(offset)
+            data = f.read(min(size - offset, MAX_READ))
+        end = data.rfind(b"\n") + 1
+        if end:
+            parser(data[:end], self.metrics)
+        # 开头哈希只在文件已超过 HEAD_BYTES 时才稳定
+        self.offsets[name] = [offset + end, current_head]
+        return end
+
+class HealthProber:
+    """定时探测健康检查接口，记录耗时直方图和结果"""
+
+    def __init__(self, url, interval, timeout):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/") + HEALTH_PATH
+        self.interval = interval
+        self.timeout = timeout
+        self.buckets = [0] * len(HEALTH_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.results = {}
+        self.up = 0
+        self.lock = threading.Lock()
+
+    def probe(self):
+        conn_cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = conn_cls(self.host, self.port, timeout=self.timeout)
+        started = time.perf_counter()
+        try:
+            conn.request("GET", self.path, headers={"Accept": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+            healthy = response.status == 200 and b"Healthy" in body
+            result = "healthy" if healthy else f"http_{response.status}"
+        except (OSError, http.client.HTTPException):
+            healthy, result = False, "error"
+        finally:
+            conn.close()
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.count += 1
+            self.sum += elapsed
+            for i, bound in enumerate(HEALTH_BUCKETS):
+                if elapsed <= bound:
+                    self.buckets[i] += 1
+            add(self.results, result)
+            self.up = 1 if healthy else 0
+
+    def run(self, stop):
+        while not stop.is_set():
+            self.probe()
+            stop.wait(self.interval)
+
+    def lines(self):
+        with self.lock:
+            lines = [
+                "# HELP notifyhub_health_up 最近一次健康检查是否正常",
+                "# TYPE notifyhub_health_up gauge",
+                f"notifyhub_health_up {self.up}",
+                "# HELP notifyhub_health_probe_duration_seconds 健康检查耗时",
+                "# TYPE notifyhub_health_probe_duration_seconds histogram",
+            ]
+            for bound, count in zip(HEALTH_BUCKETS, self.buckets):
+                lines.append(f'notifyhub_health_probe_duration_seconds_bucket{{le="{bound}"}} {count}')
+            lines += [
+                f'notifyhub_health_probe_duration_seconds_bucket{{le="+Inf"}} {self.count}',
+                f"notifyhub_health_probe_duration_seconds_sum {self.sum:.6f}",
+                f"notifyhub_health_probe_duration_seconds_count {self.count}",
+                "# HELP notifyhub_health_probes_total 健康检查次数，按结果",
+                "# TYPE notifyhub_health_probes_total counter",
+            ]
+            for result, count in sorted(self.results.items()):
+                lines.append(f'notifyhub_health_probes_total{{result="{result}"}} {count}')
+        return lines
+
+def counter_lines(name, help_text, labels, counts):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, value in sorted(counts.items()):
+        label_text = ",".join(f'{label}="{escape_label(str(v))}"' for label, v in zip(labels, key))
+        lines.append(f"{name}{{{label_text}}} {value}")
+    return lines
+
+def render_metrics(metrics, prober=None, scrape_seconds=0.0):
+    lines = []
+    lines += counter_lines("notifyhub_emails_total", "发送的邮件数，按项目、分类和结果",
+                           ("project", "category", "status"), metrics.emails)
+    lines += counter_lines("notifyhub_email_recipients_total", "收件人数（To/Cc/Bcc 合计）",
+                           ("project", "category"), metrics.recipients)
+    lines += counter_lines("notifyhub_email_attachments_total", "附件数", ("project", "category"), metrics.attachments)
+    lines += counter_lines("notifyhub_email_attachment_bytes_total", "附件字节数（由日志中的 MB 换算）",
+                           ("project", "category"), metrics.attachment_bytes)
+    lines += counter_lines("notifyhub_security_events_total", "security-scan 日志中的告警数，按类型",
+                           ("kind",), metrics.security)
+    for name, help_text, value in (
+            ("notifyhub_rate_limited_total", "IpRateLimiting 拒绝的请求数（429）", metrics.rate_limited),
+            ("notifyhub_ip_bans_total", "封禁 IP 的次数", metrics.ip_bans),
+            ("notifyhub_exporter_unparsed_lines_total", "无法解析的邮件日志行数", metrics.unparsed),
+            ("notifyhub_exporter_log_bytes_total", "已解析的日志字节数", metrics.bytes_parsed)):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    if prober is not None:
+        lines += prober.lines()
+    lines += ["# HELP notifyhub_exporter_scrape_duration_seconds 本次抓取读取日志的耗时",
+              "# TYPE notifyhub_exporter_scrape_duration_seconds gauge",
+              f"notifyhub_exporter_scrape_duration_seconds {scrape_seconds:.6f}"]
+    return "\n".join(lines) + "\n"
+
+class Exporter:
+    """在每次抓取时增量读取日志并输出指标"""
+
+    def __init__(self, tailer, prober, state_file=None):
+        self.tailer = tailer
+        self.prober = prober
+        self.state_file = state_file
+        self.lock = threading.Lock()
+
+    def scrape(self):
+        with self.lock:
+            started = time.perf_counter()
+            self.tailer.poll()
+            elapsed = time.perf_counter() - started
+            if self.state_file:
+                save_state(self.state_file, self.tailer)
+            return render_metrics(self.tailer.metrics, self.prober, elapsed)
+
+def load_state(path):
+    """读取保存的偏移和计数，损坏或版本不符时返回 (None, None)"""
+    if not path or not os.path.exists(path):
+        return None, None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if data.get('version') != STATE_VERSION:
+        return None, None
+    return data.get('offsets', {}), Metrics.from_json(data.get('metrics', {}))
+
+def save_state(path, tailer):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({'version': STATE_VERSION, 'offsets': tailer.offsets,
+                   'metrics': tailer.metrics.to_json()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def make_handler(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.scrape().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotifyHub 指标导出脚本（Prometheus 格式）")
+    parser.add_argument("--log-dir", default="logs", help="日志目录（默认 logs）")
+    parser.add_argument("--listen", default="127.0.0.1:9464", metavar="HOST:PORT",
+                        help="/metrics 的监听地址（默认 127.0.0.1:9464）")
+    parser.add_argument("--url", default="http://localhost:5002",
+                        help="服务地址，用于探测健康检查接口（默认 http://localhost:5002）")
+    parser.add_argument("--health-interval", type=float, default=15.0, metavar="SECONDS",
+                        help="健康检查间隔（默认 15 秒，0 表示不探测）")
+    parser.add_argument("--health-timeout", type=float, default=5.0, metavar="SECONDS",
+                        help="健康检查超时（默认 5 秒）")
+    parser.add_argument("--state", metavar="FILE", help="保存读取偏移和计数的文件，重启后继续累计")
+    parser.add_argument("--from-start", action="store_true",
+                        help="首次启动时从头统计已有日志（默认只统计启动之后的新日志）")
+    parser.add_argument("--once", action="store_true", help="读取一次日志并输出指标后退出")
+    args = parser.parse_args()
+    host, _, port = args.listen.rpartition(":")
+    if not port.isdigit():
+        parser.error("--listen 格式应为 HOST:PORT")
+    args.listen = (host or "0.0.0.0", int(port))
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    offsets, metrics = load_state(args.state)
+    tailer = LogTailer(args.log_dir, metrics or Metrics(), offsets, from_start=args.from_start)
+    prober = HealthProber(args.url, args.health_interval, args.health_timeout) if args.health_interval > 0 else None
+    exporter = Exporter(tailer, prober, args.state)
+
+    if args.once:
+        if prober is not None:
+            prober.probe()
+        sys.stdout.write(exporter.scrape())
+        return
+
+    # 启动时先读一次，确定已有日志的起始偏移
+    exporter.scrape()
+    stop = threading.Event()
+    if prober is not None:
+        threading.Thread(target=prober.run, args=(stop,), name="health-probe", daemon=True).start()
+    server = ThreadingHTTPServer(args.listen, make_handler(exporter))
+    print(f"指标地址: http://{args.listen[0]}:{args.listen[1]}/metrics", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -7,78 +7,341 @@ NotifyHubAPI 项目代码打包脚本
 """
 
 import os
+import argparse
 import datetime
+import functools
+import hashlib
+import heapq
+import io
 import json
+import logging
+import mmap
+import multiprocessing
 import re
+import sys
+import time
 
-# ✨敏感信息保护功能
-def mask_value(val: str, min_show: int = None) -> str:
-    """
-    根据字符串长度智能掩码
-    - 短值（≤8字符）：显示前4位 + ****
-    - 中等值（9-16字符）：显示前8位 + ****
-    - 长值（>16字符）：显示前16位 + ****
-    """
-    if not val:
-        return val
-    
-    if min_show is not None:
-        show_chars = min_show
-    elif len(val) <= 8:
-        show_chars = min(4, len(val))
-    elif len(val) <= 16:
-        show_chars = 8
+from csharp_minify import minify_csharp
+from masking import load_rules, mask_connection_string, mask_value
+from treewalk import INSIDE, PathPrefixTrie, walk_tree
+
+# 超过该大小的文件通过 mmap 逐行读取，避免整块读入内存
+STREAM_MMAP_THRESHOLD = 8 * 1024 * 1024
+# 输出文件的写缓冲区大小
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+# 遍历时直接剪枝的目录（按目录名精确匹配）
+SKIP_DIRS = {"bin", "obj", "publish", ".vs", ".git"}
+# 进度行的最短刷新间隔（秒）
+PROGRESS_INTERVAL = 0.2
+
+log = logging.getLogger("packager")
+
+# 掩码逻辑（mask_value、各规则的替换方式）变化时递增，使旧缓存失效
+MASKING_RULES_VERSION = 3
+
+class PackProfiler:
+    """--profile 模式下累计各阶段耗时、每条掩码规则的耗时和命中次数、每个文件的耗时"""
+
+    def __init__(self):
+        self.phases = {}
+        self.rules = {}   # 规则名 -> [耗时, 命中次数]
+        self.files = []   # (耗时, 路径)
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_rule(self, name: str, seconds: float = 0.0, hits: int = 0):
+        stats = self.rules.setdefault(name, [0.0, 0])
+        stats[0] += seconds
+        stats[1] += hits
+
+    def apply_rules(self, rules, text: str) -> str:
+        """依次应用规则并计时，内容被改变才算命中"""
+        for rule in rules:
+            start = time.perf_counter()
+            replaced = rule.pattern.sub(rule.replace, text)
+            self.add_rule(rule.name, time.perf_counter() - start, replaced != text)
+            text = replaced
+        return text
+
+    def add_file(self, path: str, read: float, mask: float, write: float):
+        self.add_phase("read", read)
+        self.add_phase("mask", mask)
+        self.add_phase("write", write)
+        self.files.append((read + mask + write, path))
+
+    def report(self, total: float, top: int = 10):
+        print("\n性能分析 (--profile):")
+        print(f"  总耗时: {total:.3f}s")
+        for name, seconds in sorted(self.phases.items(), key=lambda x: -x[1]):
+            share = seconds / total * 100 if total else 0.0
+            print(f"  {name:<8} {seconds:8.3f}s  {share:5.1f}%")
+        if self.rules:
+            print("\n掩码规则:")
+            for name, (seconds, hits) in sorted(self.rules.items(), key=lambda x: -x[1][0]):
+                print(f"  {name:<26} {seconds:8.3f}s  命中 {hits}")
+        if self.files and top > 0:
+            print(f"\n最慢的 {min(top, len(self.files))} 个文件:")
+            for seconds, path in heapq.nlargest(top, self.files):
+                print(f"  {seconds * 1000:9.2f}ms  {path}")
+
+# 启用 --profile 时由 main() 设置，未启用时为 None，热路径只多一次判断
+_profiler = None
+
+class TimedIterator:
+    """包装迭代器并累计每次取值的耗时"""
+
+    __slots__ = ("it", "seconds")
+
+    def __init__(self, iterable):
+        self.it = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self.it)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+class ProgressLine:
+    """限速刷新的单行进度，只在 stderr 是终端时显示"""
+
+    def __init__(self, label: str, total: int = None, enabled: bool = True):
+        self.label = label
+        self.total = total
+        self.enabled = enabled and sys.stderr.isatty()
+        self.last = 0.0
+        self.width = 0
+
+    def update(self, count: int, detail: str = ""):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        text = f"{self.label}: {count}" + (f"/{self.total}" if self.total else "")
+        if detail:
+            text += f"  {detail}"
+        sys.stderr.write("\r" + text.ljust(self.width))
+        sys.stderr.flush()
+        self.width = len(text)
+
+    def done(self):
+        """清除进度行，之后的日志从行首开始"""
+        if self.width:
+            sys.stderr.write("\r" + " " * self.width + "\r")
+            sys.stderr.flush()
+            self.width = 0
+
+# ✨敏感信息保护功能：规则从 masking_rules.json 加载，与其他脚本共用
+RULES = load_rules()
+SENSITIVE_KEYWORDS = list(RULES.keywords)
+
+# 各文件类型的预编译规则（C# 规则逐行应用）
+CSHARP_RULES = RULES.group("csharp").rules
+XML_MASKER = RULES.group("xml")
+
+# 检查键名是否包含敏感关键词
+is_sensitive_key = RULES.is_sensitive_key
+# 关键词预过滤：不含任何关键词的行不可能命中任何一条规则，直接跳过
+contains_sensitive_keyword = RULES.contains_keyword
+
+def get_rules_fingerprint(compact: bool = False) -> str:
+    """掩码规则指纹：规则配置、规则版本或输出模式变化时缓存全部失效"""
+    payload = json.dumps([MASKING_RULES_VERSION, RULES.fingerprint, compact])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MaskTracker:
+    """记录掩码过程中是否有内容被替换，用于统计受保护文件数"""
+    __slots__ = ('masked',)
+
+    def __init__(self):
+        self.masked = False
+
+    def mark(self, original, masked):
+        if masked != original:
+            self.masked = True
+        return masked
+
+# 流式 JSON 处理时每次解析的块大小（按整行切分）
+JSON_BLOCK_SIZE = 64 * 1024
+
+# JSON 字符串不能包含原始换行，因此按行切块不会截断字符串
+_JSON_STRING = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+JSON_STRING_PATTERN = re.compile(_JSON_STRING)
+# JSON/JSONC 词法扫描：
+# - skip: 与掩码无关的连续内容（结构符号、数字、数组元素、值不是字符串的键等），一次匹配整段跳过
+# - key/value: 同一块内的 "键": "字符串值"
+# - open_key: 位于块末尾的键，值在下一块
+# - comment_key: 后面紧跟注释的键（冒号可能在注释前或注释后），值在注释之后
+# - line_comment / block_comment: 注释原样输出
+JSON_TOKEN_PATTERN = re.compile(
+    r'(?P<skip>(?:[^"/]+|' + _JSON_STRING + r'(?!\s*(?::\s*(?:"|\Z|/[/*])|\Z|/[/*]))|/(?![/*]))+)'
+    r'|(?P<key>' + _JSON_STRING + r')\s*:\s*(?P<value>' + _JSON_STRING + r')'
+    r'|(?P<open_key>' + _JSON_STRING + r')\s*(?P<colon>:)?\s*\Z'
+    r'|(?P<comment_key>' + _JSON_STRING + r')\s*(?P<comment_colon>:)?\s*(?=/[/*])'
+    r'|(?P<line_comment>//)'
+    r'|(?P<block_comment>/\*)')
+
+def _decode_json_string(token: str):
+    """解码字符串词法单元，无转义时直接取原文"""
+    raw = token[1:-1]
+    if '\\' not in raw:
+        return raw
+    try:
+        return json.loads(token)
+    except ValueError:
+        return None
+
+@functools.lru_cache(maxsize=4096)
+def _sensitive_json_key(token: str):
+    """键名词法单元为敏感键时返回解码后的键名，否则返回 None（同名键大量重复，结果缓存）"""
+    key = _decode_json_string(token)
+    if key is not None and is_sensitive_key(key):
+        return key
+    return None
+
+def _mask_json_string(key: str, token: str, tracker: MaskTracker = None) -> str:
+    """掩码敏感键下的字符串值，返回新的词法单元"""
+    value = _decode_json_string(token)
+    if value is None:
+        return token
+    # 特殊处理连接字符串
+    if 'connection' in key.lower():
+        masked = mask_connection_string(value)
     else:
-        show_chars = 16
-    
-    if len(val) <= show_chars:
-        return val
-    return val[:show_chars] + '****'
-
-# ✨敏感信息关键词列表
-SENSITIVE_KEYWORDS = [
-    'password', 'pwd', 'passwd', 'secret', 'key', 'token', 'apikey', 'api_key',
-    'connectionstring', 'connstr', 'connection_string', 'hash', 'salt', 
-    'signature', 'private', 'credential', 'auth', 'jwt', 'bearer',
-    'database', 'server', 'userid', 'user_id', 'username', 'smtp', 'mail'
-]
-
-def is_sensitive_key(key: str) -> bool:
-    """检查键名是否包含敏感关键词"""
-    key_lower = key.lower()
-    return any(keyword in key_lower for keyword in SENSITIVE_KEYWORDS)
-
-def mask_connection_string(conn_str: str) -> str:
-    """智能处理连接字符串，只掩码敏感部分"""
-    if not conn_str:
-        return conn_str
+        masked = mask_value(value)
+    if masked == value:
+        return token
+    if tracker is not None:
+        tracker.masked = True
+    if _profiler is not None:
+        _profiler.add_rule("json.sensitive_key", hits=1)
+    if '\\' not in token:
+        # 原文没有转义字符时，掩码结果只包含原文字符和 "*"，无需重新转义
+        return '"' + masked + '"'
+    return json.dumps(masked, ensure_ascii=False)
+
+def _iter_line_blocks(chunks, block_size: int):
+    """把输入文本块合并成按整行切分、大小约为 block_size 的块"""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            buf = ''.join(parts)
+            cut = buf.rfind('\n') + 1
+            if cut:
+                yield buf[:cut]
+                rest = buf[cut:]
+                parts = [rest] if rest else []
+                size = len(rest)
+            else:
+                parts = [buf]
+    if parts:
+        yield ''.join(parts)
+
+def iter_json_masked(chunks, tracker: MaskTracker = None, block_size: int = JSON_BLOCK_SIZE):
+    """流式掩码 JSON/JSONC 文本
     
-    # 处理各种连接字符串格式
-    patterns = [
-        (r'(password|pwd)\s*=\s*([^;]+)', r'\1=****'),
-        (r'(user\s*id|uid|username)\s*=\s*([^;]+)', lambda m: f'{m.group(1)}={mask_value(m.group(2), 4)}'),
-        (r'(server|data\s*source)\s*=\s*([^;]+)', lambda m: f'{m.group(1)}={mask_value(m.group(2), 8)}'),
-    ]
+    只改写敏感键下的字符串值，格式、注释和其他内容原样输出；
+    不要求文档完整合法，无法识别的片段直接透传。内存占用只与块大小和最长行有关。
+    """
+    pending_key = None  # 值尚未出现的键（值在注释之后或在后续块中）
+    need_colon = False
+    in_block_comment = False
     
-    result = conn_str
-    for pattern, replacement in patterns:
-        if callable(replacement):
-            result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
+    for buf in _iter_line_blocks(chunks, block_size):
+        pieces = []
+        last = 0
+        pos = 0
+        
+        def splice(start, end, key, token):
+            nonlocal last
+            masked = _mask_json_string(key, token, tracker)
+            if masked != token:
+                pieces.append(buf[last:start])
+                pieces.append(masked)
+                last = end
+        
+        while pos < len(buf):
+            if in_block_comment:
+                end = buf.find('*/', pos)
+                if end < 0:
+                    break
+                pos = end + 2
+                in_block_comment = False
+            
+            restart = False
+            for m in JSON_TOKEN_PATTERN.finditer(buf, pos):
+                kind = m.lastgroup
+                
+                if pending_key is not None and kind not in ('line_comment', 'block_comment'):
+                    # 键和值之间只允许出现空白、冒号和注释（注释跳过后 pending_key 保留）
+                    i, end = m.start(), m.end()
+                    if kind == 'skip':
+                        while i < end and buf[i].isspace():
+                            i += 1
+                        if need_colon and i < end and buf[i] == ':':
+                            need_colon = False
+                            i += 1
+                            while i < end and buf[i].isspace():
+                                i += 1
+                    if i < end:
+                        # 后面没有冒号的字符串就是值（之后可能还跟着注释或位于块末尾）
+                        is_value = (kind in ('skip', 'open_key', 'comment_key') and not need_colon
+                                    and buf[i] == '"')
+                        if is_value:
+                            value = JSON_STRING_PATTERN.match(buf, i)
+                            if value is not None and is_sensitive_key(pending_key):
+                                splice(value.start(), value.end(), pending_key, value.group())
+                        pending_key = None
+                        if is_value and kind != 'skip':
+                            continue
+                
+                if kind == 'skip':
+                    continue
+                if kind == 'value':
+                    key = _sensitive_json_key(m.group('key'))
+                    if key is not None:
+                        splice(m.start('value'), m.end('value'), key, m.group('value'))
+                elif kind in ('open_key', 'colon'):
+                    pending_key = _decode_json_string(m.group('open_key'))
+                    need_colon = kind == 'open_key'
+                elif kind in ('comment_key', 'comment_colon'):
+                    pending_key = _decode_json_string(m.group('comment_key'))
+                    need_colon = kind == 'comment_key'
+                elif kind == 'line_comment':
+                    end = buf.find('\n', m.end())
+                    pos = len(buf) if end < 0 else end + 1
+                    restart = True
+                    break
+                else:
+                    in_block_comment = True
+                    pos = m.end()
+                    restart = True
+                    break
+            
+            if not restart:
+                break
+        
+        if pieces:
+            pieces.append(buf[last:])
+            yield ''.join(pieces)
         else:
-            result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    
-    return result
+            yield buf
 
-def process_json_content(content: str) -> str:
-    """处理JSON文件中的敏感信息"""
-    try:
-        data = json.loads(content)
-        processed_data = mask_json_recursive(data)
-        return json.dumps(processed_data, indent=2, ensure_ascii=False)
-    except json.JSONDecodeError:
-        return content
+def process_json_content(content: str, tracker: MaskTracker = None) -> str:
+    """处理JSON文件中的敏感信息（保留原有格式和注释）"""
+    return ''.join(iter_json_masked([content], tracker))
 
-def mask_json_recursive(obj):
+def mask_json_recursive(obj, tracker: MaskTracker = None):
     """递归处理JSON对象中的敏感信息"""
     if isinstance(obj, dict):
         result = {}
@@ -89,91 +352,257 @@ def mask_json_recursive(obj):
                     result[key] = mask_connection_string(value)
                 else:
                     result[key] = mask_value(value)
+                if tracker is not None:
+                    tracker.mark(value, result[key])
             elif isinstance(value, (dict, list)):
-                result[key] = mask_json_recursive(value)
+                result[key] = mask_json_recursive(value, tracker)
             else:
                 result[key] = value
         return result
     elif isinstance(obj, list):
-        return [mask_json_recursive(item) for item in obj]
+        return [mask_json_recursive(item, tracker) for item in obj]
     else:
         return obj
 
-def process_csharp_content(content: str) -> str:
+def mask_csharp_line(line: str) -> str:
+    """对单行C#代码依次应用赋值、常量、配置访问三条规则"""
+    if _profiler is not None:
+        return _profiler.apply_rules(CSHARP_RULES, line)
+    for rule in CSHARP_RULES:
+        line = rule.pattern.sub(rule.replace, line)
+    return line
+
+def process_csharp_content(content: str, tracker: MaskTracker = None) -> str:
     """处理C#代码中的敏感信息"""
+    # 整个文件都不含关键词时无需拆行
+    if not contains_sensitive_keyword(content):
+        return content
+    
     lines = content.split('\n')
-    processed_lines = []
+    for i, line in enumerate(lines):
+        # 三条规则都要求 "=" 和至少一个关键词，否则该行保持原样
+        if '=' in line and contains_sensitive_keyword(line):
+            lines[i] = mask_csharp_line(line)
+            if tracker is not None:
+                tracker.mark(line, lines[i])
     
+    return '\n'.join(lines)
+
+def iter_csharp_lines(lines, tracker: MaskTracker = None):
+    """逐行处理C#代码，行尾换行符原样保留"""
     for line in lines:
-        # 处理字符串字面量赋值
-        # 如: string password = "secret123";
-        string_assignment_pattern = r'(\w*(?:' + '|'.join(SENSITIVE_KEYWORDS) + r')\w*)\s*=\s*["\']([^"\']+)["\']'
-        
-        def replace_assignment(match):
-            var_name, value = match.groups()
-            if is_sensitive_key(var_name):
-                return f'{var_name} = "{mask_value(value)}"'
-            return match.group(0)
-        
-        processed_line = re.sub(string_assignment_pattern, replace_assignment, line, flags=re.IGNORECASE)
-        
-        # 处理常量定义
-        # 如: const string API_KEY = "abc123";
-        const_pattern = r'(const\s+string\s+\w*(?:' + '|'.join(SENSITIVE_KEYWORDS) + r')\w*\s*=\s*["\'])([^"\']+)(["\'])'
-        
-        def replace_const(match):
-            prefix, value, suffix = match.groups()
-            return f'{prefix}{mask_value(value)}{suffix}'
-        
-        processed_line = re.sub(const_pattern, replace_const, processed_line, flags=re.IGNORECASE)
-        
-        # 处理配置访问
-        # 如: Configuration["ConnectionStrings:Default"]
-        config_pattern = r'(Configuration\[["\'][^"\']*(?:' + '|'.join(SENSITIVE_KEYWORDS) + r')[^"\']*["\']]\s*=\s*["\'])([^"\']+)(["\'])'
-        
-        def replace_config(match):
-            prefix, value, suffix = match.groups()
-            return f'{prefix}{mask_value(value)}{suffix}'
-        
-        processed_line = re.sub(config_pattern, replace_config, processed_line, flags=re.IGNORECASE)
-        
-        processed_lines.append(processed_line)
-    
-    return '\n'.join(processed_lines)
+        if '=' in line and contains_sensitive_keyword(line):
+            body = line[:-1] if line.endswith('\n') else line
+            masked = mask_csharp_line(body)
+            if masked != body:
+                if tracker is not None:
+                    tracker.masked = True
+                line = masked + line[len(body):]
+        yield line
 
-def process_file_content(file_path: str, content: str) -> str:
-    """根据文件类型处理敏感信息"""
+def is_xml_config(file_path: str) -> bool:
+    """web.config / app.config 需要按 XML 规则处理"""
     file_ext = os.path.splitext(file_path)[1].lower()
     file_name = os.path.basename(file_path).lower()
+    return file_ext in ['.config', '.xml'] and ('web.config' in file_name or 'app.config' in file_name)
+
+def process_file_content(file_path: str, content: str, tracker: MaskTracker = None) -> str:
+    """根据文件类型处理敏感信息"""
+    file_ext = os.path.splitext(file_path)[1].lower()
     
     if file_ext == '.json':
         # 处理 JSON 配置文件
-        return process_json_content(content)
+        return process_json_content(content, tracker)
     elif file_ext == '.cs':
         # 处理 C# 代码文件
-        return process_csharp_content(content)
-    elif file_ext in ['.config', '.xml'] and ('web.config' in file_name or 'app.config' in file_name):
-        # 处理 XML 配置文件中的环境变量
-        def replacer(m):
-            name, val = m.group(1), m.group(2)
-            return f'<add key="{name}" value="{mask_value(val)}" />'
-        
-        # 处理 appSettings
-        pattern = re.compile(r'<add\s+key="([^"]+)"\s+value="([^"]+)"\s*/>')
-        content = pattern.sub(replacer, content)
-        
-        # 处理 connectionStrings
-        def conn_replacer(m):
-            name, conn_str = m.group(1), m.group(2)
-            return f'<add name="{name}" connectionString="{mask_connection_string(conn_str)}" />'
-        
-        conn_pattern = re.compile(r'<add\s+name="([^"]+)"\s+connectionString="([^"]+)"[^>]*>')
-        content = conn_pattern.sub(conn_replacer, content)
-        
-        return content
+        return process_csharp_content(content, tracker)
+    elif is_xml_config(file_path):
+        # 处理 XML 配置文件中的 appSettings 和 connectionStrings
+        if _profiler is not None:
+            masked = _profiler.apply_rules(XML_MASKER.rules, content)
+        else:
+            masked = XML_MASKER.mask_text(content)
+        return tracker.mark(content, masked) if tracker is not None else masked
     else:
         return content
 
+def _split_universal_newlines(text):
+    """按文本模式的通用换行规则拆分（\r\n、\r 都视为 \n），保留换行符"""
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end < 0:
+            if start < len(text):
+                yield text[start:]
+            return
+        yield text[start:end + 1]
+        start = end + 1
+
+def iter_file_lines(file_path: str, size: int = None):
+    """逐行读取文件（保留换行符），大文件通过 mmap 读取"""
+    if size is None:
+        size = os.path.getsize(file_path)
+    
+    if size < STREAM_MMAP_THRESHOLD:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            yield from f
+        return
+    
+    # UTF-8 多字节序列不会包含 0x0A，按行解码与整体解码结果一致
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for raw in iter(mm.readline, b""):
+            yield from _split_universal_newlines(raw.decode("utf-8", errors="ignore"))
+
+def iter_masked_lines(file_path: str, lines, tracker: MaskTracker = None):
+    """按文件类型流式处理敏感信息
+    
+    C#、JSON 和无需处理的文件逐行输出；XML 配置依赖完整文档结构，整体处理后输出
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    
+    if file_ext == '.cs':
+        yield from iter_csharp_lines(lines, tracker)
+    elif file_ext == '.json':
+        yield from iter_json_masked(lines, tracker)
+    elif is_xml_config(file_path):
+        yield process_file_content(file_path, ''.join(lines), tracker)
+    else:
+        yield from lines
+
+def write_stripped(out, chunks):
+    """写出文本块并去掉末尾空白，等价于 out.write(''.join(chunks).rstrip() + "\n")"""
+    pending = []
+    for chunk in chunks:
+        body = chunk.rstrip()
+        if not body:
+            # 纯空白内容暂存，只有后面还有正文时才写出
+            pending.append(chunk)
+            continue
+        if pending:
+            out.write(''.join(pending))
+            pending.clear()
+        out.write(body)
+        if len(body) < len(chunk):
+            pending.append(chunk[len(body):])
+    out.write("\n")
+
+def write_masked_file(out, file_info, tracker: MaskTracker = None):
+    """读取、掩码并写出单个文件；--profile 模式下分别记录读取、掩码、写出耗时"""
+    lines = iter_file_lines(file_info['full_path'], file_info['size'])
+    if _profiler is None:
+        write_stripped(out, iter_masked_lines(file_info['path'], lines, tracker))
+        return
+    
+    start = time.perf_counter()
+    lines = TimedIterator(lines)
+    masked = TimedIterator(iter_masked_lines(file_info['path'], lines, tracker))
+    write_stripped(out, masked)
+    total = time.perf_counter() - start
+    mask = masked.seconds - lines.seconds
+    if file_info['path'].lower().endswith('.json'):
+        # JSON 的词法扫描和键判断交织在一起，整体记为一条规则
+        _profiler.add_rule("json.sensitive_key", mask)
+    _profiler.add_file(file_info['path'], lines.seconds, mask, total - masked.seconds)
+
+def render_file_section(file_info, compact: bool = False):
+    """读取并掩码单个文件（供 --jobs 工作进程调用）
+
+    返回 (内容, 是否受保护, 异常)，异常对象交回主进程按原有格式写出；
+    compact 为 True 时 C# 文件会再经过压缩
+    """
+    tracker = MaskTracker()
+    buf = io.StringIO()
+    try:
+        write_masked_file(buf, file_info, tracker)
+        content = buf.getvalue()
+        if compact and os.path.splitext(file_info['path'])[1].lower() == '.cs':
+            start = time.perf_counter()
+            content = minify_csharp(content) or "\n"
+            if _profiler is not None:
+                _profiler.add_phase("compact", time.perf_counter() - start)
+    except Exception as e:
+        return None, False, e
+    return content, tracker.masked, None
+
+def hash_file(file_path: str) -> str:
+    """计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class SectionCache:
+    """掩码结果的持久化缓存
+
+    以 (路径, 大小, 修改时间, 内容哈希, 规则指纹) 为键：大小和修改时间都未变时直接命中，
+    否则再比较内容哈希（例如文件只是被 touch 过）。规则指纹不一致时整个缓存作废。
+    """
+
+    def __init__(self, cache_file: str, fingerprint: str):
+        self.cache_file = cache_file
+        self.fingerprint = fingerprint
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+        
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get('fingerprint') == fingerprint:
+                    self.entries = data.get('entries', {})
+            except (OSError, ValueError):
+                # 缓存损坏时当作空缓存处理
+                self.entries = {}
+
+    def lookup(self, file_info):
+        """返回命中的缓存条目，未命中返回 None"""
+        entry = self.entries.get(file_info['path'])
+        if entry is not None:
+            if entry['size'] == file_info['size'] and entry['mtime_ns'] == file_info['mtime_ns']:
+                self.hits += 1
+                return entry
+            if entry['size'] == file_info['size']:
+                try:
+                    digest = hash_file(file_info['full_path'])
+                except OSError:
+                    digest = None
+                if digest == entry['hash']:
+                    entry['mtime_ns'] = file_info['mtime_ns']
+                    self.hits += 1
+                    return entry
+                self._digests[file_info['path']] = digest
+        self.misses += 1
+        return None
+
+    def store(self, file_info, content: str, masked: bool):
+        """记录重新处理后的文件内容"""
+        digest = self._digests.pop(file_info['path'], None)
+        if digest is None:
+            try:
+                digest = hash_file(file_info['full_path'])
+            except OSError:
+                return
+        self.entries[file_info['path']] = {
+            'size': file_info['size'],
+            'mtime_ns': file_info['mtime_ns'],
+            'hash': digest,
+            'content': content,
+            'masked': masked,
+        }
+
+    def save(self, paths):
+        """保存缓存，只保留本次打包涉及的文件"""
+        entries = {path: self.entries[path] for path in paths if path in self.entries}
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({'fingerprint': self.fingerprint, 'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+
 def get_file_size_from_bytes(size_bytes):
     """将字节数转换为人类可读格式"""
     if size_bytes < 1024:
@@ -209,27 +638,75 @@ def should_skip_file(filename):
         
     return False
 
-def main():
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotifyHubAPI 项目代码打包脚本")
     # NotifyHubAPI 项目根目录 - 根据您的截图，实际项目在子文件夹中
-    root_dir = r"D:\Programing\C#\NotifyHubAPI\NotifyHubAPI"  # 注意这里多了一层
-    output_file = r"D:\Programing\C#\NotifyHubAPI\#NotifyHubAPI_Code.txt"
+    parser.add_argument("--root", default=r"D:\Programing\C#\NotifyHubAPI\NotifyHubAPI",  # 注意这里多了一层
+                        help="项目根目录")
+    parser.add_argument("--output", default=r"D:\Programing\C#\NotifyHubAPI\#NotifyHubAPI_Code.txt",
+                        help="输出文件路径")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="并行读取和掩码文件的进程数，0 表示使用全部CPU核心")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="增量打包缓存文件，未变化的文件直接复用上次的掩码结果")
+    parser.add_argument("--compact", action="store_true",
+                        help="紧凑输出：C# 文件删除注释和多余空白，内容相同的文件只输出一次")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true",
+                           help="输出每个目录和文件的检查过程")
+    verbosity.add_argument("-q", "--quiet", action="store_true",
+                           help="只输出警告和错误")
+    parser.add_argument("--profile", action="store_true",
+                        help="统计遍历、读取、各掩码规则、写出的耗时和最慢的文件（强制单进程）")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="--profile 报告中列出的最慢文件数（默认 10）")
+    return parser.parse_args()
+
+def setup_logging(args):
+    """-v 输出逐文件的检查过程，-q 只保留警告和错误"""
+    if args.verbose:
+        level = logging.DEBUG
+    elif args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level, format="%(message)s", stream=sys.stdout)
+
+def main():
+    global _profiler
+    args = parse_args()
+    setup_logging(args)
+    root_dir = args.root
+    output_file = args.output
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    # 逐文件日志会打断进度行，-v 和 -q 时都不显示进度
+    show_progress = not (args.verbose or args.quiet)
+    
+    # ✨性能分析：计时数据保存在本进程内，因此强制单进程
+    if args.profile:
+        _profiler = PackProfiler()
+        if jobs > 1:
+            log.warning("--profile 模式下强制使用单进程 (忽略 --jobs)")
+            jobs = 1
+    started = time.perf_counter()
     
     # 检查目录是否存在
     if not os.path.exists(root_dir):
-        print(f"错误: 目录不存在: {root_dir}")
-        print("请修改脚本中的 root_dir 路径")
+        log.error(f"错误: 目录不存在: {root_dir}")
+        log.error("请通过 --root 参数指定项目目录，或修改脚本中的默认路径")
         
         # 尝试父目录
-        parent_dir = r"D:\Programing\C#\NotifyHubAPI"
+        parent_dir = os.path.dirname(os.path.abspath(root_dir))
         if os.path.exists(parent_dir):
-            print(f"发现父目录: {parent_dir}")
-            print("父目录内容:")
+            log.info(f"发现父目录: {parent_dir}")
+            log.info("父目录内容:")
             for item in os.listdir(parent_dir):
                 item_path = os.path.join(parent_dir, item)
                 if os.path.isdir(item_path):
-                    print(f"  📁 {item}/")
+                    log.info(f"  📁 {item}/")
                 else:
-                    print(f"  📄 {item}")
+                    log.info(f"  📄 {item}")
         return
 
     # 根目录允许的文件扩展名
@@ -253,10 +730,12 @@ def main():
     total_size = 0
     file_count = 0
     protected_files = 0  # ✨统计被保护的文件数
+    compact = args.compact
+    compact_stats = []  # ✨紧凑模式下每个文件的 (路径, 源文件字节数, 输出字节数)
 
-    print("开始打包 NotifyHubAPI 项目...")
+    log.info("开始打包 NotifyHubAPI 项目...")
 
-    with open(output_file, "w", encoding="utf-8") as out:
+    with open(output_file, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as out:
         # 写入项目描述
         out.write("# NotifyHubAPI - 邮件通知API服务\n")
         out.write("## 项目概述\n")
@@ -265,72 +744,71 @@ def main():
         out.write("⚠️  敏感信息已自动掩码处理，保护密码、密钥、连接字符串等\n\n")
         
         # 先收集所有文件信息
-        print(f"扫描目录: {root_dir}")
+        log.info(f"扫描目录: {root_dir}")
+        walk_started = time.perf_counter()
+        progress = ProgressLine("扫描", enabled=show_progress)
         
-        for dirpath, dirnames, filenames in os.walk(root_dir):
-            rel_dir = os.path.relpath(dirpath, root_dir)
-            print(f"正在扫描: {rel_dir}")
+        # 编译输出目录和隐藏目录在进入之前就被剪枝，与目标文件夹无关的目录也不会遍历
+        target_trie = PathPrefixTrie(target_folders)
+        target_dirs = {".": True}  # 根目录总是处理
+        
+        for item in walk_tree(root_dir, skip_names=SKIP_DIRS, prefixes=target_trie):
+            if item.is_dir:
+                # 目标文件夹的上级目录只用于继续向下查找，其中的文件不处理
+                is_target_folder = target_trie.match(item.rel_path) == INSIDE
+                target_dirs[item.rel_path] = is_target_folder
+                if is_target_folder:
+                    log.debug(f"处理目录: {item.rel_path}")
+                else:
+                    log.debug(f"跳过非目标目录: {item.rel_path}")
+                continue
             
-            # 跳过编译输出目录和隐藏目录
-            if any(skip_dir in rel_dir for skip_dir in ["bin", "obj", "publish", ".vs", ".git"]):
-                print(f"跳过目录: {rel_dir}")
+            rel_dir = item.folder
+            if not target_dirs.get(rel_dir):
                 continue
             
-            # 检查是否是目标文件夹 - 修复逻辑
-            is_target_folder = False
-            if rel_dir == ".":
-                # 根目录总是处理
-                is_target_folder = True
-            else:
-                # 检查是否是目标子文件夹
-                for target_folder in target_folders:
-                    if rel_dir == target_folder or rel_dir.startswith(target_folder + os.sep):
-                        is_target_folder = True
-                        break
+            filename = item.name
+            log.debug(f"  检查文件: {filename}")
             
-            if not is_target_folder:
-                print(f"跳过非目标目录: {rel_dir}")
+            if should_skip_file(filename):
+                log.debug(f"    跳过文件: {filename}")
                 continue
                 
-            print(f"处理目录: {rel_dir}, 文件数: {len(filenames)}")
-                
-            for filename in filenames:
-                print(f"  检查文件: {filename}")
-                
-                if should_skip_file(filename):
-                    print(f"    跳过文件: {filename}")
-                    continue
-                    
-                ext = os.path.splitext(filename)[1].lower()
-                print(f"    文件扩展名: {ext}")
-                
-                # 根目录允许配置文件和项目文件，子目录主要是源码
-                include_file = False
-                if rel_dir == ".":
-                    include_file = ext in root_exts
-                    print(f"    根目录文件，是否包含: {include_file}")
-                else:
-                    include_file = ext in [".cs", ".json"]
-                    print(f"    子目录文件，是否包含: {include_file}")
+            ext = os.path.splitext(filename)[1].lower()
+            log.debug(f"    文件扩展名: {ext}")
+            
+            # 根目录允许配置文件和项目文件，子目录主要是源码
+            include_file = False
+            if rel_dir == ".":
+                include_file = ext in root_exts
+                log.debug(f"    根目录文件，是否包含: {include_file}")
+            else:
+                include_file = ext in [".cs", ".json"]
+                log.debug(f"    子目录文件，是否包含: {include_file}")
+            
+            if include_file:
+                rel_path = item.rel_path
+                file_stat = item.stat()
+                file_size = file_stat.st_size
                 
-                if include_file:
-                    file_path = os.path.join(dirpath, filename)
-                    rel_path = os.path.relpath(file_path, root_dir)
-                    file_size = os.path.getsize(file_path)
-                    
-                    all_paths.append({
-                        'path': rel_path,
-                        'full_path': file_path,
-                        'size': file_size,
-                        'folder': rel_dir
-                    })
-                    total_size += file_size
-                    file_count += 1
-                    print(f"    ✓ 已添加: {rel_path} ({get_file_size_from_bytes(file_size)})")
-                else:
-                    print(f"    ✗ 不包含: {filename}")
+                all_paths.append({
+                    'path': rel_path,
+                    'full_path': item.path,
+                    'size': file_size,
+                    'mtime_ns': file_stat.st_mtime_ns,
+                    'folder': rel_dir
+                })
+                total_size += file_size
+                file_count += 1
+                progress.update(file_count, rel_path)
+                log.debug(f"    ✓ 已添加: {rel_path} ({get_file_size_from_bytes(file_size)})")
+            else:
+                log.debug(f"    ✗ 不包含: {filename}")
         
-        print(f"\n找到 {file_count} 个文件进行打包")
+        progress.done()
+        if _profiler is not None:
+            _profiler.add_phase("walk", time.perf_counter() - walk_started)
+        log.info(f"\n找到 {file_count} 个文件进行打包")
 
         # 按文件夹和文件名排序
         all_paths.sort(key=lambda x: (x['folder'], x['path']))
@@ -368,39 +846,99 @@ def main():
         out.write("## 文件内容\n")
         out.write("="*80 + "\n")
         
-        current_folder = ""
-        for file_info in all_paths:
-            folder = file_info['folder']
-            if folder != current_folder:
-                current_folder = folder
-                folder_name = "根目录" if folder == "." else folder
-                out.write(f"\n\n### {folder_name} 文件夹\n")
-                out.write("-" * 50 + "\n")
-            
-            try:
-                out.write(f"\n#### 文件: {file_info['path']}\n")
-                out.write(f"```{get_file_extension_for_syntax(file_info['path'])}\n")
+        # ✨增量缓存：命中的文件直接复用，只有变化的文件需要重新读取和掩码
+        cache_started = time.perf_counter()
+        cache = SectionCache(args.cache, get_rules_fingerprint(compact)) if args.cache else None
+        cached = {}
+        if cache is not None:
+            for file_info in all_paths:
+                entry = cache.lookup(file_info)
+                if entry is not None:
+                    cached[file_info['path']] = entry
+            if _profiler is not None:
+                _profiler.add_phase("cache", time.perf_counter() - cache_started)
+        pending = [file_info for file_info in all_paths if file_info['path'] not in cached]
+        
+        # ✨多进程模式：工作进程读取并掩码，imap 按 pending 顺序返回结果，输出与串行一致
+        render = functools.partial(render_file_section, compact=compact)
+        pool = multiprocessing.Pool(jobs) if jobs > 1 and len(pending) > 1 else None
+        sections = None
+        if pool is not None:
+            chunksize = max(1, len(pending) // (jobs * 4))
+            sections = pool.imap(render, pending, chunksize)
+        elif cache is not None or compact:
+            # 需要完整内容写入缓存或进行压缩、去重，不能直接流式写出
+            sections = map(render, pending)
+        seen_contents = {}  # ✨紧凑模式：内容哈希 -> 首次出现的文件路径
+        progress = ProgressLine("写入", len(all_paths), enabled=show_progress)
+        
+        try:
+            current_folder = ""
+            for index, file_info in enumerate(all_paths, 1):
+                progress.update(index, file_info['path'])
+                folder = file_info['folder']
+                if folder != current_folder:
+                    current_folder = folder
+                    folder_name = "根目录" if folder == "." else folder
+                    out.write(f"\n\n### {folder_name} 文件夹\n")
+                    out.write("-" * 50 + "\n")
                 
-                with open(file_info['full_path'], "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read()
+                try:
+                    out.write(f"\n#### 文件: {file_info['path']}\n")
+                    fence = f"```{get_file_extension_for_syntax(file_info['path'])}\n"
                     
-                    # ✨处理敏感信息
-                    original_content = content
-                    content = process_file_content(file_info['path'], content)
+                    entry = cached.get(file_info['path'])
+                    if entry is not None or sections is not None:
+                        if entry is not None:
+                            content, masked = entry['content'], entry['masked']
+                        else:
+                            content, masked, error = next(sections)
+                            if error is not None:
+                                raise error
+                            if cache is not None:
+                                cache.store(file_info, content, masked)
+                        
+                        # ✨紧凑模式：内容相同的文件只输出一次，之后改为引用
+                        duplicate_of = None
+                        if compact:
+                            digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+                            duplicate_of = seen_contents.setdefault(digest, file_info['path'])
+                            if duplicate_of == file_info['path']:
+                                duplicate_of = None
+                            output_size = 0 if duplicate_of else len(content.encode("utf-8"))
+                            compact_stats.append((file_info['path'], file_info['size'], output_size))
+                        
+                        if duplicate_of:
+                            out.write(f"> 内容与 {duplicate_of} 相同，已省略\n")
+                        else:
+                            out.write(fence)
+                            out.write(content)
+                            out.write("```\n")
+                    else:
+                        out.write(fence)
+                        
+                        # ✨逐行读取并处理敏感信息，移除文件末尾多余的空行
+                        tracker = MaskTracker()
+                        write_masked_file(out, file_info, tracker)
+                        masked = tracker.masked
+                        
+                        out.write("```\n")
                     
                     # 统计是否有敏感信息被保护
-                    if content != original_content:
+                    if masked:
                         protected_files += 1
                     
-                    # 移除文件末尾多余的空行
-                    content = content.rstrip() + "\n"
-                    out.write(content)
-                
-                out.write("```\n")
-                
-            except Exception as e:
-                out.write(f"\n#### 文件: {file_info['path']} [读取失败: {str(e)}]\n")
-                out.write("```\n[文件读取失败]\n```\n")
+                except Exception as e:
+                    out.write(f"\n#### 文件: {file_info['path']} [读取失败: {str(e)}]\n")
+                    out.write("```\n[文件读取失败]\n```\n")
+        finally:
+            progress.done()
+            if pool is not None:
+                pool.close()
+                pool.join()
+        
+        if cache is not None:
+            cache.save([file_info['path'] for file_info in all_paths])
         
         # ✨写入保护统计
         out.write(f"\n\n## 敏感信息保护统计\n")
@@ -409,7 +947,7 @@ def main():
         out.write("- 保护方式: 智能掩码，保留前缀用于识别\n")
 
     # 计算输出文件大小并显示统计信息
-    if os.path.exists(output_file):
+    if os.path.exists(output_file) and log.isEnabledFor(logging.INFO):
         output_size = os.path.getsize(output_file)
         
         print("\n" + "=" * 60)
@@ -418,8 +956,32 @@ def main():
         print(f"文件大小: {get_file_size_from_bytes(output_size)}")
         print(f"包含文件总数: {file_count}")
         print(f"敏感信息保护: {protected_files} 个文件")
+        if cache is not None:
+            print(f"增量缓存: 命中 {cache.hits} 个, 未命中 {cache.misses} 个")
+        if compact:
+            print_compact_report(compact_stats)
         print("=" * 60)
         print("\n✅ 打包完成！敏感信息已自动保护，可以安全上传到Claude进行代码分析。")
+    
+    if _profiler is not None:
+        _profiler.report(time.perf_counter() - started, args.profile_top)
+
+def print_compact_report(compact_stats):
+    """打印紧凑模式下每个文件和总计节省的字节数"""
+    print("\n紧凑模式节省:")
+    total_before = total_after = 0
+    for path, before, after in compact_stats:
+        total_before += before
+        total_after += after
+        saved = before - after
+        ratio = saved / before * 100 if before else 0.0
+        note = " (重复文件)" if after == 0 and before else ""
+        print(f"  {path}: {get_file_size_from_bytes(before)} -> {get_file_size_from_bytes(after)}, "
+              f"节省 {get_file_size_from_bytes(max(saved, 0))} ({ratio:.1f}%){note}")
+    saved = total_before - total_after
+    ratio = saved / total_before * 100 if total_before else 0.0
+    print(f"  总计: {get_file_size_from_bytes(total_before)} -> {get_file_size_from_bytes(total_after)}, "
+          f"节省 {get_file_size_from_bytes(max(saved, 0))} ({ratio:.1f}%)")
 
 def get_file_extension_for_syntax(file_path):
     """根据文件路径返回语法高亮的语言标识"""
@@ -6,9 +6,23 @@
 """
 
 import os
+import argparse
+import csv
 import datetime
+import heapq
+import json
+import sqlite3
+import stat
+import sys
+import tempfile
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
+from treewalk import walk_tree
+
 def format_size(size_bytes):
     """格式化文件大小显示"""
     if size_bytes == 0:
@@ -22,142 +36,752 @@ def format_size(size_bytes):
     
     return f"{size_bytes:.1f} {size_names[i]}"
 
-def get_file_info(file_path):
-    """获取文件详细信息"""
-    try:
-        stat = file_path.stat()
-        return {
-            'size': stat.st_size,
-            'modified': datetime.datetime.fromtimestamp(stat.st_mtime),
-            'is_dir': file_path.is_dir(),
-            'is_file': file_path.is_file()
-        }
-    except (OSError, PermissionError):
-        return {
-            'size': 0,
-            'modified': None,
-            'is_dir': False,
-            'is_file': False,
-            'error': True
-        }
-
-def scan_directory(root_path, max_depth=10, current_depth=0):
-    """递归扫描目录结构"""
-    items = []
-    
-    if current_depth >= max_depth:
-        return items
-    
-    try:
-        root = Path(root_path)
-        for item in sorted(root.iterdir(), key=lambda x: (x.is_file(), x.name.lower())):
-            # 跳过隐藏文件和系统文件
-            if item.name.startswith('.'):
-                continue
-                
-            # 跳过常见的临时文件和缓存目录
-            skip_patterns = {
-                '__pycache__', 'node_modules', '.vs', '.vscode', 
-                'bin', 'obj', 'Debug', 'Release', '.git'
+# 跳过常见的临时文件和缓存目录
+SKIP_PATTERNS = {
+    '__pycache__', 'node_modules', '.vs', '.vscode', 
+    'bin', 'obj', 'Debug', 'Release', '.git'
+}
+
+# 条目类型
+KIND_DIR = 'dir'
+KIND_FILE = 'file'
+KIND_OTHER = 'other'   # 设备、管道、套接字等特殊文件
+KIND_ERROR = 'error'   # 无法 stat
+KINDS = (KIND_DIR, KIND_FILE, KIND_OTHER, KIND_ERROR)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+def stat_kind(st):
+    """stat 结果对应的条目类型，st 为 None 表示无法访问"""
+    if st is None:
+        return KIND_ERROR
+    if stat.S_ISDIR(st.st_mode):
+        return KIND_DIR
+    if stat.S_ISREG(st.st_mode):
+        return KIND_FILE
+    return KIND_OTHER
+
+class ScanEntry:
+    """一个扫描条目
+
+    只保存名称、上级目录的相对路径（同一目录下的条目共用一个字符串）、深度、类型、
+    大小和整数修改时间（纳秒，无法访问时为 None），完整路径和 datetime 按需计算
+    """
+
+    __slots__ = ("name", "parent", "depth", "kind", "size", "mtime_ns")
+
+    def __init__(self, name, parent, depth, kind, size=0, mtime_ns=None):
+        self.name = name
+        self.parent = parent
+        self.depth = depth
+        self.kind = kind
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def from_stat(cls, name, parent, depth, st):
+        if st is None:
+            return cls(name, parent, depth, KIND_ERROR)
+        return cls(name, parent, depth, stat_kind(st), st.st_size, st.st_mtime_ns)
+
+    @property
+    def path(self):
+        """相对于扫描根目录的路径"""
+        return self.name if not self.parent else self.parent + os.sep + self.name
+
+    @property
+    def is_dir(self):
+        return self.kind == KIND_DIR
+
+    @property
+    def is_file(self):
+        return self.kind == KIND_FILE
+
+    @property
+    def error(self):
+        return self.kind == KIND_ERROR
+
+    @property
+    def modified(self):
+        if self.mtime_ns is None:
+            return None
+        return datetime.datetime.fromtimestamp(self.mtime_ns / 1e9)
+
+class EntryStore:
+    """按列存放扫描条目，数值列使用 array，上级目录路径只保存一次
+
+    每个条目只占一个名称字符串和几个定长整数，适合数百万文件的目录树；
+    按下标或迭代访问时临时构造 ScanEntry
+    """
+
+    def __init__(self, entries=()):
+        self.names = []
+        self.parents = []        # 上级目录编号 -> 相对路径
+        self._parent_ids = {}
+        self.parent_ids = array('I')
+        self.depths = array('H')
+        self.kinds = array('B')
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        parent_id = self._parent_ids.get(entry.parent)
+        if parent_id is None:
+            parent_id = self._parent_ids[entry.parent] = len(self.parents)
+            self.parents.append(entry.parent)
+        self.names.append(entry.name)
+        self.parent_ids.append(parent_id)
+        self.depths.append(entry.depth)
+        self.kinds.append(_KIND_CODES[entry.kind])
+        self.sizes.append(entry.size)
+        # 无法访问的条目没有修改时间，类型已经足以区分
+        self.mtimes.append(entry.mtime_ns or 0)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        kind = KINDS[self.kinds[index]]
+        return ScanEntry(self.names[index], self.parents[self.parent_ids[index]], self.depths[index],
+                         kind, self.sizes[index], None if kind == KIND_ERROR else self.mtimes[index])
+
+    def __iter__(self):
+        for index in range(len(self.names)):
+            yield self[index]
+
+# 输出缓冲：攒够该大小或距上次写出超过该间隔（秒）才写到终端
+OUTPUT_BUFFER_SIZE = 64 * 1024
+OUTPUT_FLUSH_INTERVAL = 0.5
+# 复制友好格式在扫描时暂存，超过该大小转存到临时文件
+COPY_SPOOL_SIZE = 4 * 1024 * 1024
+
+def format_scan_error(path, error):
+    if isinstance(error, PermissionError):
+        return f"权限错误: 无法访问 {path}"
+    return f"扫描错误: {error}"
+
+def report_scan_error(path, error):
+    """目录无法读取时打印错误"""
+    print(format_scan_error(path, error))
+
+def iter_scan(root_path, max_depth=10, current_depth=0, on_error=report_scan_error, workers=1):
+    """流式扫描目录结构，发现一个条目就产出一个，顺序与 scan_directory 相同
+
+    workers 大于 1 时并行列出目录和 stat（适合 NFS/SMB 挂载），输出顺序不变
+    """
+    # 隐藏文件、系统文件和 SKIP_PATTERNS 中的目录在遍历时直接剪枝
+    for item in walk_tree(root_path, max_depth=max_depth - current_depth,
+                          skip_names=SKIP_PATTERNS, skip_hidden=True,
+                          sort=True, follow_symlinks=True, on_error=on_error, workers=workers):
+        # 一次 stat（跟随符号链接），DirEntry 会缓存结果
+        try:
+            st = item.stat()
+        except OSError:
+            st = None
+        parent = "" if item.folder == "." else item.folder
+        yield ScanEntry.from_stat(item.name, parent, current_depth + item.depth, st)
+
+def scan_directory(root_path, max_depth=10, current_depth=0, workers=1):
+    """递归扫描目录结构，结果保存在按列存放的 EntryStore 中"""
+    return EntryStore(iter_scan(root_path, max_depth, current_depth, workers=workers))
+
+EXPORT_FIELDS = ("path", "parent", "name", "depth", "kind", "size", "mtime_ns")
+
+def export_ndjson(entries, stream):
+    """每行一个 JSON 对象，边扫描边写出"""
+    count = 0
+    for entry in entries:
+        stream.write(json.dumps({field: getattr(entry, field) for field in EXPORT_FIELDS},
+                                ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+def export_csv(entries, stream):
+    """带表头的 CSV，边扫描边写出；无法访问的条目 mtime_ns 为空"""
+    writer = csv.writer(stream)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for entry in entries:
+        writer.writerow([getattr(entry, field) for field in EXPORT_FIELDS])
+        count += 1
+    return count
+
+EXPORTERS = {'ndjson': export_ndjson, 'csv': export_csv}
+
+def _entry_record(name, st):
+    """由 stat 结果生成索引记录 (名称, 类型, 大小, 修改时间纳秒)，st 为 None 表示无法访问"""
+    if st is None:
+        return (name, KIND_ERROR, 0, None)
+    return (name, stat_kind(st), st.st_size, st.st_mtime_ns)
+
+# 并行 stat 时每个任务处理的条目数，逐个提交时任务调度的开销比本地磁盘上的 stat 还大
+STAT_BATCH = 64
+
+def _stat_batch(stat_func, args):
+    """逐个 stat，无法访问的为 None"""
+    stats = []
+    for arg in args:
+        try:
+            stats.append(stat_func(arg))
+        except OSError:
+            stats.append(None)
+    return stats
+
+def _record_key(record):
+    """与 _dirs_first_key 的顺序一致：目录在前，按名称排序"""
+    return (record[1] == KIND_FILE, record[0].lower())
+
+class ScanIndex:
+    """扫描结果的 SQLite 索引，用于增量重扫和变化对比
+
+    每个条目记录 (相对路径, 上级目录, 名称, 类型, 大小, 修改时间)，目录另记列出其内容时的修改时间。
+    重扫时目录修改时间未变就沿用索引中的子条目名单，不再列目录，但仍 stat 每个条目：
+    scp 等原地改写文件不会改变目录的修改时间。trust_dir_mtime 时这类目录中的文件也不再 stat，
+    直接沿用索引中的大小和修改时间，只 stat 子目录；full_rescan 时所有目录都重新列出。
+    每个目录只查询一次索引，子目录列出时的修改时间随上级目录的子条目一起取出；
+    workers 大于 1 时用线程池并行 stat。
+    通过符号链接再次到达的目录（按 st_dev、st_ino 判断）中的变化不重复计入差异。
+    扫描根目录或跳过规则变化时整个索引作废。
+    """
+
+    SCHEMA_VERSION = "1"
+
+    def __init__(self, index_file, root_path):
+        self.index_file = index_file
+        self.root = os.path.abspath(root_path)
+        self.changes = []  # (变化类型, 相对路径, 原大小, 新大小)
+        self.reused = 0
+        self.listed = 0
+        self.pool = None
+        self.listed_mtimes = {}  # 子目录相对路径 -> 上次列出时的修改时间，取出上级目录的子条目时记录
+        try:
+            self.conn = self._open()
+        except sqlite3.DatabaseError:
+            # 索引损坏时重建
+            os.remove(index_file)
+            self.conn = self._open()
+
+    def _open(self):
+        conn = sqlite3.connect(self.index_file)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "path TEXT PRIMARY KEY, parent TEXT, name TEXT, kind TEXT,"
+                "size INTEGER, mtime_ns INTEGER, listed_mtime_ns INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent)")
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            expected = {
+                'version': self.SCHEMA_VERSION,
+                'root': self.root,
+                'skip': "\t".join(sorted(SKIP_PATTERNS)),
             }
-            if item.name in skip_patterns:
+            self.has_baseline = all(meta.get(key) == value for key, value in expected.items())
+            if not self.has_baseline:
+                conn.execute("DELETE FROM entries")
+                conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", expected.items())
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def save(self):
+        """提交本次扫描的结果"""
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _stat_many(self, stat_func, args):
+        """逐个 stat，无法访问的为 None；有线程池时分批并行，结果顺序不变"""
+        if self.pool is None or len(args) <= STAT_BATCH:
+            return _stat_batch(stat_func, args)
+        batches = [args[i:i + STAT_BATCH] for i in range(0, len(args), STAT_BATCH)]
+        return [st for stats in self.pool.map(partial(_stat_batch, stat_func), batches) for st in stats]
+
+    def _subtree_bounds(self, rel_path):
+        return rel_path + os.sep, rel_path + chr(ord(os.sep) + 1)
+
+    def _remove(self, rel_path, kind, size):
+        """删除条目（目录连同整个子树），记录被删除的文件"""
+        if kind == KIND_FILE:
+            self.changes.append(('removed', rel_path, size, None))
+        elif kind == KIND_DIR:
+            low, high = self._subtree_bounds(rel_path)
+            for path, file_size in self.conn.execute(
+                    "SELECT path, size FROM entries WHERE path > ? AND path < ? AND kind = 'file'",
+                    (low, high)):
+                self.changes.append(('removed', path, file_size, None))
+            self.conn.execute("DELETE FROM entries WHERE path > ? AND path < ?", (low, high))
+        self.conn.execute("DELETE FROM entries WHERE path = ?", (rel_path,))
+
+    def _store(self, rel_path, parent_rel, record):
+        name, kind, size, mtime_ns = record
+        self.conn.execute(
+            "INSERT INTO entries (path, parent, name, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET kind = excluded.kind, size = excluded.size, "
+            "mtime_ns = excluded.mtime_ns",
+            (rel_path, parent_rel, name, kind, size, mtime_ns))
+
+    def _list_dir(self, path, on_error):
+        """列出目录并 stat 每个条目，无法读取时返回 None"""
+        try:
+            with os.scandir(path) as it:
+                entries = [entry for entry in it
+                           if entry.name not in SKIP_PATTERNS and not entry.name.startswith('.')]
+        except OSError as e:
+            if on_error is not None:
+                on_error(path, e)
+            return None
+        stats = self._stat_many(os.DirEntry.stat, entries)
+        return [_entry_record(entry.name, st) for entry, st in zip(entries, stats)]
+
+    def _stat_indexed(self, path, indexed, trust_dir_mtime):
+        """目录未变化时不再列目录，按索引中的名单 stat 条目，发现被原地改写的文件
+
+        trust_dir_mtime 时文件直接沿用索引中的记录，只 stat 其他条目（子目录需要新的修改时间）
+        """
+        records = []
+        names = []
+        for name, kind, size, mtime_ns, _ in indexed:
+            if trust_dir_mtime and kind == KIND_FILE:
+                records.append((name, kind, size, mtime_ns))
+            else:
+                names.append(name)
+        prefix = os.path.join(path, "")
+        stats = self._stat_many(os.stat, [prefix + name for name in names])
+        records.extend(_entry_record(name, st) for name, st in zip(names, stats))
+        return records
+
+    def _children(self, path, rel_path, mtime_ns, listed_mtime_ns, full_rescan, trust_dir_mtime, on_error):
+        """目录的子条目记录，目录未变化时沿用索引中的名单，否则重新列出，并更新索引"""
+        indexed = self.conn.execute(
+            "SELECT name, kind, size, mtime_ns, listed_mtime_ns FROM entries WHERE parent = ?",
+            (rel_path,)).fetchall()
+        old = {name: (kind, size, old_mtime) for name, kind, size, old_mtime, _ in indexed}
+        join = (lambda name: name) if not rel_path else (lambda name: rel_path + os.sep + name)
+        for name, kind, _, _, listed in indexed:
+            if kind == KIND_DIR and listed is not None:
+                self.listed_mtimes[join(name)] = listed
+
+        if not full_rescan and listed_mtime_ns is not None and listed_mtime_ns == mtime_ns:
+            self.reused += 1
+            records = self._stat_indexed(path, indexed, trust_dir_mtime)
+        else:
+            records = self._list_dir(path, on_error)
+            if records is None:
+                return []
+            self.listed += 1
+            names = {record[0] for record in records}
+            for name, (kind, size, _) in old.items():
+                if name not in names:
+                    self._remove(join(name), kind, size)
+            self.conn.execute(
+                "INSERT INTO entries (path, parent, name, kind, listed_mtime_ns) VALUES (?, NULL, '', 'dir', ?) "
+                "ON CONFLICT (path) DO UPDATE SET listed_mtime_ns = excluded.listed_mtime_ns",
+                (rel_path, mtime_ns))
+
+        for record in records:
+            name, kind, size, new_mtime = record
+            previous = old.get(name)
+            if previous is not None and previous[0] != kind:
+                self._remove(join(name), previous[0], previous[1])
+                previous = None
+            if kind == KIND_FILE:
+                if previous is None:
+                    self.changes.append(('added', join(name), None, size))
+                elif size > previous[1]:
+                    self.changes.append(('grown', join(name), previous[1], size))
+                elif size < previous[1]:
+                    self.changes.append(('shrunk', join(name), previous[1], size))
+                elif new_mtime != previous[2]:
+                    self.changes.append(('modified', join(name), previous[1], size))
+            if previous is None or previous[1:] != (size, new_mtime):
+                self._store(join(name), rel_path, record)
+        records.sort(key=_record_key)
+        return records
+
+    def iter_scan(self, max_depth=10, on_error=report_scan_error, full_rescan=False, workers=1,
+                  trust_dir_mtime=False):
+        """与 iter_scan 产出相同的条目，同时增量更新索引"""
+        if max_depth <= 0:
+            return
+        try:
+            root_st = os.stat(self.root)
+        except OSError as e:
+            if on_error is not None:
+                on_error(self.root, e)
+            return
+        if workers > 1:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scanindex")
+        try:
+            yield from self._iter_tree(root_st, max_depth, on_error, full_rescan, trust_dir_mtime)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True, cancel_futures=True)
+                self.pool = None
+            self.listed_mtimes.clear()
+
+    def _iter_tree(self, root_st, max_depth, on_error, full_rescan, trust_dir_mtime):
+        row = self.conn.execute("SELECT listed_mtime_ns FROM entries WHERE path = ''").fetchone()
+        visited = {(root_st.st_dev, root_st.st_ino)}
+        children = self._children(self.root, "", root_st.st_mtime_ns, row and row[0], full_rescan,
+                                  trust_dir_mtime, on_error)
+        stack = [(iter(children), 0, "")]
+        while stack:
+            it, depth, parent_rel = stack[-1]
+            record = next(it, None)
+            if record is None:
+                stack.pop()
                 continue
-            
-            info = get_file_info(item)
-            
-            item_data = {
-                'name': item.name,
-                'path': str(item.relative_to(root_path)),
-                'full_path': str(item),
-                'depth': current_depth,
-                'info': info
-            }
-            
-            items.append(item_data)
-            
-            # 如果是目录，递归扫描
-            if info['is_dir'] and not info.get('error'):
-                sub_items = scan_directory(item, max_depth, current_depth + 1)
-                items.extend(sub_items)
-                
-    except PermissionError:
-        print(f"权限错误: 无法访问 {root_path}")
-    except Exception as e:
-        print(f"扫描错误: {e}")
+
+            name, kind, size, mtime_ns = record
+            yield ScanEntry(name, parent_rel, depth, kind, size, mtime_ns)
+
+            if kind == KIND_DIR and depth + 1 < max_depth:
+                rel_path = name if not parent_rel else parent_rel + os.sep + name
+                full_path = os.path.join(self.root, rel_path)
+                try:
+                    st = os.stat(full_path)
+                    key = (st.st_dev, st.st_ino)
+                except OSError:
+                    key = None
+                known = len(self.changes)
+                listed = self.listed_mtimes.pop(rel_path, None)
+                children = self._children(full_path, rel_path, mtime_ns, listed, full_rescan, trust_dir_mtime,
+                                          on_error)
+                if key in visited:
+                    # 通过符号链接再次到达的目录照常列出，但其中的变化已经记录过，不重复计入差异
+                    del self.changes[known:]
+                elif key is not None:
+                    visited.add(key)
+                stack.append((iter(children), depth + 1, rel_path))
+
+class BufferedOutput:
+    """按大小和时间间隔批量写出的输出缓冲，第一行总是立即写出"""
+
+    def __init__(self, stream=None, buffer_size=OUTPUT_BUFFER_SIZE, interval=OUTPUT_FLUSH_INTERVAL):
+        self.stream = stream or sys.stdout
+        self.buffer_size = buffer_size
+        self.interval = interval
+        self.parts = []
+        self.size = 0
+        self.last_flush = None
+
+    def write_line(self, line=""):
+        self.parts.append(line + "\n")
+        self.size += len(line) + 1
+        if self.size >= self.buffer_size or self.last_flush is None \
+                or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts.clear()
+            self.size = 0
+        self.stream.flush()
+        self.last_flush = time.monotonic()
+
+def format_tree_line(item, show_details=True):
+    """树状结构中的一行"""
+    # 计算缩进
+    indent = "  " * item.depth
     
-    return items
+    if item.error:
+        return f"{indent}❌ {item.name} [访问错误]"
+    
+    # 文件/文件夹图标
+    if item.is_dir:
+        icon = "📁"
+        size_info = ""
+    else:
+        icon = "📄"
+        size_info = f" ({format_size(item.size)})" if show_details else ""
+    
+    # 修改时间
+    time_info = ""
+    if show_details:
+        time_info = f" - {item.modified.strftime('%Y-%m-%d %H:%M')}"
+    
+    return f"{indent}{icon} {item.name}{size_info}{time_info}"
+
+def format_rollup(total):
+    """目录汇总信息，如 "1.2 MB, 34 个文件"；超出扫描深度的目录没有展开"""
+    size, files, truncated = total
+    if truncated:
+        return "未展开"
+    return f"{format_size(size)}, {files} 个文件"
+
+def format_copy_line(item, total=None):
+    """复制友好格式中的一行，total 为目录的 (大小, 文件数, 是否未展开)"""
+    indent = "  " * item.depth
+    prefix = "├── " if item.depth > 0 else ""
+    
+    if item.is_dir:
+        rollup = f" ({format_rollup(total)})" if total is not None else ""
+        return f"{indent}{prefix}{item.name}/{rollup}"
+    size_info = f" ({format_size(item.size)})"
+    return f"{indent}{prefix}{item.name}{size_info}"
+
+def tree_header():
+    return ["=" * 80, "文件夹结构扫描结果", "=" * 80]
+
+def summary_lines(total_files, total_dirs, total_size):
+    return [
+        "\n" + "=" * 80,
+        "扫描统计摘要",
+        "=" * 80,
+        f"总文件数: {total_files}",
+        f"总文件夹数: {total_dirs}",
+        f"总大小: {format_size(total_size)}",
+    ]
+
+def top_lines(heaviest):
+    lines = ["\n" + "=" * 80, f"最大的 {len(heaviest)} 个目录", "=" * 80]
+    for size, files, path in heaviest:
+        lines.append(f"{format_size(size):>10}  {files:>8} 个文件  {path}")
+    return lines
+
+class DirectoryRollup:
+    """在先序遍历的同时自底向上累计每个目录的总大小和文件数（类似 du）
+
+    目录的子树遍历结束时（遇到深度不大于它的条目）才得到最终结果，
+    结果并入上级目录，并放进容量为 top 的最小堆以保留最大的子树
+    """
+
+    def __init__(self, top=0, max_depth=None):
+        self.top = top
+        self.max_depth = max_depth
+        self.stack = []   # 未结束的目录: [编号, 深度, 相对路径, 大小, 文件数]
+        self.totals = {}  # 目录编号 -> (大小, 文件数, 是否未展开)
+        self.heap = []    # (大小, 编号, 文件数, 相对路径)
+        self.next_id = 0
+
+    def _close(self, min_depth):
+        """结束深度不小于 min_depth 的目录"""
+        stack = self.stack
+        while stack and stack[-1][1] >= min_depth:
+            dir_id, depth, path, size, files = stack.pop()
+            truncated = self.max_depth is not None and depth >= self.max_depth - 1
+            self.totals[dir_id] = (size, files, truncated)
+            if stack:
+                stack[-1][3] += size
+                stack[-1][4] += files
+            if self.top > 0 and not truncated:
+                entry = (size, dir_id, files, path)
+                if len(self.heap) < self.top:
+                    heapq.heappush(self.heap, entry)
+                elif entry > self.heap[0]:
+                    heapq.heapreplace(self.heap, entry)
+
+    def add(self, item):
+        """按遍历顺序加入一个条目，目录返回其编号，文件返回 None"""
+        depth = item.depth
+        self._close(depth)
+        if item.is_dir:
+            dir_id = self.next_id
+            self.next_id += 1
+            self.stack.append([dir_id, depth, item.path, 0, 0])
+            return dir_id
+        if item.is_file and self.stack:
+            self.stack[-1][3] += item.size
+            self.stack[-1][4] += 1
+        return None
+
+    def finish(self):
+        self._close(0)
+
+    def heaviest(self):
+        """最大的子树，按大小降序：[(大小, 文件数, 相对路径)]"""
+        return [(size, files, path) for size, _, files, path in sorted(self.heap, reverse=True)]
+
+DIFF_LABELS = {'added': "新增", 'removed': "删除", 'grown': "变大", 'shrunk': "变小", 'modified': "修改"}
+
+def diff_lines(changes, has_baseline=True):
+    """与上次扫描相比的文件变化，按变化类型分组"""
+    lines = ["\n" + "=" * 80, "与上次扫描的差异", "=" * 80]
+    if not has_baseline:
+        lines.append("没有上次扫描的记录，本次扫描已建立索引")
+        return lines
+    if not changes:
+        lines.append("没有文件变化")
+        return lines
+    for kind, label in DIFF_LABELS.items():
+        group = sorted((path, old, new) for change, path, old, new in changes if change == kind)
+        if not group:
+            continue
+        lines.append(f"{label} ({len(group)}):")
+        for path, old, new in group:
+            if kind == 'added':
+                lines.append(f"  + {path} ({format_size(new)})")
+            elif kind == 'removed':
+                lines.append(f"  - {path} ({format_size(old)})")
+            else:
+                lines.append(f"  ~ {path} ({format_size(old)} -> {format_size(new)})")
+    return lines
+
+def copy_header():
+    return ["\n" + "=" * 80, "项目结构 (复制友好格式)", "=" * 80]
 
 def print_tree_structure(items, show_details=True):
     """打印树状结构"""
-    print("=" * 80)
-    print("文件夹结构扫描结果")
-    print("=" * 80)
+    for line in tree_header():
+        print(line)
     
     for item in items:
-        # 计算缩进
-        indent = "  " * item['depth']
-        
-        # 文件/文件夹图标
-        if item['info']['is_dir']:
-            icon = "📁"
-            size_info = ""
+        print(format_tree_line(item, show_details))
+
+def print_summary(items):
+    """打印统计摘要"""
+    total_files = sum(1 for item in items if item.is_file)
+    total_dirs = sum(1 for item in items if item.is_dir)
+    total_size = sum(item.size for item in items if item.is_file)
+    
+    for line in summary_lines(total_files, total_dirs, total_size):
+        print(line)
+
+def render_scan(root_path, max_depth=8, show_details=True, out=None, top=0, workers=1,
+                index=None, full_rescan=False, show_diff=False, trust_dir_mtime=False):
+    """单次遍历同时生成树状结构、统计摘要、目录汇总和复制友好格式
+
+    树状结构边扫描边输出；复制友好格式暂存（过大时转存临时文件），
+    输出时目录行附上自底向上累计的大小和文件数；top 大于 0 时列出最大的子树。
+    提供 index 时通过 ScanIndex 增量扫描，show_diff 列出与上次扫描相比的文件变化，
+    trust_dir_mtime 时修改时间未变的目录中的文件沿用索引中的记录
+    """
+    out = out or BufferedOutput()
+    total_files = total_dirs = total_size = 0
+    rollup = DirectoryRollup(top, max_depth)
+    
+    def on_error(path, error):
+        out.write_line(format_scan_error(path, error))
+    
+    for line in tree_header():
+        out.write_line(line)
+    
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_SIZE, mode="w+", encoding="utf-8",
+                                       newline="") as spool:
+        if index is not None:
+            items = index.iter_scan(max_depth=max_depth, on_error=on_error, full_rescan=full_rescan,
+                                    workers=workers, trust_dir_mtime=trust_dir_mtime)
         else:
-            icon = "📄"
-            size_info = f" ({format_size(item['info']['size'])})" if show_details else ""
+            items = iter_scan(root_path, max_depth=max_depth, on_error=on_error, workers=workers)
+        for item in items:
+            if item.is_file:
+                total_files += 1
+                total_size += item.size
+            elif item.is_dir:
+                total_dirs += 1
+            out.write_line(format_tree_line(item, show_details))
+            # 目录的汇总要等子树结束才知道，暂存时只记录目录编号；
+            # 文件名可能包含换行，每条记录先写 "目录编号\t长度\n" 再写整行
+            dir_id = rollup.add(item)
+            line = format_copy_line(item)
+            spool.write(f"{'' if dir_id is None else dir_id}\t{len(line)}\n{line}")
+        rollup.finish()
         
-        # 修改时间
-        time_info = ""
-        if show_details and item['info']['modified']:
-            time_info = f" - {item['info']['modified'].strftime('%Y-%m-%d %H:%M')}"
+        for line in summary_lines(total_files, total_dirs, total_size):
+            out.write_line(line)
+        if top > 0:
+            for line in top_lines(rollup.heaviest()):
+                out.write_line(line)
+        if show_diff:
+            for line in diff_lines(index.changes, index.has_baseline):
+                out.write_line(line)
+        for line in copy_header():
+            out.write_line(line)
         
-        # 打印项目
-        if item['info'].get('error'):
-            print(f"{indent}❌ {item['name']} [访问错误]")
-        else:
-            print(f"{indent}{icon} {item['name']}{size_info}{time_info}")
+        spool.seek(0)
+        for header in iter(spool.readline, ""):
+            dir_id, _, length = header[:-1].partition("\t")
+            line = spool.read(int(length))
+            if dir_id:
+                # 目录行以 "/" 结尾，补上汇总信息
+                line = f"{line} ({format_rollup(rollup.totals[int(dir_id)])})"
+            out.write_line(line)
+    out.flush()
+    return total_files, total_dirs, total_size
 
-def print_summary(items):
-    """打印统计摘要"""
-    total_files = sum(1 for item in items if item['info']['is_file'])
-    total_dirs = sum(1 for item in items if item['info']['is_dir'])
-    total_size = sum(item['info']['size'] for item in items if item['info']['is_file'])
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="文件夹结构遍历脚本")
+    parser.add_argument("--root", help="扫描的目录，默认为当前目录")
+    parser.add_argument("--max-depth", type=int, default=8, help="最大扫描深度（默认 8）")
+    parser.add_argument("--top", type=int, default=0, metavar="N",
+                        help="列出最大的 N 个目录子树（按递归大小）")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="并行列出目录和 stat 的线程数，NFS/SMB 等高延迟挂载建议 8-32（默认 1）")
+    parser.add_argument("--index", metavar="FILE",
+                        help="SQLite 扫描索引文件。目录修改时间未变时不重新列目录，但仍 stat 每个条目"
+                             "以发现 scp 等原地改写的文件，本地磁盘上耗时与普通扫描相近，"
+                             "主要省去慢速挂载上列目录的开销；要跳过文件 stat 使用 --trust-dir-mtime")
+    parser.add_argument("--trust-dir-mtime", action="store_true",
+                        help="修改时间未变的目录中的文件不再 stat，直接沿用索引中的记录，重扫快得多，"
+                             "但发现不了原地改写（不改变目录修改时间）的文件（需要 --index）")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="忽略目录修改时间重新列出所有目录（可发现目录修改时间被保留的增删）")
+    parser.add_argument("--diff", action="store_true",
+                        help="列出与上次扫描相比新增、删除、变大、变小、修改的文件（需要 --index）")
+    parser.add_argument("--format", choices=("tree", "ndjson", "csv"), default="tree",
+                        help="输出格式：树状文本，或逐条目的 NDJSON/CSV（默认 tree）")
+    parser.add_argument("--output", metavar="FILE",
+                        help="NDJSON/CSV 的输出文件，默认写到标准输出")
+    args = parser.parse_args()
+    if (args.diff or args.full_rescan or args.trust_dir_mtime) and not args.index:
+        parser.error("--diff、--full-rescan 和 --trust-dir-mtime 需要同时指定 --index")
+    if args.format == "tree" and args.output:
+        parser.error("--output 只适用于 ndjson/csv 格式")
+    if args.format != "tree" and (args.diff or args.top):
+        parser.error("--diff 和 --top 只适用于 tree 格式")
+    return args
+
+def export_scan(root_path, fmt, output=None, max_depth=8, workers=1, index=None, full_rescan=False,
+                trust_dir_mtime=False):
+    """以 NDJSON 或 CSV 流式导出扫描结果，output 为 None 时写到标准输出，返回条目数"""
+    def on_error(path, error):
+        print(format_scan_error(path, error), file=sys.stderr)
     
-    print("\n" + "=" * 80)
-    print("扫描统计摘要")
-    print("=" * 80)
-    print(f"总文件数: {total_files}")
-    print(f"总文件夹数: {total_dirs}")
-    print(f"总大小: {format_size(total_size)}")
+    if index is not None:
+        entries = index.iter_scan(max_depth=max_depth, on_error=on_error, full_rescan=full_rescan,
+                                  workers=workers, trust_dir_mtime=trust_dir_mtime)
+    else:
+        entries = iter_scan(root_path, max_depth=max_depth, on_error=on_error, workers=workers)
+    if output is None:
+        return EXPORTERS[fmt](entries, sys.stdout)
+    with open(output, "w", encoding="utf-8", newline="") as f:
+        return EXPORTERS[fmt](entries, f)
 
 def main():
     """主函数"""
-    print("开始扫描当前目录...")
+    args = parse_args()
+    # 导出格式的结果写到标准输出时，提示信息改写到标准错误
+    log = sys.stderr if args.format != "tree" else sys.stdout
+    print("开始扫描当前目录...", file=log)
     
     # 获取当前工作目录
-    current_dir = Path.cwd()
-    print(f"扫描路径: {current_dir}")
+    current_dir = Path(args.root) if args.root else Path.cwd()
+    print(f"扫描路径: {current_dir}", file=log, flush=True)
     
-    # 扫描目录
-    items = scan_directory(current_dir, max_depth=8)
-    
-    # 打印结果
-    print_tree_structure(items, show_details=True)
-    print_summary(items)
-    
-    # 生成项目结构文本
-    print("\n" + "=" * 80)
-    print("项目结构 (复制友好格式)")
-    print("=" * 80)
-    
-    for item in items:
-        indent = "  " * item['depth']
-        prefix = "├── " if item['depth'] > 0 else ""
-        
-        if item['info']['is_dir']:
-            print(f"{indent}{prefix}{item['name']}/")
+    index = ScanIndex(args.index, current_dir) if args.index else None
+    try:
+        if args.format == "tree":
+            # ✨流式扫描：边扫描边输出树状结构，三个视图只遍历一次
+            render_scan(current_dir, max_depth=args.max_depth, show_details=True, top=args.top,
+                        workers=args.workers, index=index, full_rescan=args.full_rescan,
+                        show_diff=args.diff, trust_dir_mtime=args.trust_dir_mtime)
         else:
-            size_info = f" ({format_size(item['info']['size'])})"
-            print(f"{indent}{prefix}{item['name']}{size_info}")
+            count = export_scan(current_dir, args.format, args.output, max_depth=args.max_depth,
+                                workers=args.workers, index=index, full_rescan=args.full_rescan,
+                                trust_dir_mtime=args.trust_dir_mtime)
+            print(f"已导出 {count} 个条目", file=log)
+        if index is not None:
+            index.save()
+            print(f"扫描索引: 沿用 {index.reused} 个目录, 重新列出 {index.listed} 个目录", file=log)
+    finally:
+        if index is not None:
+            index.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
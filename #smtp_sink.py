@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 SMTP 接收端（替身）
+基于 asyncio，实现 MailKit 发信所需的 ESMTP 子集（EHLO、STARTTLS、AUTH PLAIN/LOGIN、
+MAIL/RCPT/DATA、RSET、NOOP、QUIT），收到的邮件只统计不投递，用于离线测试发信吞吐
+- 每个命令可配置固定延迟和随机抖动，模拟慢中继
+- 按命令注入失败（4xx 临时错误或 5xx 永久错误）
+- 限制同时连接数，超出时回复 421 并断开
+- 记录每个连接和每封邮件的耗时、大小，以及新建连接数，定期和退出时输出摘要
+
+把 SmtpSettings 的 Host/Port 指向本脚本即可；UseSsl 为 true 时服务会要求 STARTTLS，
+需要通过 --cert/--key 提供证书，例如：
+    openssl req -x509 -newkey rsa:2048 -nodes -days 30 -subj /CN=localhost -keyout sink.key -out sink.crt
+MailKit 默认校验服务器证书，自签名证书需要加入系统信任列表；只测吞吐时也可以把 UseSsl 设为 false
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import ssl
+import sys
+import time
+
+MAX_LINE = 64 * 1024
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+# 可配置延迟和失败的命令；connect 表示发出欢迎语之前
+COMMANDS = ("connect", "ehlo", "starttls", "auth", "mail", "rcpt", "data", "quit")
+
+def parse_command_map(text, value_type, option):
+    """解析 "data=200,rcpt=5" 形式的按命令配置"""
+    result = {}
+    if not text:
+        return result
+    for part in text.split(","):
+        name, sep, value = part.strip().partition("=")
+        name = name.lower()
+        if not sep or name not in COMMANDS:
+            raise ValueError(f"{option} 格式应为 命令=值，命令可选: {', '.join(COMMANDS)}")
+        result[name] = value_type(value)
+    return result
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class SinkStats:
+    """连接和邮件的统计"""
+
+    def __init__(self, log_file=None):
+        self.started = time.perf_counter()
+        self.connections_opened = 0
+        self.connections_rejected = 0
+        self.active = 0
+        self.peak_active = 0
+        self.tls_upgrades = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self.failures_injected = 0
+        self.message_ms = []      # MAIL FROM 到 DATA 结束的耗时
+        self.connection_ms = []   # 连接建立到关闭的耗时
+        self.messages_per_connection = []
+        self.log_file = log_file
+
+    def record_message(self, record):
+        self.messages += 1
+        self.recipients += record['recipients']
+        self.bytes += record['size']
+        self.message_ms.append(record['duration_ms'])
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.log_file.flush()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        message_ms = sorted(self.message_ms)
+        connection_ms = sorted(self.connection_ms)
+        reused = sum(1 for count in self.messages_per_connection if count > 1)
+        return {
+            "elapsed_s": elapsed,
+            "connections_opened": self.connections_opened,
+            "connections_rejected": self.connections_rejected,
+            "connections_with_multiple_messages": reused,
+            "peak_active_connections": self.peak_active,
+            "tls_upgrades": self.tls_upgrades,
+            "messages": self.messages,
+            "messages_per_s": self.messages / elapsed if elapsed > 0 else 0.0,
+            "recipients": self.recipients,
+            "bytes": self.bytes,
+            "failures_injected": self.failures_injected,
+            "message_ms": {"p50": percentile(message_ms, 50), "p99": percentile(message_ms, 99),
+                           "max": message_ms[-1] if message_ms else 0.0},
+            "connection_ms": {"p50": percentile(connection_ms, 50), "p99": percentile(connection_ms, 99),
+                              "max": connection_ms[-1] if connection_ms else 0.0},
+        }
+
+def print_summary(summary, stream=sys.stdout):
+    print(f"[{summary['elapsed_s']:.0f}s] 连接: 新建 {summary['connections_opened']}, "
+          f"拒绝 {summary['connections_rejected']}, 峰值并发 {summary['peak_active_connections']}, "
+          f"STARTTLS {summary['tls_upgrades']}; "
+          f"邮件: {summary['messages']} 封 ({summary['messages_per_s']:.1f}/s), "
+          f"{summary['recipients']} 个收件人, {summary['bytes']} 字节, 注入失败 {summary['failures_injected']}; "
+          f"单封耗时 p50 {summary['message_ms']['p50']:.1f} ms / p99 {summary['message_ms']['p99']:.1f} ms; "
+          f"连接耗时 p50 {summary['connection_ms']['p50']:.1f} ms", file=stream, flush=True)
+
+class SmtpSession:
+    """一个 SMTP 连接的会话状态"""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.tls = False
+        self.authenticated = False
+        self.greeted = False
+        self.messages = 0
+        self.reset()
+
+    def reset(self):
+        self.mail_from = None
+        self.rcpt_to = []
+        self.mail_started = None
+
+    async def reply(self, code, text, extra=()):
+        """多行回复时 extra 为前面的行"""
+        lines = [f"{code}-{line}" for line in extra] + [f"{code} {text}"]
+        self.writer.write(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+        await self.writer.drain()
+
+    async def readline(self):
+        line = await self.reader.readuntil(b"\n")
+        if len(line) > MAX_LINE:
+            raise ValueError("行过长")
+        return line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+    async def delay(self, command):
+        await self.server.delay(command)
+
+    async def injected_failure(self, command):
+        """按配置的概率注入失败，返回 True 表示已回复错误"""
+        rate = self.server.fail.get(command)
+        if rate and self.server.rng.random() < rate:
+            self.server.stats.failures_injected += 1
+            if self.server.fail_code >= 500:
+                await self.reply(self.server.fail_code, "5.3.0 Injected permanent failure")
+            else:
+                await self.reply(self.server.fail_code, "4.3.0 Injected temporary failure")
+            return True
+        return False
+
+    def capabilities(self):
+        caps = [f"SIZE {self.server.max_size}", "8BITMIME", "PIPELINING", "ENHANCEDSTATUSCODES"]
+        if self.server.ssl_context is not None and not self.tls:
+            caps.append("STARTTLS")
+        if self.tls or self.server.ssl_context is None:
+            # 与常见中继一致，只在加密连接上提供认证
+            caps.append("AUTH PLAIN LOGIN")
+        return caps
+
+    async def run(self):
+        await self.delay("connect")
+        if await self.injected_failure("connect"):
+            return
+        await self.reply(220, f"{self.server.hostname} ESMTP NotifyHub sink ready")
+        while True:
+            line = await self.readline()
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+            handler = getattr(self, f"cmd_{verb.lower()}", None) if verb.isalpha() else None
+            if handler is None:
+                await self.reply(502, "5.5.2 Command not implemented")
+                continue
+            if await handler(arg.strip()) is False:
+                return
+
+    async def cmd_ehlo(self, arg):
+        await self.delay("ehlo")
+        if await self.injected_failure("ehlo"):
+            return
+        self.greeted = True
+        self.reset()
+        lines = [f"{self.server.hostname} Hello {arg or 'client'}"] + self.capabilities()
+        await self.reply(250, lines[-1], lines[:-1])
+
+    async def cmd_helo(self, arg):
+        await self.delay("ehlo")
+        self.greeted = True
+        self.reset()
+        await self.reply(250, f"{self.server.hostname} Hello {arg or 'client'}")
+
+    async def cmd_starttls(self, arg):
+        if self.server.ssl_context is None or self.tls:
+            await self.reply(502, "5.5.1 STARTTLS not available")
+            return
+        await self.delay("starttls")
+        if await self.injected_failure("starttls"):
+            return
+        await self.reply(220, "2.0.0 Ready to start TLS")
+        await self.writer.start_tls(self.server.ssl_context)
+        self.tls = True
+        self.greeted = False
+        self.authenticated = False
+        self.reset()
+        self.server.stats.tls_upgrades += 1
+
+    async def cmd_auth(self, arg):
+        mechanism, _, initial = arg.partition(" ")
+        mechanism = mechanism.upper()
+        if mechanism not in ("PLAIN", "LOGIN"):
+            await self.reply(504, "5.5.4 Unrecognized authentication type")
+            return
+        if self.authenticated:
+            await self.reply(503, "5.5.1 Already authenticated")
+            return
+        # 接受任意用户名和密码，只走完交互流程
+        if mechanism == "PLAIN" and not initial:
+            await self.reply(334, "")
+            await self.readline()
+        elif mechanism == "LOGIN":
+            if not initial:
+                await self.reply(334, "VXNlcm5hbWU6")
+                await self.readline()
+            await self.reply(334, "UGFzc3dvcmQ6")
+            await self.readline()
+        await self.delay("auth")
+        if await self.injected_failure("auth"):
+            return
+        self.authenticated = True
+        await self.reply(235, "2.7.0 Authentication successful")
+
+    async def cmd_mail(self, arg):
+        if not self.greeted:
+            await self.reply(503, "5.5.1 Send EHLO first")
+            return
+        if not arg.upper().startswith("FROM:"):
+            await self.reply(501, "5.5.4 Syntax: MAIL FROM:<address>")
+            return
+        self.reset()
+        self.mail_started = time.perf_counter()
+        await self.delay("mail")
+        if await self.injected_failure("mail"):
+            return
+        self.mail_from = arg[5:].strip()
+        await self.reply(250, "2.1.0 Sender OK")
+
+    async def cmd_rcpt(self, arg):
+        if self.mail_from is None:
+            await self.reply(503, "5.5.1 Need MAIL command")
+            return
+        if not arg.upper().startswith("TO:"):
+            await self.reply(501, "5.5.4 Syntax: RCPT TO:<address>")
+            return
+        await self.delay("rcpt")
+        if await self.injected_failure("rcpt"):
+            return
+        self.rcpt_to.append(arg[3:].strip())
+        await self.reply(250, "2.1.5 Recipient OK")
+
+    async def cmd_data(self, arg):
+        if not self.rcpt_to:
+            await self.reply(503, "5.5.1 Need RCPT command")
+            return
+        await self.reply(354, "Start mail input; end with <CRLF>.<CRLF>")
+        size = 0
+        while True:
+            line = await self.reader.readuntil(b"\n")
+            if line in (b".\r\n", b".\n"):
+                break
+            # 去掉透明处理时加上的首个点
+            size += len(line) - 1 if line.startswith(b"..") else len(line)
+        await self.delay("data")
+        if size > self.server.max_size:
+            await self.reply(552, "5.3.4 Message size exceeds fixed limit")
+            self.reset()
+            return
+        if await self.injected_failure("data"):
+            self.reset()
+            return
+        self.messages += 1
+        self.server.stats.record_message({
+            "time": time.time(),
+            "from": self.mail_from,
+            "recipients": len(self.rcpt_to),
+            "size": size,
+            "tls": self.tls,
+            "message_in_connection": self.messages,
+            "duration_ms": (time.perf_counter() - self.mail_started) * 1000,
+        })
+        await self.reply(250, "2.0.0 Message accepted")
+        self.reset()
+
+    async def cmd_rset(self, arg):
+        self.reset()
+        await self.reply(250, "2.0.0 OK")
+
+    async def cmd_noop(self, arg):
+        await self.reply(250, "2.0.0 OK")
+
+    async def cmd_vrfy(self, arg):
+        await self.reply(252, "2.5.0 Cannot verify user")
+
+    async def cmd_quit(self, arg):
+        await self.delay("quit")
+        await self.reply(221, "2.0.0 Bye")
+        return False
+
+class SmtpSink:
+    """SMTP 接收端：限制并发连接，为每个连接运行一个 SmtpSession"""
+
+    def __init__(self, args, stats, ssl_context):
+        self.hostname = args.hostname
+        self.latency = args.latency
+        self.jitter = args.jitter
+        self.fail = args.fail
+        self.fail_code = args.fail_code
+        self.max_connections = args.max_connections
+        self.max_size = args.max_size
+        self.ssl_context = ssl_context
+        self.stats = stats
+        self.rng = random.Random(args.seed)
+
+    async def delay(self, command):
+        seconds = self.latency.get(command, 0.0) / 1000
+        if self.jitter:
+            seconds += self.rng.uniform(0, self.jitter / 1000)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def handle(self, reader, writer):
+        stats = self.stats
+        stats.connections_opened += 1
+        if self.max_connections and stats.active >= self.max_connections:
+            stats.connections_rejected += 1
+            writer.write(b"421 4.7.0 Too many connections, try again later\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        stats.active += 1
+        stats.peak_active = max(stats.peak_active, stats.active)
+        started = time.perf_counter()
+        session = SmtpSession(self, reader, writer)
+        try:
+            await session.run()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError,
+                ssl.SSLError, ValueError):
+            # 客户端断开或发送了无法解析的数据，直接结束会话
+            pass
+        finally:
+            stats.active -= 1
+            stats.connection_ms.append((time.perf_counter() - started) * 1000)
+            stats.messages_per_connection.append(session.messages)
+            writer.close()
+
+async def report_periodically(stats, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print_summary(stats.summary())
+
+async def serve(args, stats, ssl_context):
+    sink = SmtpSink(args, stats, ssl_context)
+    server = await asyncio.start_server(sink.handle, args.host, args.port, limit=MAX_LINE)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"SMTP 接收端已启动: {addresses}（STARTTLS {'开启' if ssl_context else '关闭'}）", flush=True)
+    tasks = []
+    if args.report_interval > 0:
+        tasks.append(asyncio.create_task(report_periodically(stats, args.report_interval)))
+    try:
+        async with server:
+            if args.duration:
+                await asyncio.sleep(args.duration)
+            else:
+                await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="本地 SMTP 接收端，用于离线测试发信吞吐")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=2525, help="监听端口（默认 2525）")
+    parser.add_argument("--hostname", default="localhost", help="欢迎语中的主机名")
+    parser.add_argument("--cert", help="STARTTLS 证书文件（PEM）")
+    parser.add_argument("--key", help="STARTTLS 私钥文件（PEM）")
+    parser.add_argument("--latency", default="", metavar="CMD=MS,...",
+                        help=f"按命令的固定延迟（毫秒），命令可选: {', '.join(COMMANDS)}")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS",
+                        help="每个有延迟的命令额外增加 0~MS 毫秒的随机延迟")
+    parser.add_argument("--fail", default="", metavar="CMD=RATE,...",
+                        help="按命令注入失败的概率，如 data=0.05")
+    parser.add_argument("--fail-code", type=int, default=451, choices=(421, 450, 451, 452, 550, 554),
+                        help="注入失败时的回复码（默认 451）")
+    parser.add_argument("--max-connections", type=int, default=0, metavar="N",
+                        help="最多同时连接数，超出时回复 421（默认不限）")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE, metavar="BYTES",
+                        help="单封邮件的最大字节数（默认 50 MB）")
+    parser.add_argument("--duration", type=float, default=0.0, metavar="SECONDS",
+                        help="运行指定秒数后退出（默认一直运行，Ctrl+C 退出）")
+    parser.add_argument("--report-interval", type=float, default=10.0, metavar="SECONDS",
+                        help="输出摘要的间隔（默认 10 秒，0 表示只在退出时输出）")
+    parser.add_argument("--log", metavar="FILE", help="把每封邮件的记录以 NDJSON 写入文件")
+    parser.add_argument("--json", metavar="FILE", help="退出时把摘要以 JSON 写入文件")
+    parser.add_argument("--seed", type=int, default=None, help="延迟抖动和失败注入的随机种子")
+    args = parser.parse_args()
+    if bool(args.cert) != bool(args.key):
+        parser.error("--cert 和 --key 需要同时指定")
+    try:
+        args.latency = parse_command_map(args.latency, float, "--latency")
+        args.fail = parse_command_map(args.fail, float, "--fail")
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def main():
+    """主函数"""
+    args = parse_args()
+    ssl_context = None
+    if args.cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.cert, args.key)
+
+    log_file = open(args.log, "a", encoding="utf-8") if args.log else None
+    stats = SinkStats(log_file)
+    try:
+        asyncio.run(serve(args, stats, ssl_context))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log_file is not None:
+            log_file.close()
+        summary = stats.summary()
+        print_summary(summary)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
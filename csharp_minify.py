@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+C# 代码压缩模块
+供 #packager.py 的 --compact 模式使用：基于词法分析删除注释、合并空白
+- 正确识别普通字符串、逐字字符串 @"..."、插值字符串 $"..."、原始字符串 \"\"\"...\"\"\" 和字符字面量
+- 字符串和预处理指令原样保留，换行只合并不删除
+"""
+
+import re
+
+# 词法单元（插值字符串和原始字符串需要手工扫描）
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<raw>"{3,})
+  | (?P<interpolated>\$+@?"|@\$+")
+  | (?P<verbatim>@"(?:[^"]|"")*(?:"|\Z))
+  | (?P<string>"(?:[^"\\\n]|\\.)*(?:"|$))
+  | (?P<char>'(?:[^'\\\n]|\\.)*(?:'|$))
+  | (?P<word>[\w@]+)
+  | (?P<punct>.)
+''', re.DOTALL | re.MULTILINE | re.VERBOSE)
+
+# 相邻时必须保留空格的运算符字符，避免 "a - -b" 变成 "a --b"、"/ /" 变成注释
+_OPERATOR_CHARS = frozenset("+-*/%&|^!=<>?:.~")
+
+def _is_wordish(c: str) -> bool:
+    return c.isalnum() or c in "_@$\"'"
+
+def _needs_space(prev: str, nxt: str) -> bool:
+    """删除两个词法单元之间的空白后是否会改变含义"""
+    if _is_wordish(prev) and _is_wordish(nxt):
+        return True
+    return prev in _OPERATOR_CHARS and nxt in _OPERATOR_CHARS
+
+def _scan_quote_run(src: str, pos: int, count: int) -> int:
+    """原始字符串：找到与起始引号数量相同的结束引号序列"""
+    end = src.find('"' * count, pos)
+    return len(src) if end < 0 else end + count
+
+def _scan_interpolated(src: str, pos: int) -> int:
+    """扫描插值字符串，pos 指向 $ 或 @，返回结束位置；插值表达式中可以嵌套字符串"""
+    start = pos
+    dollars = 0
+    verbatim = False
+    while pos < len(src) and src[pos] in "$@":
+        if src[pos] == "$":
+            dollars += 1
+        else:
+            verbatim = True
+        pos += 1
+    quotes = 0
+    while pos < len(src) and src[pos] == '"':
+        quotes += 1
+        pos += 1
+    if quotes >= 3:
+        # 原始插值字符串 $"""...""" 以同样数量的引号结束
+        return _scan_quote_run(src, pos, quotes)
+    if quotes == 2 and not verbatim:
+        # $"" 空字符串
+        return pos
+    if quotes == 2 and verbatim:
+        pos -= 1
+    open_braces = "{" * max(dollars, 1)
+
+    while pos < len(src):
+        c = src[pos]
+        if c == "\\" and not verbatim:
+            pos += 2
+        elif c == '"':
+            if verbatim and src.startswith('""', pos):
+                pos += 2
+            else:
+                return pos + 1
+        elif c == "{":
+            if dollars <= 1 and src.startswith("{{", pos):
+                pos += 2
+            elif src.startswith(open_braces, pos):
+                pos = _scan_hole(src, pos + len(open_braces))
+            else:
+                pos += 1
+        elif c == "\n" and not verbatim:
+            # 未闭合的普通插值字符串到行尾结束
+            return pos
+        else:
+            pos += 1
+    return max(pos, start + 1)
+
+def _scan_hole(src: str, pos: int) -> int:
+    """扫描插值表达式直到匹配的 }"""
+    depth = 1
+    while pos < len(src):
+        kind, end = next_token(src, pos)
+        if kind == "punct":
+            c = src[pos]
+            if c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    return end
+        pos = end
+    return pos
+
+def next_token(src: str, pos: int):
+    """返回从 pos 开始的下一个词法单元 (类型, 结束位置)"""
+    m = _TOKEN_PATTERN.match(src, pos)
+    kind = m.lastgroup
+    if kind == "raw":
+        return "string", _scan_quote_run(src, m.end(), len(m.group()))
+    if kind == "interpolated":
+        return "string", _scan_interpolated(src, pos)
+    if kind in ("verbatim", "char"):
+        return "string", m.end()
+    return kind, m.end()
+
+def iter_csharp_tokens(src: str):
+    """逐个产出 (类型, 文本)，类型为 ws/comment/directive/string/word/punct"""
+    pos = 0
+    at_line_start = True
+    while pos < len(src):
+        if at_line_start and src[pos] == "#":
+            # 预处理指令占满整行
+            end = src.find("\n", pos)
+            end = len(src) if end < 0 else end
+            yield "directive", src[pos:end]
+            pos = end
+            at_line_start = False
+            continue
+        kind, end = next_token(src, pos)
+        text = src[pos:end]
+        if kind == "ws":
+            if "\n" in text:
+                at_line_start = True
+        else:
+            at_line_start = False
+        yield kind, text
+        pos = end
+
+def minify_csharp(src: str) -> str:
+    """删除注释和多余空白；保留换行（连续空行合并），预处理指令保持独占一行"""
+    out = []
+    prev = ""
+    pending_space = False
+    pending_newline = False
+
+    for kind, text in iter_csharp_tokens(src):
+        if kind == "ws":
+            if "\n" in text:
+                pending_newline = True
+            else:
+                pending_space = True
+            continue
+        if kind == "comment":
+            # 注释相当于分隔符，如 a/*x*/b 不能合并成 ab
+            pending_space = True
+            continue
+
+        if prev:
+            if pending_newline or kind == "directive":
+                out.append("\n")
+            elif pending_space and _needs_space(prev, text[0]):
+                out.append(" ")
+        out.append(text)
+        prev = text[-1]
+        pending_space = False
+        # 指令之后必须换行
+        pending_newline = kind == "directive"
+
+    if prev:
+        out.append("\n")
+    return "".join(out)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+邮件发送日志格式
+EmailService.LogEmailSent 写入 logs/email-sent-YYYYMMDD.log 的行格式，供 #email_log_stats.py 和
+#metrics_exporter.py 共用。LINE_RE 在整段字节上用 finditer 匹配，不需要逐行切分和解码
+"""
+
+import re
+
+LOG_PATTERN = "email-sent-*.log"
+
+# Subject 由调用方提供，可能包含 " | "，因此只按后面固定出现的字段定位。
+# 不符合格式的行匹配到最后一个分支（other 组），可计为无法解析
+LINE_RE = re.compile(
+    rb"^(?:\[(?P<hour>\d{4}-\d\d-\d\d \d\d):\d\d:\d\d\] \xe9\x82\xae\xe4\xbb\xb6\xe5\x8f\x91\xe9\x80\x81"
+    rb"(?P<status>\xe6\x88\x90\xe5\x8a\x9f|\xe5\xa4\xb1\xe8\xb4\xa5)"      # 邮件发送(成功|失败)
+    rb" \| EmailId: [^|\n]* \| RequestId: [^|\n]* \| Project: (?P<project>[^|\n]*?)"
+    rb" \| Category: (?P<category>[^\n]*?) \| Subject: [^\n]*? \| Recipients: (?P<recipients>\d+)"
+    rb" \| Priority: [^\n]*?(?: \| Attachments: (?P<files>\d+) files, (?P<mb>[\d.]+)MB)?"
+    rb" \| From: [^\n]*? \| SentAt: [^ \n]+(?: \| Error: (?P<error>[^\n]*?))?"
+    rb"|(?P<other>[^\n]*?))\r?$",
+    re.MULTILINE,
+)
+SUCCESS = "成功".encode("utf-8")
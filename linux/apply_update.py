@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NotifyHub 增量更新应用脚本（服务器端）
+由 #deploy_delta.py 打包进更新包，在服务器上解包后执行：
+
+    mkdir -p /tmp/notifyhub-update && tar -xJf notifyhub-update.tar.xz -C /tmp/notifyhub-update
+    python3 /tmp/notifyhub-update/apply_update.py /var/www/notifyhub --restart notifyhub
+
+- 先核对目标目录的 .deploy-manifest.json 是否就是打包时的基线，不一致时拒绝应用（--force 跳过）
+- 块差异按旧文件重建，重建前后都校验 SHA-256
+- 所有新文件先写到目标目录下的暂存目录，全部准备好后再逐个 os.replace 替换，
+  正在运行的进程仍持有旧文件，服务只在最后重启一次
+只依赖标准库，不需要仓库里的其他模块
+"""
+
+import os
+import argparse
+import hashlib
+import json
+import shutil
+import struct
+import subprocess
+import sys
+
+PLAN_NAME = "deploy.json"
+MANIFEST_NAME = ".deploy-manifest.json"
+STAGING_NAME = ".deploy-staging"
+DELTA_MAGIC = b"NHDELTA1"
+DELTA_HEADER = struct.Struct(">8sI")
+COPY_OP = struct.Struct(">II")   # 起始块号, 块数
+LITERAL_OP = struct.Struct(">I")  # 字面量长度
+
+class ApplyError(Exception):
+    pass
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def apply_delta(old, delta):
+    """按差异数据（复制旧文件的块 + 字面量）重建新文件内容"""
+    magic, block_size = DELTA_HEADER.unpack_from(delta, 0)
+    if magic != DELTA_MAGIC:
+        raise ApplyError("差异数据格式不正确")
+    parts = []
+    pos = DELTA_HEADER.size
+    while pos < len(delta):
+        op = delta[pos:pos + 1]
+        pos += 1
+        if op == b"C":
+            start, count = COPY_OP.unpack_from(delta, pos)
+            pos += COPY_OP.size
+            chunk = old[start * block_size:(start + count) * block_size]
+            if len(chunk) != count * block_size:
+                raise ApplyError("差异引用的块超出旧文件范围")
+            parts.append(chunk)
+        elif op == b"L":
+            (length,) = LITERAL_OP.unpack_from(delta, pos)
+            pos += LITERAL_OP.size
+            parts.append(delta[pos:pos + length])
+            pos += length
+        else:
+            raise ApplyError(f"未知的差异操作: {op!r}")
+    return b"".join(parts)
+
+def target_path(target, rel_path):
+    """把清单中的相对路径映射到目标目录，拒绝越出目标目录的路径"""
+    path = os.path.normpath(os.path.join(target, *rel_path.split("/")))
+    if os.path.commonpath([target, path]) != target:
+        raise ApplyError(f"路径越出目标目录: {rel_path}")
+    return path
+
+def current_manifest_id(target):
+    path = os.path.join(target, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get('id')
+
+def stage(plan, package_dir, target, staging):
+    """在暂存目录中准备所有新文件，返回 [(暂存路径, 目标路径)]"""
+    staged = []
+    for i, rel_path in enumerate(plan['files']):
+        dest = target_path(target, rel_path)
+        source = os.path.join(package_dir, "files", *rel_path.split("/"))
+        tmp = os.path.join(staging, str(i))
+        shutil.copyfile(source, tmp)
+        # 沿用现有文件的权限（例如 apphost 的可执行位），新文件使用更新包中的权限
+        shutil.copymode(dest if os.path.exists(dest) else source, tmp)
+        staged.append((tmp, dest))
+    for i, (rel_path, info) in enumerate(sorted(plan['deltas'].items())):
+        dest = target_path(target, rel_path)
+        if not os.path.exists(dest) or file_sha256(dest) != info['base_sha256']:
+            raise ApplyError(f"{rel_path} 与打包时的基线版本不一致，无法应用块差异")
+        with open(dest, "rb") as f:
+            old = f.read()
+        with open(os.path.join(package_dir, "delta", *rel_path.split("/")) + ".delta", "rb") as f:
+            data = apply_delta(old, f.read())
+        if hashlib.sha256(data).hexdigest() != info['sha256']:
+            raise ApplyError(f"{rel_path} 重建后的校验和不一致")
+        tmp = os.path.join(staging, f"d{i}")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        shutil.copymode(dest, tmp)
+        staged.append((tmp, dest))
+    return staged
+
+def apply_update(package_dir, target, force=False, dry_run=False):
+    """应用更新包，返回是否有文件变化"""
+    with open(os.path.join(package_dir, PLAN_NAME), "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    target = os.path.abspath(target)
+    current = current_manifest_id(target)
+    if plan['base_id'] is not None and current != plan['base_id'] and not force:
+        raise ApplyError(f"目标目录的部署版本 {current} 不是更新包的基线 {plan['base_id']}，"
+                         f"请用服务器上的 {MANIFEST_NAME} 作为基线重新打包，或使用 --force")
+
+    print(f"更新: {len(plan['files'])} 个完整文件, {len(plan['deltas'])} 个块差异, "
+          f"{len(plan['deleted'])} 个删除")
+    if dry_run:
+        for rel_path in plan['files'] + sorted(plan['deltas']):
+            print(f"  更新 {rel_path}")
+        for rel_path in plan['deleted']:
+            print(f"  删除 {rel_path}")
+        return False
+
+    staging = os.path.join(target, STAGING_NAME)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        staged = stage(plan, package_dir, target, staging)
+        # 全部准备好后再替换，替换过程中不会出现只更新了一半的文件
+        for tmp, dest in staged:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp, dest)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    for rel_path in plan['deleted']:
+        path = target_path(target, rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    manifest_path = os.path.join(target, MANIFEST_NAME)
+    shutil.copyfile(os.path.join(package_dir, "manifest.json"), manifest_path + ".tmp")
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return bool(staged or plan['deleted'])
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="NotifyHub 增量更新应用脚本（服务器端）")
+    parser.add_argument("target", nargs="?", default="/var/www/notifyhub",
+                        help="部署目录（默认 /var/www/notifyhub）")
+    parser.add_argument("--package", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="解包后的更新包目录（默认为本脚本所在目录）")
+    parser.add_argument("--restart", metavar="SERVICE", help="应用后重启的 systemd 服务，例如 notifyhub")
+    parser.add_argument("--force", action="store_true", help="目标目录的部署版本与基线不一致时仍然应用")
+    parser.add_argument("--dry-run", action="store_true", help="只列出要更新的文件")
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_args()
+    try:
+        changed = apply_update(args.package, args.target, args.force, args.dry_run)
+    except (ApplyError, OSError, ValueError, KeyError) as e:
+        print(f"❌ 应用失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.dry_run:
+        return
+    if not changed:
+        print("没有需要替换的文件")
+        return
+    print("✅ 文件已更新")
+    if args.restart:
+        command = ["systemctl", "restart", args.restart]
+        if os.geteuid() != 0:
+            command.insert(0, "sudo")
+        sys.exit(subprocess.call(command))
+
+if __name__ == "__main__":
+    main()
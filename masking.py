@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+敏感信息掩码规则库
+规则从 masking_rules.json 加载并只编译一次，供 #packager.py 和其他脚本共用
+- 规则按分组（csharp、json、xml、env、serilog、log）组织，按文件名选择适用的分组
+- mask_many / mask_stream 把多行合并成块后每条规则只扫描一次，适合百万行级的日志导出
+
+用法:
+    from masking import load_rules, mask_stream
+
+    with open("logs/email-sent-20250101.log", encoding="utf-8") as f, open(out_path, "w", encoding="utf-8") as out:
+        out.writelines(mask_stream(f, "email-sent-20250101.log"))
+"""
+
+import fnmatch
+import functools
+import hashlib
+import json
+import os
+import re
+
+# 规则库自身的掩码逻辑变化时递增，使依赖规则指纹的缓存失效
+MASKING_LIBRARY_VERSION = 1
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "masking_rules.json")
+# mask_stream 每次合并处理的字符数（按整行切分）
+DEFAULT_BATCH_SIZE = 256 * 1024
+
+# re.IGNORECASE 会把这几个非ASCII字符匹配为 i/s，而 str.lower() 不会
+_IGNORECASE_SPECIAL_CHARS = ('İ', 'ı', 'ſ')
+# 规则表达式中的关键词占位符
+_KEYWORDS_PLACEHOLDER = "{keywords}"
+_TEMPLATE_FIELD = re.compile(r'\{(\w+)\}')
+
+class MaskingRuleError(ValueError):
+    """规则配置无效"""
+
+def mask_value(val: str, min_show: int = None) -> str:
+    """
+    根据字符串长度智能掩码
+    - 短值（≤8字符）：显示前4位 + ****
+    - 中等值（9-16字符）：显示前8位 + ****
+    - 长值（>16字符）：显示前16位 + ****
+    """
+    if not val:
+        return val
+
+    if min_show is not None:
+        show_chars = min_show
+    elif len(val) <= 8:
+        show_chars = min(4, len(val))
+    elif len(val) <= 16:
+        show_chars = 8
+    else:
+        show_chars = 16
+
+    if len(val) <= show_chars:
+        return val
+    return val[:show_chars] + '****'
+
+# 连接字符串中的敏感片段
+CONN_PASSWORD_PATTERN = re.compile(r'(password|pwd)\s*=\s*([^;]+)', re.IGNORECASE)
+CONN_USER_PATTERN = re.compile(r'(user\s*id|uid|username)\s*=\s*([^;]+)', re.IGNORECASE)
+CONN_SERVER_PATTERN = re.compile(r'(server|data\s*source)\s*=\s*([^;]+)', re.IGNORECASE)
+
+def mask_connection_string(conn_str: str) -> str:
+    """智能处理连接字符串，只掩码敏感部分"""
+    if not conn_str:
+        return conn_str
+
+    # 处理各种连接字符串格式
+    result = CONN_PASSWORD_PATTERN.sub(r'\1=****', conn_str)
+    result = CONN_USER_PATTERN.sub(lambda m: f'{m.group(1)}={mask_value(m.group(2), 4)}', result)
+    result = CONN_SERVER_PATTERN.sub(lambda m: f'{m.group(1)}={mask_value(m.group(2), 8)}', result)
+
+    return result
+
+def mask_email(address: str) -> str:
+    """邮件地址只保留首字符和域名，如 alice@example.com -> a****@example.com"""
+    local, sep, domain = address.partition('@')
+    if not sep or not local:
+        return address
+    return local[0] + '****@' + domain
+
+def mask_path(path: str) -> str:
+    """绝对路径只保留文件名，隐藏服务器目录结构；相对路径保持不变"""
+    if not (path.startswith(('/', '\\')) or re.match(r'[A-Za-z]:', path)):
+        return path
+    cut = max(path.rfind('/'), path.rfind('\\'))
+    if cut < 0:
+        return path
+    return '****' + path[cut:]
+
+def _mask_auto(value: str, key: str, keep: int = None) -> str:
+    # 键名含 connection 的值按连接字符串处理
+    if key is not None and 'connection' in key.lower():
+        return mask_connection_string(value)
+    return mask_value(value, keep)
+
+# 掩码方式：(值, 键名, 保留字符数) -> 掩码后的值
+MASK_MODES = {
+    "value": lambda value, key, keep: mask_value(value, keep),
+    "connection_string": lambda value, key, keep: mask_connection_string(value),
+    "auto": _mask_auto,
+    "email": lambda value, key, keep: mask_email(value),
+    "path": lambda value, key, keep: mask_path(value),
+}
+
+class Rule:
+    """编译后的单条规则；pattern.sub(rule.replace, text) 即可应用"""
+
+    __slots__ = ("name", "group", "pattern", "mode", "keep", "sensitive_key", "has_key", "require", "template", "ruleset")
+
+    def __init__(self, ruleset, spec):
+        self.ruleset = ruleset
+        self.name = spec.get("name")
+        if not self.name:
+            raise MaskingRuleError(f"规则缺少 name: {spec}")
+        self.group = spec.get("group")
+        if self.group not in ruleset.groups:
+            raise MaskingRuleError(f"规则 {self.name}: 未定义的分组 {self.group!r}")
+
+        flags = re.MULTILINE
+        for flag in spec.get("flags", []):
+            if not hasattr(re, flag):
+                raise MaskingRuleError(f"规则 {self.name}: 未知的正则标志 {flag!r}")
+            flags |= getattr(re, flag)
+        pattern = spec.get("pattern", "").replace(_KEYWORDS_PLACEHOLDER, ruleset.keyword_alternation)
+        try:
+            self.pattern = re.compile(pattern, flags)
+        except re.error as e:
+            raise MaskingRuleError(f"规则 {self.name}: 正则表达式无效: {e}") from e
+        if "value" not in self.pattern.groupindex:
+            raise MaskingRuleError(f"规则 {self.name}: 表达式必须包含命名分组 value")
+
+        self.mode = MASK_MODES.get(spec.get("mask", "value"))
+        if self.mode is None:
+            raise MaskingRuleError(f"规则 {self.name}: 未知的掩码方式 {spec.get('mask')!r}")
+        self.keep = spec.get("keep")
+        self.has_key = "key" in self.pattern.groupindex
+        self.sensitive_key = bool(spec.get("sensitive_key"))
+        if self.sensitive_key and not self.has_key:
+            raise MaskingRuleError(f"规则 {self.name}: sensitive_key 需要命名分组 key")
+
+        # 预过滤：块中不含任何 require 子串（忽略大小写）时整条规则跳过
+        require = spec.get("require", [])
+        self.require = None if require == _KEYWORDS_PLACEHOLDER else tuple(s.lower() for s in require)
+
+        # 替换模板预先拆成 (字面量, 分组名) 片段；没有模板时只替换 value 分组
+        template = spec.get("template")
+        self.template = None
+        if template is not None:
+            parts = []
+            pos = 0
+            for m in _TEMPLATE_FIELD.finditer(template):
+                if m.group(1) not in self.pattern.groupindex:
+                    raise MaskingRuleError(f"规则 {self.name}: 模板引用了不存在的分组 {m.group(1)!r}")
+                parts.append((template[pos:m.start()], m.group(1)))
+                pos = m.end()
+            parts.append((template[pos:], None))
+            self.template = tuple(parts)
+
+    def may_match(self, lowered: str, has_special: bool) -> bool:
+        """块级预过滤，结果是实际匹配的超集"""
+        if self.require is None:
+            return has_special or any(keyword in lowered for keyword in self.ruleset.prefilter_keywords)
+        if not self.require:
+            return True
+        return has_special or any(s in lowered for s in self.require)
+
+    def replace(self, match) -> str:
+        """re.sub 的替换函数"""
+        key = match.group("key") if self.has_key else None
+        if self.sensitive_key and not self.ruleset.is_sensitive_key(key):
+            return match.group(0)
+        masked = self.mode(match.group("value"), key, self.keep)
+
+        if self.template is None:
+            base, end = match.span()
+            value_start, value_end = match.span("value")
+            if value_start == base and value_end == end:
+                return masked
+            string = match.string
+            return string[base:value_start] + masked + string[value_end:end]
+        out = []
+        for literal, name in self.template:
+            out.append(literal)
+            if name == "value":
+                out.append(masked)
+            elif name is not None:
+                out.append(match.group(name) or "")
+        return "".join(out)
+
+class Masker:
+    """绑定到一组规则的掩码器，由 RuleSet.group() / RuleSet.for_file() 创建"""
+
+    __slots__ = ("rules", "whole_document")
+
+    def __init__(self, rules, whole_document: bool = False):
+        self.rules = tuple(rules)
+        # 规则需要跨行匹配（如 XML 元素），流式处理时只能整体处理
+        self.whole_document = whole_document
+
+    def mask_text(self, text: str) -> str:
+        """对一段文本应用全部规则"""
+        if not self.rules or not text:
+            return text
+        lowered = text.lower()
+        has_special = any(c in text for c in _IGNORECASE_SPECIAL_CHARS)
+        for rule in self.rules:
+            if rule.may_match(lowered, has_special):
+                text = rule.pattern.sub(rule.replace, text)
+        return text
+
+    def mask_many(self, lines):
+        """批量掩码多行（不含换行符），返回新的列表；所有规则对整批只扫描一次"""
+        lines = list(lines)
+        if not self.rules or not lines:
+            return lines
+        return self.mask_text("\n".join(lines)).split("\n")
+
+    def mask_stream(self, iterable, batch_size: int = DEFAULT_BATCH_SIZE):
+        """流式掩码，输入为任意文本块或行（如文件对象），产出掩码后的文本块
+
+        输入按整行合并成约 batch_size 字符的块，''.join(产出) 与整体处理结果一致
+        """
+        if self.whole_document:
+            yield self.mask_text("".join(iterable))
+            return
+
+        parts = []
+        size = 0
+        for chunk in iterable:
+            parts.append(chunk)
+            size += len(chunk)
+            if size < batch_size:
+                continue
+            block = "".join(parts)
+            cut = block.rfind("\n") + 1
+            if cut == 0:
+                # 超长的单行，继续累积到出现换行
+                parts = [block]
+                continue
+            yield self.mask_text(block[:cut])
+            rest = block[cut:]
+            parts = [rest] if rest else []
+            size = len(rest)
+        if parts:
+            yield self.mask_text("".join(parts))
+
+class RuleSet:
+    """从配置编译的完整规则集"""
+
+    def __init__(self, config: dict, source: str = None):
+        self.source = source
+        self.keywords = tuple(config.get("keywords", []))
+        if not self.keywords:
+            raise MaskingRuleError("规则配置缺少 keywords")
+        self.keyword_alternation = "|".join(re.escape(keyword) for keyword in self.keywords)
+        self.keyword_pattern = re.compile(self.keyword_alternation, re.IGNORECASE)
+        # 包含其他关键词的关键词（如 apikey 包含 key）在子串检查中是多余的
+        self.prefilter_keywords = tuple(
+            keyword.lower() for keyword in self.keywords
+            if not any(other != keyword and other in keyword for other in self.keywords)
+        )
+
+        self.groups = {}
+        for name, group in config.get("groups", {}).items():
+            self.groups[name] = {
+                "files": tuple(pattern.lower() for pattern in group.get("files", [])),
+                "whole_document": bool(group.get("whole_document")),
+            }
+        self.rules = tuple(Rule(self, spec) for spec in config.get("rules", []))
+
+        payload = json.dumps([MASKING_LIBRARY_VERSION, config], sort_keys=True, ensure_ascii=False)
+        self.fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        self._maskers = {}
+
+    def is_sensitive_key(self, key: str) -> bool:
+        """检查键名是否包含敏感关键词"""
+        key_lower = key.lower()
+        return any(keyword in key_lower for keyword in self.prefilter_keywords)
+
+    def contains_keyword(self, text: str) -> bool:
+        """快速判断文本是否可能包含关键词
+
+        转小写后做子串查找比忽略大小写的正则快两个数量级；
+        只有含特殊字符时才退回正则，结果与 keyword_pattern.search 一致或更宽
+        """
+        if self.is_sensitive_key(text):
+            return True
+        if any(c in text for c in _IGNORECASE_SPECIAL_CHARS):
+            return self.keyword_pattern.search(text) is not None
+        return False
+
+    def group(self, *names) -> Masker:
+        """返回由指定分组的规则组成的掩码器，规则保持配置中的顺序"""
+        cache_key = ("group",) + names
+        masker = self._maskers.get(cache_key)
+        if masker is None:
+            for name in names:
+                if name not in self.groups:
+                    raise MaskingRuleError(f"未定义的分组 {name!r}")
+            masker = Masker(
+                [rule for rule in self.rules if rule.group in names],
+                any(self.groups[name]["whole_document"] for name in names),
+            )
+            self._maskers[cache_key] = masker
+        return masker
+
+    def groups_for_file(self, file_name: str):
+        """按文件名（不含目录）匹配适用的分组"""
+        base = os.path.basename(file_name).lower()
+        return tuple(
+            name for name, group in self.groups.items()
+            if any(fnmatch.fnmatchcase(base, pattern) for pattern in group["files"])
+        )
+
+    def for_file(self, file_name: str) -> Masker:
+        """返回适用于该文件的掩码器"""
+        return self.group(*self.groups_for_file(file_name))
+
+@functools.lru_cache(maxsize=None)
+def load_rules(path: str = None) -> RuleSet:
+    """加载并编译规则配置，同一路径只编译一次"""
+    path = path or DEFAULT_RULES_FILE
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            config = json.load(f)
+        except json.JSONDecodeError as e:
+            raise MaskingRuleError(f"规则配置不是有效的 JSON: {path}: {e}") from e
+    return RuleSet(config, path)
+
+def mask_many(lines, file_name: str, rules: RuleSet = None):
+    """按文件名选择规则，批量掩码多行（不含换行符）"""
+    return (rules or load_rules()).for_file(file_name).mask_many(lines)
+
+def mask_stream(iterable, file_name: str, rules: RuleSet = None, batch_size: int = DEFAULT_BATCH_SIZE):
+    """按文件名选择规则，流式掩码文本块或行，产出掩码后的文本块"""
+    return (rules or load_rules()).for_file(file_name).mask_stream(iterable, batch_size)
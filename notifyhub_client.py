@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NotifyHub API 的 Python 客户端
+- 附件按块编码成 Base64 直接写进请求体，不把整个文件读进内存；请求体长度事先算好
+- 复用 keep-alive 连接的线程安全连接池，连接被服务器关闭时自动重试一次
+- 发送前在本地按 EmailRequest 的约束和 AttachmentValidator 的规则检查，
+  违规的请求不会上传；MIME 类型与 MimeTypeHelper 一致
+- send_many() 以有限并发批量发送
+
+    client = NotifyHubClient("https://notify.example.com", api_key)
+    client.send(EmailMessage(to=["ops@example.com"], subject="日报", body="见附件", category="report",
+                             attachments=[Attachment.from_path("report.pdf")]))
+"""
+
+import os
+import base64
+import http.client
+import json
+import queue
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+SEND_PATH = "/api/email/send"
+
+# Base64 按 3 字节对齐分块编码，中间块不会产生填充
+ENCODE_CHUNK_SIZE = 3 * 64 * 1024
+
+# 与 EmailRequest 的数据注解和控制器的收件人上限一致
+MAX_SUBJECT_LENGTH = 500
+MAX_BODY_LENGTH = 50000
+MAX_CATEGORY_LENGTH = 100
+MAX_RECIPIENTS = 100
+MAX_FILE_NAME_LENGTH = 255
+
+# 与 MimeTypeHelper 一致
+MIME_TYPES = {
+    # 图片
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif",
+    ".bmp": "image/bmp", ".webp": "image/webp", ".svg": "image/svg+xml", ".ico": "image/x-icon",
+    ".tiff": "image/tiff",
+    # 文档
+    ".pdf": "application/pdf", ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xls": "application/vnd.ms-excel",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".ppt": "application/vnd.ms-powerpoint",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".odt": "application/vnd.oasis.opendocument.text", ".ods": "application/vnd.oasis.opendocument.spreadsheet",
+    ".odp": "application/vnd.oasis.opendocument.presentation", ".rtf": "application/rtf",
+    # 压缩文件
+    ".zip": "application/zip", ".rar": "application/vnd.rar", ".7z": "application/x-7z-compressed",
+    ".tar": "application/x-tar", ".gz": "application/gzip",
+    # 文本
+    ".txt": "text/plain", ".csv": "text/csv", ".xml": "text/xml", ".json": "application/json",
+    ".md": "text/markdown",
+    # 音频
+    ".mp3": "audio/mpeg", ".wav": "audio/wav", ".ogg": "audio/ogg", ".m4a": "audio/mp4",
+    # 视频
+    ".mp4": "video/mp4", ".avi": "video/x-msvideo", ".mov": "video/quicktime", ".wmv": "video/x-ms-wmv",
+    ".flv": "video/x-flv", ".webm": "video/webm",
+    # 其他
+    ".bin": "application/octet-stream",
+}
+DEFAULT_MIME_TYPE = "application/octet-stream"
+
+PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH = 0, 1, 2
+
+class NotifyHubError(Exception):
+    """请求失败（非 2xx 响应或业务失败）"""
+
+    def __init__(self, message, status=None, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+class RateLimitedError(NotifyHubError):
+    """被 IpRateLimiting 限流（429）"""
+
+    def __init__(self, message, status=429, response=None, retry_after=None):
+        super().__init__(message, status, response)
+        self.retry_after = retry_after
+
+class ValidationError(NotifyHubError):
+    """本地检查未通过，请求没有发出"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+def file_extension(file_name):
+    """与 Path.GetExtension 一致：最后一个点开始的小写扩展名，没有扩展名时为空串"""
+    base = file_name.replace("\\", "/").rsplit("/", 1)[-1]
+    dot = base.rfind(".")
+    if dot < 0 or dot == len(base) - 1:
+        return ""
+    return base[dot:].lower()
+
+def mime_type(file_name):
+    """根据文件名返回 MIME 类型，与 MimeTypeHelper.GetMimeType 一致"""
+    if not file_name or not file_name.strip():
+        return DEFAULT_MIME_TYPE
+    return MIME_TYPES.get(file_extension(file_name), DEFAULT_MIME_TYPE)
+
+def base64_length(size):
+    return (size + 2) // 3 * 4
+
+class AttachmentSettings:
+    """附件限制，默认值与 appsettings.json 的 AttachmentSettings 一致"""
+
+    def __init__(self, enable_attachments=True, max_attachment_size=5 * 1024 * 1024, max_attachment_count=5,
+                 max_total_attachment_size=15 * 1024 * 1024,
+                 blocked_extensions=(".exe", ".bat", ".cmd", ".com", ".pif", ".scr", ".vbs", ".js", ".jar")):
+        self.enable_attachments = enable_attachments
+        self.max_attachment_size = max_attachment_size
+        self.max_attachment_count = max_attachment_count
+        self.max_total_attachment_size = max_total_attachment_size
+        self.blocked_extensions = frozenset(ext.lower() for ext in blocked_extensions)
+
+    @classmethod
+    def from_appsettings(cls, path):
+        """从 appsettings.json 的 AttachmentSettings 节读取，缺少的项使用默认值"""
+        with open(path, "r", encoding="utf-8-sig") as f:
+            section = json.load(f).get("AttachmentSettings", {})
+        defaults = cls()
+        return cls(
+            enable_attachments=section.get("EnableAttachments", defaults.enable_attachments),
+            max_attachment_size=section.get("MaxAttachmentSize", defaults.max_attachment_size),
+            max_attachment_count=section.get("MaxAttachmentCount", defaults.max_attachment_count),
+            max_total_attachment_size=section.get("MaxTotalAttachmentSize", defaults.max_total_attachment_size),
+            blocked_extensions=section.get("BlockedExtensions", defaults.blocked_extensions),
+        )
+
+class Attachment:
+    """一个附件：文件路径或内存中的字节，发送时才读取和编码"""
+
+    def __init__(self, name, size, path=None, data=None):
+        self.name = name
+        self.size = size
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def from_path(cls, path, name=None):
+        return cls(name or os.path.basename(path), os.path.getsize(path), path=path)
+
+    @classmethod
+    def from_bytes(cls, name, data):
+        return cls(name, len(data), data=bytes(data))
+
+    @property
+    def mime_type(self):
+        return mime_type(self.name)
+
+    @property
+    def encoded_size(self):
+        return base64_length(self.size)
+
+    def iter_base64(self, chunk_size=ENCODE_CHUNK_SIZE):
+        """逐块产出 Base64 编码后的字节，总长度严格等于 encoded_size"""
+        if self.data is not None:
+            view = memoryview(self.data)
+            for start in range(0, self.size, chunk_size):
+                yield base64.b64encode(view[start:start + chunk_size])
+            return
+        remaining = self.size
+        with open(self.path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    # 请求体长度已经发出，文件变短时只能中断这个请求
+                    raise OSError(f"附件在发送过程中被截断: {self.path}")
+                # 读到的块不是 3 的倍数时补读，保证中间块没有填充
+                while len(chunk) % 3 and len(chunk) < remaining:
+                    more = f.read(min(3 - len(chunk) % 3, remaining - len(chunk)))
+                    if not more:
+                        raise OSError(f"附件在发送过程中被截断: {self.path}")
+                    chunk += more
+                remaining -= len(chunk)
+                yield base64.b64encode(chunk)
+
+class EmailMessage:
+    """对应服务端的 EmailRequest"""
+
+    def __init__(self, to, subject, body, category, cc=None, bcc=None, is_html=False,
+                 priority=PRIORITY_NORMAL, attachments=()):
+        self.to = list(to)
+        self.cc = list(cc) if cc else None
+        self.bcc = list(bcc) if bcc else None
+        self.subject = subject
+        self.body = body
+        self.category = category
+        self.is_html = is_html
+        self.priority = priority
+        self.attachments = list(attachments)
+
+    def validate(self, settings):
+        """按服务端规则检查，返回错误列表"""
+        errors = []
+        if not self.to:
+            errors.append("收件人不能为空")
+        recipients = len(self.to) + len(self.cc or ()) + len(self.bcc or ())
+        if recipients > MAX_RECIPIENTS:
+            errors.append(f"收件人总数不能超过{MAX_RECIPIENTS}个，当前: {recipients}")
+        for value, limit, empty_error, length_error in (
+                (self.subject, MAX_SUBJECT_LENGTH, "邮件主题不能为空", "主题长度不能超过500字符"),
+                (self.body, MAX_BODY_LENGTH, "邮件内容不能为空", "邮件内容长度不能超过50000字符"),
+                (self.category, MAX_CATEGORY_LENGTH, "邮件分类不能为空", "分类长度不能超过100字符")):
+            if not value:
+                errors.append(empty_error)
+            elif len(value) > limit:
+                errors.append(length_error)
+        if self.priority not in (PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH):
+            errors.append(f"无效的优先级: {self.priority}")
+        errors.extend(self._validate_attachments(settings))
+        return errors
+
+    def _validate_attachments(self, settings):
+        """与 AttachmentValidator.Validate 相同的规则"""
+        if not self.attachments:
+            return []
+        if not settings.enable_attachments:
+            return ["附件功能未启用"]
+        errors = []
+        if len(self.attachments) > settings.max_attachment_count:
+            errors.append(f"附件数量超过限制（最多{settings.max_attachment_count}个），当前: {len(self.attachments)}")
+        names = [attachment.name for attachment in self.attachments]
+        if len(set(names)) != len(names):
+            # 服务端以文件名为字典键，重名的附件会互相覆盖
+            errors.append("附件文件名重复")
+        total = 0
+        for attachment in self.attachments:
+            name = attachment.name
+            if not name or not name.strip():
+                errors.append("文件名不能为空")
+            elif len(name) > MAX_FILE_NAME_LENGTH:
+                errors.append(f"文件名过长（最多{MAX_FILE_NAME_LENGTH}字符）: {name[:50]}...")
+            elif file_extension(name) in settings.blocked_extensions:
+                errors.append(f"不允许的文件类型: {name} ({file_extension(name)})")
+            elif attachment.size == 0:
+                errors.append(f"附件内容为空: {name}")
+            elif attachment.size > settings.max_attachment_size:
+                errors.append(f"附件 {name} 大小超过限制（最大{settings.max_attachment_size / 1024 / 1024:.2f}MB），"
+                              f"当前: {attachment.size / 1024 / 1024:.2f}MB")
+            else:
+                total += attachment.size
+        if total > settings.max_total_attachment_size:
+            errors.append(f"附件总大小超过限制（最大{settings.max_total_attachment_size / 1024 / 1024:.2f}MB），"
+                          f"当前: {total / 1024 / 1024:.2f}MB")
+        return errors
+
+    def _fields(self):
+        fields = {"to": self.to}
+        if self.cc:
+            fields["cc"] = self.cc
+        if self.bcc:
+            fields["bcc"] = self.bcc
+        fields.update(subject=self.subject, body=self.body, priority=self.priority,
+                      category=self.category, isHtml=self.is_html)
+        return fields
+
+    def body_parts(self):
+        """请求体的各部分和总长度：[(bytes 或 Attachment)]，附件在发送时编码"""
+        head = json.dumps(self._fields(), ensure_ascii=False).encode("utf-8")
+        if not self.attachments:
+            return [head], len(head)
+        parts = [head[:-1] + b', "attachments": {']
+        for i, attachment in enumerate(self.attachments):
+            name = json.dumps(attachment.name, ensure_ascii=False).encode("utf-8")
+            parts.append((b", " if i else b"") + name + b': "')
+            parts.append(attachment)
+            parts.append(b'"')
+        parts.append(b"}}")
+        length = sum(part.encoded_size if isinstance(part, Attachment) else len(part) for part in parts)
+        return parts, length
+
+def iter_body(parts):
+    for part in parts:
+        if isinstance(part, Attachment):
+            yield from part.iter_base64()
+        else:
+            yield part
+
+class ConnectionPool:
+    """线程安全的 keep-alive 连接池，空闲连接最多保留 size 个"""
+
+    def __init__(self, base_url, size, timeout, ssl_context=None):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self, fresh=False):
+        """返回 (连接, 是否为复用的连接)；fresh 为 True 时总是新建连接"""
+        if not fresh:
+            try:
+                return self.idle.get_nowait(), True
+            except queue.Empty:
+                pass
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                               context=self.ssl_context), False
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn, reuse):
+        if reuse:
+            try:
+                self.idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class NotifyHubClient:
+    """NotifyHub API 客户端，可在多个线程间共享"""
+
+    def __init__(self, base_url, api_key, timeout=60.0, pool_size=8, settings=None, ssl_context=None):
+        self.api_key = api_key
+        self.settings = settings or AttachmentSettings()
+        self.pool = ConnectionPool(base_url, pool_size, timeout,
+                                   ssl_context or (ssl.create_default_context() if base_url.startswith("https") else None))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+
+    def _post(self, conn, path, parts, length):
+        """在 conn 上发出请求，返回 (响应, 响应体)；出错时关闭连接"""
+        try:
+            conn.putrequest("POST", self.pool.base_path + path, skip_accept_encoding=True)
+            conn.putheader("Authorization", f"Bearer {self.api_key}")
+            conn.putheader("Content-Type", "application/json; charset=utf-8")
+            conn.putheader("Content-Length", str(length))
+            conn.putheader("Accept", "application/json")
+            conn.endheaders()
+            for chunk in iter_body(parts):
+                conn.send(chunk)
+            response = conn.getresponse()
+            payload = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.pool.release(conn, not response.will_close)
+        return response, payload
+
+    def send(self, message):
+        """发送一封邮件，返回响应中的 data（含 emailId）；失败时抛出 NotifyHubError"""
+        errors = message.validate(self.settings)
+        if errors:
+            raise ValidationError(errors)
+        parts, length = message.body_parts()
+        conn, reused = self.pool.acquire()
+        try:
+            response, payload = self._post(conn, SEND_PATH, parts, length)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # 复用的空闲连接可能已被服务器关闭，换新连接重试一次；新连接出错时不重试，避免重复发信
+            if not reused:
+                raise
+            response, payload = self._post(self.pool.acquire(fresh=True)[0], SEND_PATH, parts, length)
+
+        try:
+            result = json.loads(payload) if payload else {}
+        except ValueError:
+            result = {"message": payload.decode("utf-8", "replace")}
+        if not isinstance(result, dict):
+            result = {"message": str(result)}
+        message_text = result.get("message") or result.get("Message") or response.reason
+        if response.status == 429:
+            retry_after = response.getheader("Retry-After")
+            raise RateLimitedError(message_text, response=result,
+                                   retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if not 200 <= response.status < 300 or result.get("success") is False:
+            raise NotifyHubError(message_text, response.status, result)
+        return result.get("data", result)
+
+    def send_many(self, messages, concurrency=4, return_exceptions=True):
+        """以最多 concurrency 个并发请求发送多封邮件，结果与 messages 顺序一致
+
+        return_exceptions 为 True 时失败的邮件以异常对象出现在结果中，否则遇到第一个失败就抛出
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+
+        def send_one(message):
+            try:
+                return self.send(message)
+            except (NotifyHubError, OSError, http.client.HTTPException) as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(messages))),
+                                thread_name_prefix="notifyhub") as pool:
+            return list(pool.map(send_one, messages))
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""按路径加载仓库根目录下的脚本（文件名以 # 开头，无法直接 import）"""
+
+import importlib.util
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 脚本依赖仓库根目录下的 treewalk、masking 等模块
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+def load_script(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""#log_query.py 的回归测试"""
+
+import unittest
+
+from script_loader import load_script
+
+log_query = load_script("log_query", "#log_query.py")
+
+# GlobalExceptionMiddleware 记录的 context.TraceIdentifier，以及其他形式的 RequestId
+REQUEST_IDS = ["0HN1GLJ2L7K0500:00000001", "0HN1GLJ2L7K0500:0000000A", "req_20250101.42",
+               "3fa85f64-5717-4562-b3fc-2c963f66afa6"]
+
+class RequestIdTest(unittest.TestCase):
+
+    def test_extracts_whole_request_id(self):
+        for request_id in REQUEST_IDS:
+            for line in (f"全局异常捕获 - 路径: /api/email/send, 方法: POST, IP: 1.2.3.4, RequestId: {request_id}",
+                         f"请求处理完成 RequestId: {request_id}.",
+                         f'{{"RequestId": "{request_id}", "Status": 500}}'):
+                with self.subTest(line=line):
+                    self.assertEqual(log_query.REQUEST_ID_RE.findall(line.encode("utf-8")),
+                                     [request_id.encode("utf-8")])
+
+    def test_bloom_filter_contains_request_id(self):
+        for request_id in REQUEST_IDS:
+            token = request_id.encode("utf-8")
+            self.assertTrue(log_query.bloom_contains(log_query.bloom_build([token]), token))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""#packager.py 的回归测试"""
+
+import json
+import random
+import re
+import unittest
+
+from script_loader import load_script
+
+packager = load_script("packager", "#packager.py")
+
+# 键和值之间带注释的 JSONC 写法，敏感值必须被掩码
+JSONC_COMMENT_CASES = [
+    '{"Password": // old\n "secretsecret"}',
+    '{"Password":\n  // note\n  "secretsecret"}',
+    '{"Password": /* c */ "secretsecret"}',
+    '{"Password" /* c */ : "secretsecret"}',
+]
+# 模糊测试在 "键": 处插入的注释（标记文字不会出现在生成的键和值里）
+FUZZ_COMMENTS = ['\\1 /* fuzz */ : ', '\\1: // fuzz\n    ', '\\1:\n  // fuzz\n  ', '\\1: /* fuzz */ ',
+                 '\\1: /* fuzz\n fuzz */ ']
+FUZZ_KEY_RE = re.compile(r'("(?:[^"\\]|\\.)*"): ')
+FUZZ_COMMENT_RE = re.compile(r'/\* fuzz(?:\n fuzz)? \*/|// fuzz')
+
+def make_config(rng, sections):
+    """生成带敏感字段的 appsettings 风格 JSON"""
+    data = {}
+    for i in range(sections):
+        data[f"Section{i}"] = {
+            "Name": f"item{i}",
+            "Count": rng.randrange(1000),
+            "Password": f"secret-{rng.randrange(10 ** 9)}-value",
+            "ConnectionString": f"Server=db{i}.local;Password=pw{i};User Id=user{i}",
+        }
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+class JsonMaskingTest(unittest.TestCase):
+
+    def test_comment_between_key_and_value(self):
+        for case in JSONC_COMMENT_CASES:
+            for block_size in (1, 3, 64 * 1024):
+                with self.subTest(case=case, block_size=block_size):
+                    masked = "".join(packager.iter_json_masked([case], block_size=block_size))
+                    self.assertNotIn("secretsecret", masked)
+
+    def test_jsonc_matches_mask_json_recursive(self):
+        """插入注释后流式掩码与 mask_json_recursive 等价，任意块大小输出一致"""
+        rng = random.Random(0)
+        for _ in range(200):
+            text = make_config(rng, rng.randint(1, 6))
+            expected = packager.mask_json_recursive(json.loads(text))
+            jsonc = FUZZ_KEY_RE.sub(
+                lambda m: m.expand(rng.choice(FUZZ_COMMENTS)) if rng.random() < 0.5 else m.group(0), text)
+            whole = packager.process_json_content(jsonc)
+            with self.subTest(jsonc=jsonc):
+                self.assertEqual(json.loads(FUZZ_COMMENT_RE.sub("", whole)), expected)
+                block_size = rng.randint(1, 256)
+                self.assertEqual("".join(packager.iter_json_masked([jsonc], block_size=block_size)), whole)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""#scan_project.py 的回归测试"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from script_loader import load_script
+
+scan_project = load_script("scan_project", "#scan_project.py")
+
+def render(root, **kwargs):
+    stream = io.StringIO()
+    scan_project.render_scan(root, out=scan_project.BufferedOutput(stream), **kwargs)
+    return stream.getvalue()
+
+def copy_view(output):
+    return output.split("项目结构 (复制友好格式)\n" + "=" * 80 + "\n", 1)[1]
+
+class RenderScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, "d"))
+        for name in ("bad\nname.txt", "cr\rname.txt", "tab\tname.txt", "ok.txt"):
+            with open(os.path.join(self.root, "d", name), "w") as f:
+                f.write("x" * 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_names_with_line_breaks(self):
+        expected = ("d/ (40.0 B, 4 个文件)\n"
+                    "  ├── bad\nname.txt (10.0 B)\n"
+                    "  ├── cr\rname.txt (10.0 B)\n"
+                    "  ├── ok.txt (10.0 B)\n"
+                    "  ├── tab\tname.txt (10.0 B)\n")
+        self.assertEqual(copy_view(render(self.root)), expected)
+
+    def test_names_with_line_breaks_spooled_to_disk(self):
+        in_memory = render(self.root)
+        original = scan_project.COPY_SPOOL_SIZE
+        scan_project.COPY_SPOOL_SIZE = 1
+        try:
+            self.assertEqual(render(self.root), in_memory)
+        finally:
+            scan_project.COPY_SPOOL_SIZE = original
+
+class ScanIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "root")
+        self.index_file = os.path.join(self.tmp.name, "index.db")
+        self.dir = os.path.join(self.root, "d")
+        os.makedirs(self.dir)
+        for i in range(scan_project.STAT_BATCH * 3):
+            with open(os.path.join(self.dir, f"f{i}.txt"), "w") as f:
+                f.write("x")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scan(self, **kwargs):
+        index = scan_project.ScanIndex(self.index_file, self.root)
+        try:
+            entries = [(e.path, e.kind, e.size, e.mtime_ns) for e in index.iter_scan(on_error=None, **kwargs)]
+            index.save()
+            return entries, index.changes, index.reused
+        finally:
+            index.close()
+
+    def rewrite_in_place(self):
+        """像 scp 一样原地改写文件，目录修改时间不变"""
+        dir_st = os.stat(self.dir)
+        with open(os.path.join(self.dir, "f0.txt"), "w") as f:
+            f.write("xyz")
+        os.utime(self.dir, ns=(dir_st.st_atime_ns, dir_st.st_mtime_ns))
+
+    def test_reused_directory_detects_in_place_rewrite(self):
+        self.scan()
+        self.rewrite_in_place()
+        _, changes, reused = self.scan()
+        self.assertEqual(reused, 2)
+        self.assertEqual(changes, [('grown', os.path.join("d", "f0.txt"), 1, 3)])
+
+    def test_trust_dir_mtime_reuses_indexed_files(self):
+        self.scan()
+        self.rewrite_in_place()
+        entries, changes, reused = self.scan(trust_dir_mtime=True)
+        self.assertEqual(reused, 2)
+        self.assertEqual(changes, [])
+        self.assertIn((os.path.join("d", "f0.txt"), 'file', 1), [entry[:3] for entry in entries])
+
+    def test_workers_give_same_entries(self):
+        first, _, _ = self.scan()
+        for kwargs in ({'workers': 4}, {'workers': 4, 'full_rescan': True}):
+            self.assertEqual(self.scan(**kwargs)[0], first)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录树遍历模块
+基于 os.scandir 的深度优先遍历，供 #packager.py 和 #scan_project.py 共用
+- 复用 DirEntry 缓存的类型和 stat 信息，避免对每个条目重复 stat
+- 忽略的目录在进入之前就被剪枝，不会遍历 bin/obj 等编译输出子树
+- workers > 1 时用线程池并行预取目录列表和 stat，适合 NFS/SMB 等高延迟文件系统，产出顺序不变
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# PathPrefixTrie.match 的返回值
+INSIDE = "inside"      # 位于某个目标路径之内（含目标本身）
+ANCESTOR = "ancestor"  # 是某个目标路径的上级目录，需要继续向下查找
+
+def split_rel_path(rel_path: str):
+    """把相对路径拆成各级目录名，兼容 / 和 \\ 分隔符"""
+    if rel_path in ("", "."):
+        return []
+    return [part for part in rel_path.replace("\\", "/").split("/") if part and part != "."]
+
+class PathPrefixTrie:
+    """预编译的路径前缀树，用于按目录层级匹配目标文件夹"""
+
+    _END = None
+
+    def __init__(self, prefixes):
+        self.root = {}
+        for prefix in prefixes:
+            node = self.root
+            for part in split_rel_path(prefix):
+                node = node.setdefault(part, {})
+            node[self._END] = True
+
+    def match(self, rel_path):
+        """返回 INSIDE、ANCESTOR 或 None（与所有目标都无关，可以剪枝）"""
+        node = self.root
+        if self._END in node:
+            return INSIDE
+        for part in split_rel_path(rel_path):
+            node = node.get(part)
+            if node is None:
+                return None
+            if self._END in node:
+                return INSIDE
+        return ANCESTOR
+
+class WalkEntry:
+    """遍历产出的条目，包装 os.DirEntry 并附带相对路径和深度"""
+
+    __slots__ = ("entry", "name", "path", "rel_path", "folder", "depth", "is_dir")
+
+    def __init__(self, entry, rel_path, folder, depth, is_dir):
+        self.entry = entry
+        self.name = entry.name
+        self.path = entry.path
+        self.rel_path = rel_path
+        self.folder = folder
+        self.depth = depth
+        self.is_dir = is_dir
+
+    def stat(self):
+        """返回 stat 结果（跟随符号链接），DirEntry 会缓存结果"""
+        return self.entry.stat()
+
+def _dirs_first_key(entry):
+    """与 sorted(..., key=(is_file, name.lower())) 的顺序一致：目录在前，按名称排序"""
+    try:
+        is_file = entry.is_file()
+    except OSError:
+        is_file = False
+    return (is_file, entry.name.lower())
+
+# 并行模式下每个工作线程最多预取、尚未被遍历消费的目录列表数
+PREFETCH_PER_WORKER = 64
+
+class _ParallelLister:
+    """线程池预取目录列表
+
+    工作线程列出一个目录后立即为其子目录提交任务，预取总数受 budget 限制；
+    遍历线程按原有顺序取用结果，未预取到的目录同步列出
+    """
+
+    def __init__(self, list_dir, child_dirs, workers, budget):
+        self.list_dir = list_dir
+        self.child_dirs = child_dirs
+        self.budget = budget
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="treewalk")
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.closed = False
+
+    def prefetch(self, path, depth, rel_path):
+        with self.lock:
+            if self.closed or path in self.futures or len(self.futures) >= self.budget:
+                return
+            self.futures[path] = self.pool.submit(self._list, path, depth, rel_path)
+
+    def _list(self, path, depth, rel_path):
+        result = self.list_dir(path)
+        for child_path, child_rel in self.child_dirs(result[0], depth, rel_path):
+            self.prefetch(child_path, depth + 1, child_rel)
+        return result
+
+    def take(self, path, depth, rel_path):
+        """取出目录列表 (条目, 异常)，depth 为其中条目的深度"""
+        with self.lock:
+            future = self.futures.pop(path, None)
+        if future is None:
+            return self._list(path, depth, rel_path)
+        return future.result()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.futures.clear()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+def walk_tree(root, max_depth=None, skip_names=(), skip_hidden=False, prefixes=None,
+              sort=False, follow_symlinks=False, on_error=None, workers=1):
+    """深度优先（先序）遍历目录树，逐个产出 WalkEntry
+
+    - max_depth: 最多产出的层数，根目录下的条目深度为 0
+    - skip_names: 按名称精确匹配跳过的文件和目录，目录不会再被进入
+    - skip_hidden: 跳过以 . 开头的条目
+    - prefixes: PathPrefixTrie，与其无关的目录直接剪枝，不产出也不进入
+    - sort: 每个目录内按目录在前、名称不区分大小写排序
+    - on_error: 目录无法读取时的回调 on_error(path, exc)，总是在遍历线程中按遍历顺序调用
+    - workers: 大于 1 时用线程池并行列出目录并预取 stat，产出顺序与单线程相同
+    """
+    root = os.fspath(root)
+    skip_names = frozenset(skip_names)
+    prefetch_stat = workers > 1
+
+    def list_dir(path):
+        try:
+            with os.scandir(path) as it:
+                entries = [
+                    entry for entry in it
+                    if entry.name not in skip_names and not (skip_hidden and entry.name.startswith("."))
+                ]
+        except OSError as e:
+            return [], e
+        if sort:
+            entries.sort(key=_dirs_first_key)
+        if prefetch_stat:
+            # DirEntry 会缓存 stat 结果，遍历线程之后调用 stat() 不再访问文件系统
+            for entry in entries:
+                try:
+                    entry.stat()
+                except OSError:
+                    pass
+        return entries, None
+
+    def is_walk_dir(entry, rel_path):
+        """条目是否为需要产出的目录（未被 prefixes 剪枝）"""
+        try:
+            is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+        except OSError:
+            return False
+        return is_dir and (prefixes is None or prefixes.match(rel_path) is not None)
+
+    def child_dirs(entries, depth, parent_rel):
+        """列表中需要继续进入的子目录 (路径, 相对路径)"""
+        if max_depth is not None and depth + 1 >= max_depth:
+            return
+        for entry in entries:
+            rel_path = entry.name if not parent_rel else parent_rel + os.sep + entry.name
+            if is_walk_dir(entry, rel_path):
+                yield entry.path, rel_path
+
+    if max_depth is not None and max_depth <= 0:
+        return
+
+    lister = None
+    if workers > 1:
+        lister = _ParallelLister(list_dir, child_dirs, workers, workers * PREFETCH_PER_WORKER)
+
+    def take(path, depth, rel_path):
+        entries, error = lister.take(path, depth, rel_path) if lister is not None else list_dir(path)
+        if error is not None and on_error is not None:
+            on_error(path, error)
+        return entries
+
+    try:
+        stack = [(iter(take(root, 0, "")), 0, "")]
+        while stack:
+            it, depth, parent_rel = stack[-1]
+            entry = next(it, None)
+            if entry is None:
+                stack.pop()
+                continue
+
+            rel_path = entry.name if not parent_rel else parent_rel + os.sep + entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+            except OSError:
+                is_dir = False
+
+            if is_dir and prefixes is not None and prefixes.match(rel_path) is None:
+                continue
+
+            yield WalkEntry(entry, rel_path, parent_rel or ".", depth, is_dir)
+
+            if is_dir and (max_depth is None or depth + 1 < max_depth):
+                stack.append((iter(take(entry.path, depth + 1, rel_path)), depth + 1, rel_path))
+    finally:
+        if lister is not None:
+            lister.close()